@@ -0,0 +1,13 @@
+"""
+Benchmarks of the repository and manager hot paths, against SQLite in memory and on disk.
+
+Run from the repository root, with the package installed::
+
+    python -m benchmarks                          # full run
+    python -m benchmarks --quick -k find_one      # smaller tables, fewer iterations, filtered cases
+    python -m benchmarks --save baseline.json     # save the results as baseline
+    python -m benchmarks --compare baseline.json  # exit with status 1 on regressions
+
+Latencies are measured per operation with the garbage collector disabled, tables
+are filled with the same seeded data on every run.
+"""
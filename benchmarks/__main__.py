@@ -0,0 +1,41 @@
+import argparse
+import sys
+
+from .cases import STORAGES, run
+from .runner import compare, format_results, load_results, save_results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Benchmarks of the repository and manager hot paths")
+    parser.add_argument('-k', dest='pattern', help="Only run the benchmarks whose name/storage contains PATTERN")
+    parser.add_argument('--storage', choices=STORAGES, action='append', help="SQLite storage, both by default")
+    parser.add_argument('--quick', action='store_true', help="Smaller tables and fewer iterations")
+    parser.add_argument('--save', metavar='PATH', help="Save the results as JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="Compare the results with a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed throughput drop or p95 growth before flagging a regression (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    results = run(
+        storages=args.storage or STORAGES,
+        quick=args.quick,
+        pattern=args.pattern,
+        progress=lambda result: print(format_results([result]).splitlines()[-1], file=sys.stderr),
+    )
+    print(format_results(results))
+    if args.save:
+        save_results(args.save, results)
+
+    if args.compare:
+        regressions = compare(results, load_results(args.compare), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression.key} {regression.metric}: '
+                  f'{regression.baseline:.6g} -> {regression.current:.6g} ({regression.change:+.0%})')
+        if regressions:
+            return 1
+        print(f'No regression over {args.tolerance:.0%} against {args.compare}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
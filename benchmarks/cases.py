@@ -0,0 +1,238 @@
+import itertools
+import os
+import random
+import tempfile
+from typing import Callable, Iterator, List, Sequence, Tuple
+
+from flask import Flask
+from flask_ddd_repository import DB_MANAGER_SQLALCHEMY, FlaskDDDRepository, get_managers
+from flask_ddd_repository.buffered import BufferedSQLAlchemyRepository
+from flask_ddd_repository.model import Model
+from flask_ddd_repository.repository import SQLAlchemyRepository
+from sqlalchemy import Column, DateTime, Integer, String, Table
+from sqlalchemy.orm import clear_mappers, mapper, sessionmaker
+
+from .runner import Result, measure
+
+STORAGES = ('memory', 'disk')
+SEED = 20240101
+
+
+class Settings:
+    def __init__(self, quick: bool = False):
+        self.table_sizes = [1000, 10000] if quick else [1000, 10000, 100000]
+        self.batch_sizes = [1, 10, 100, 1000]
+        self.iterations = 200 if quick else 2000
+        self.binds = 50
+
+
+class Environment:
+    """
+    Flask application with one SQLite bind and a mapped `Person` model, in memory or in a temporary file
+    """
+
+    def __init__(self, storage: str, rows: int = 0):
+        self._directory = tempfile.TemporaryDirectory(prefix='flask_ddd_repository_benchmarks_')
+        db_host = ':memory:' if storage == 'memory' else os.path.join(self._directory.name, 'benchmark.db')
+        self.app = Flask('benchmarks')
+        self.app.config['SQLALCHEMY_BINDS'] = [{'bind_name': 'benchmark', 'db_type': 'sqlite', 'db_host': db_host}]
+        FlaskDDDRepository(self.app)
+        self.manager = get_managers(self.app)[DB_MANAGER_SQLALCHEMY]
+
+        class Person(Model):
+            def __init__(self, name: str = None, lastname: str = None):
+                self.name = name
+                self.lastname = lastname
+
+        metadata = self.manager.metadata()['benchmark']
+        table = Table(
+            'person', metadata,
+            Column('id', Integer, primary_key=True),
+            Column('name', String),
+            Column('lastname', String),
+            Column('deleted_at', DateTime),
+        )
+        mapper(Person, table)
+        metadata.create_all()
+        self.model = Person
+        self.repository = SQLAlchemyRepository(Person)
+        self._context = self.app.app_context()
+        self._context.push()
+        if rows:
+            self.populate(rows)
+
+    def people(self, count: int) -> List[Model]:
+        return [self.model(f'name_{index}', 'Doe' if index % 2 else 'Roe') for index in range(count)]
+
+    def populate(self, rows: int) -> None:
+        self.repository.bulk_insert_many(self.people(rows), chunk_size=10000)
+
+    def close(self) -> None:
+        self._context.pop()
+        self.manager.binds()['benchmark'].dispose()
+        clear_mappers()
+        self._directory.cleanup()
+
+
+Case = Tuple[str, str, Callable[[], Result]]
+
+
+def _storage_cases(storage: str, settings: Settings) -> Iterator[Case]:
+    def create_session(env: Environment) -> Result:
+        return measure('create_session', storage, lambda: env.manager.create_session().close(), settings.iterations)
+
+    def create_session_uncached(env: Environment) -> Result:
+        def create_session() -> None:
+            # A new session factory and table map on every call, as before they were cached
+            sessionmaker(binds={
+                table: metadata.bind
+                for metadata in env.manager.metadata().values()
+                for table in metadata.tables.values()
+            })().close()
+
+        return measure('create_session_uncached', storage, create_session, settings.iterations)
+
+    yield 'create_session', storage, _in_environment(storage, 0, create_session)
+    yield 'create_session_uncached', storage, _in_environment(storage, 0, create_session_uncached)
+
+    for rows in settings.table_sizes:
+        def find_one(env: Environment, rows=rows) -> Result:
+            keys = itertools.cycle(random.Random(SEED).sample(range(1, rows + 1), min(rows, settings.iterations)))
+            return measure(f'find_one[rows={rows}]', storage, lambda: env.repository.find_one(next(keys)),
+                           settings.iterations)
+
+        def find_many(env: Environment, rows=rows) -> Result:
+            offsets = itertools.cycle(random.Random(SEED).sample(range(rows // 2), min(rows // 2, settings.iterations)))
+            return measure(
+                f'find_many[rows={rows}]', storage,
+                lambda: env.repository.find_many({'lastname': 'Doe'}, limit=50, offset=next(offsets)),
+                max(10, settings.iterations // 10), items_per_op=50,
+            )
+
+        def find_many_rows(env: Environment, rows=rows) -> Result:
+            offsets = itertools.cycle(random.Random(SEED).sample(range(rows // 2), min(rows // 2, settings.iterations)))
+            return measure(
+                f'find_many_rows[rows={rows}]', storage,
+                lambda: env.repository.find_many({'lastname': 'Doe'}, limit=50, offset=next(offsets),
+                                                 fields=['id', 'name'], hydrate=False),
+                max(10, settings.iterations // 10), items_per_op=50,
+            )
+
+        def export_iter_many(env: Environment, rows=rows) -> Result:
+            return measure(
+                f'export_iter_many[rows={rows}]', storage,
+                lambda: [(m.id, m.name) for m in env.repository.iter_many({'lastname': 'Doe'}, chunk_size=10000)],
+                max(3, settings.iterations // 200), warmup=1, items_per_op=rows // 2,
+            )
+
+        def export_find_columns(env: Environment, rows=rows) -> Result:
+            return measure(
+                f'export_find_columns[rows={rows}]', storage,
+                lambda: env.repository.find_columns({'lastname': 'Doe'}, ['id', 'name']),
+                max(3, settings.iterations // 200), warmup=1, items_per_op=rows // 2,
+            )
+
+        yield f'find_one[rows={rows}]', storage, _in_environment(storage, rows, find_one)
+        yield f'find_many[rows={rows}]', storage, _in_environment(storage, rows, find_many)
+        yield f'find_many_rows[rows={rows}]', storage, _in_environment(storage, rows, find_many_rows)
+        yield f'export_iter_many[rows={rows}]', storage, _in_environment(storage, rows, export_iter_many)
+        yield f'export_find_columns[rows={rows}]', storage, _in_environment(storage, rows, export_find_columns)
+
+    for batch in settings.batch_sizes:
+        def insert_many(env: Environment, batch=batch) -> Result:
+            iterations = max(10, settings.iterations // batch)
+            batches = iter([env.people(batch) for _ in range(iterations + 10)])
+            return measure(f'insert_many[batch={batch}]', storage,
+                           lambda: env.repository.insert_many(next(batches)), iterations, items_per_op=batch)
+
+        def bulk_insert_many(env: Environment, batch=batch) -> Result:
+            iterations = max(10, settings.iterations // batch)
+            batches = iter([env.people(batch) for _ in range(iterations + 10)])
+            return measure(f'bulk_insert_many[batch={batch}]', storage,
+                           lambda: env.repository.bulk_insert_many(next(batches)), iterations, items_per_op=batch)
+
+        yield f'insert_many[batch={batch}]', storage, _in_environment(storage, 0, insert_many)
+        yield f'bulk_insert_many[batch={batch}]', storage, _in_environment(storage, 0, bulk_insert_many)
+
+    def insert_one(env: Environment, name: str = 'insert_one', repository: SQLAlchemyRepository = None) -> Result:
+        people = iter(env.people(settings.iterations + 10))
+        repository = repository or env.repository
+        return measure(name, storage, lambda: repository.insert_one(next(people)), settings.iterations)
+
+    def insert_one_buffered(env: Environment) -> Result:
+        repository = BufferedSQLAlchemyRepository(env.model)
+        try:
+            return insert_one(env, 'insert_one_buffered', repository)
+        finally:
+            repository.close()
+
+    yield 'insert_one', storage, _in_environment(storage, 0, insert_one)
+    if storage != 'memory':
+        # The background thread of the buffered repository doesn't see in-memory databases
+        yield 'insert_one_buffered', storage, _in_environment(storage, 0, insert_one_buffered)
+
+
+def _shared_cases(settings: Settings) -> Iterator[Case]:
+    def factory_create(env: Environment) -> Result:
+        factory = env.model.get_factory()
+        values = {'name': 'John', 'lastname': 'Doe', 'unknown': 'ignored'}
+        return measure('factory_create', '-', lambda: factory.create(values), settings.iterations * 10)
+
+    def factory_create_many(env: Environment) -> Result:
+        factory = env.model.get_factory()
+        values = [{'name': f'name_{index}', 'lastname': 'Doe', 'unknown': 'ignored'} for index in range(1000)]
+        return measure('factory_create_many[batch=1000]', '-', lambda: factory.create_many(values),
+                       max(10, settings.iterations // 10), items_per_op=1000)
+
+    def factory_create_columns(env: Environment) -> Result:
+        factory = env.model.get_factory()
+        columns = {'name': [f'name_{index}' for index in range(1000)], 'lastname': ['Doe'] * 1000}
+        return measure('factory_create_columns[batch=1000]', '-', lambda: factory.create_many(columns),
+                       max(10, settings.iterations // 10), items_per_op=1000)
+
+    def init_app(lazy: bool = False) -> Result:
+        app = Flask('benchmarks')
+        app.config['SQLALCHEMY_LAZY_ENGINES'] = lazy
+        app.config['SQLALCHEMY_BINDS'] = [
+            {'bind_name': f'bind_{index}', 'db_type': 'sqlite', 'db_host': ':memory:'}
+            for index in range(settings.binds)
+        ]
+        return measure(f'init_app{"_lazy" if lazy else ""}[binds={settings.binds}]', '-',
+                       lambda: FlaskDDDRepository().init_app(app), max(10, settings.iterations // 20), warmup=2)
+
+    yield 'factory_create', '-', _in_environment('memory', 0, factory_create)
+    yield 'factory_create_many[batch=1000]', '-', _in_environment('memory', 0, factory_create_many)
+    yield 'factory_create_columns[batch=1000]', '-', _in_environment('memory', 0, factory_create_columns)
+    yield f'init_app[binds={settings.binds}]', '-', init_app
+    yield f'init_app_lazy[binds={settings.binds}]', '-', lambda: init_app(lazy=True)
+
+
+def _in_environment(storage: str, rows: int, benchmark: Callable[[Environment], Result]) -> Callable[[], Result]:
+    def run_in_environment() -> Result:
+        env = Environment(storage, rows)
+        try:
+            return benchmark(env)
+        finally:
+            env.close()
+
+    return run_in_environment
+
+
+def run(storages: Sequence[str] = STORAGES, quick: bool = False, pattern: str = None,
+        progress: Callable[[Result], None] = None) -> List[Result]:
+    """
+    Runs the benchmarks whose `name/storage` key contains `pattern`, the other ones are not set up
+    """
+    settings = Settings(quick)
+    cases = itertools.chain(
+        itertools.chain.from_iterable(_storage_cases(storage, settings) for storage in storages),
+        _shared_cases(settings),
+    )
+    results = []
+    for name, storage, case in cases:
+        if pattern and pattern not in f'{name}/{storage}':
+            continue
+        results.append(case())
+        if progress is not None:
+            progress(results[-1])
+    return results
@@ -0,0 +1,132 @@
+import gc
+import json
+import math
+import platform
+import sqlite3
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import sqlalchemy
+
+
+class Result(NamedTuple):
+    name: str
+    storage: str
+    iterations: int
+    items_per_op: int
+    throughput: float
+    mean: float
+    p50: float
+    p95: float
+    p99: float
+
+    @property
+    def key(self) -> str:
+        return f'{self.name}/{self.storage}'
+
+
+class Regression(NamedTuple):
+    key: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        return self.current / self.baseline - 1 if self.baseline else 0.0
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    """
+    Nearest-rank percentile of sorted samples
+    """
+    return samples[max(0, math.ceil(len(samples) * percent / 100) - 1)]
+
+
+def measure(name: str, storage: str, operation: Callable[[], None], iterations: int, warmup: int = 10,
+            items_per_op: int = 1) -> Result:
+    """
+    Times every call of `operation` with the garbage collector disabled, like timeit
+
+    :param operation: The operation, called `warmup + iterations` times
+    :param items_per_op: The items (rows, models...) handled per call, for the throughput
+    """
+    for _ in range(warmup):
+        operation()
+
+    samples = []
+    gc.collect()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            operation()
+            samples.append(time.perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    total = sum(samples)
+    samples.sort()
+    return Result(
+        name=name,
+        storage=storage,
+        iterations=iterations,
+        items_per_op=items_per_op,
+        throughput=iterations * items_per_op / total if total else float('inf'),
+        mean=total / iterations,
+        p50=percentile(samples, 50),
+        p95=percentile(samples, 95),
+        p99=percentile(samples, 99),
+    )
+
+
+def environment() -> Dict[str, str]:
+    return {
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'sqlite': sqlite3.sqlite_version,
+        'machine': platform.machine(),
+    }
+
+
+def format_results(results: List[Result]) -> str:
+    lines = [f"{'benchmark':<42} {'items/s':>12} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10}"]
+    for result in results:
+        lines.append(
+            f'{result.key:<42} {result.throughput:>12.0f} {result.p50 * 1e6:>10.1f} '
+            f'{result.p95 * 1e6:>10.1f} {result.p99 * 1e6:>10.1f}'
+        )
+    return '\n'.join(lines)
+
+
+def save_results(path: str, results: List[Result]) -> None:
+    with open(path, 'w', encoding='utf8') as file:
+        json.dump({
+            'environment': environment(),
+            'results': {result.key: result._asdict() for result in results},
+        }, file, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> Dict[str, dict]:
+    with open(path, encoding='utf8') as file:
+        return json.load(file)['results']
+
+
+def compare(results: List[Result], baseline: Dict[str, dict], tolerance: float = 0.2) -> List[Regression]:
+    """
+    Flags the benchmarks whose throughput dropped, or whose p95 latency grew,
+    by more than `tolerance` compared to the baseline. Benchmarks missing from
+    the baseline are not compared.
+    """
+    regressions = []
+    for result in results:
+        previous: Optional[dict] = baseline.get(result.key)
+        if previous is None:
+            continue
+        if result.throughput < previous['throughput'] * (1 - tolerance):
+            regressions.append(Regression(result.key, 'throughput', previous['throughput'], result.throughput))
+        if result.p95 > previous['p95'] * (1 + tolerance):
+            regressions.append(Regression(result.key, 'p95', previous['p95'], result.p95))
+    return regressions
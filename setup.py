@@ -15,7 +15,9 @@ with open("src/flask_ddd_repository/__init__.py", encoding="utf8") as f:
 setup(
     name='Flask-DDD-Repository',
     version=version,
-    install_requires=["Flask>=1.1", "SQLAlchemy>=1.3"],
+    install_requires=["Flask>=1.1", "SQLAlchemy>=1.4.33", "contextvars; python_version < '3.7'"],
+    # Typed arrays from find_columns
+    extras_require={"numpy": ["numpy"]},
 )
 
 
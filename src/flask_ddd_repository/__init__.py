@@ -1,14 +1,26 @@
-from typing import Dict, Tuple
+import importlib
+import sys
+from typing import TYPE_CHECKING, Dict, Tuple
 
 from flask import Flask, current_app
 
 from .db_manager.base import StorageManager
-from .db_manager.sqlalchemy import SQLAlchemyManager
 from .model import Model
 
+if TYPE_CHECKING or sys.version_info < (3, 7):
+    # Without module __getattr__ (PEP 562) the manager is imported with the package
+    from .db_manager.sqlalchemy import SQLAlchemyManager  # noqa: F401
+
 __version__ = "1.0.0.dev"
 
 DB_MANAGER_SQLALCHEMY = 'sqlalchemy'
+DB_MANAGER_SQLALCHEMY_ASYNC = 'sqlalchemy_async'
+
+# Imported on first access, they load SQLAlchemy
+_LAZY_ATTRIBUTES: Dict[str, str] = {
+    'SQLAlchemyManager': 'flask_ddd_repository.db_manager.sqlalchemy.SQLAlchemyManager',
+    'AsyncSQLAlchemyManager': 'flask_ddd_repository.db_manager.sqlalchemy_async.AsyncSQLAlchemyManager',
+}
 
 
 class _FlaskDDDRepositoryState:
@@ -22,8 +34,10 @@ class _FlaskDDDRepositoryState:
 class FlaskDDDRepository:
     Model = Model
 
-    __db_managers_registry: Dict[str, type] = {
-        DB_MANAGER_SQLALCHEMY: SQLAlchemyManager,
+    # Manager classes by dotted path, imported by `init_app`: SQLAlchemy isn't loaded with the package
+    __db_managers_registry: Dict[str, str] = {
+        DB_MANAGER_SQLALCHEMY: _LAZY_ATTRIBUTES['SQLAlchemyManager'],
+        DB_MANAGER_SQLALCHEMY_ASYNC: _LAZY_ATTRIBUTES['AsyncSQLAlchemyManager'],
     }
 
     def __init__(self, app: Flask = None, db_managers: Tuple[str] = (DB_MANAGER_SQLALCHEMY,)):
@@ -36,13 +50,12 @@ class FlaskDDDRepository:
         for manager in db_managers:
             validated_manager = self.__db_managers_registry.get(manager)
             if validated_manager:
-                state.managers[manager] = validated_manager(app)
+                state.managers[manager] = _import_manager(validated_manager)(app)
         app.teardown_appcontext(self.teardown)
 
     def teardown(self, exception):
         for manager in _get_state(self.get_app()).managers.values():
-            # TODO: implement managers teardown
-            pass
+            manager.teardown(exception)
 
     def get_app(self):
         if current_app:
@@ -54,6 +67,17 @@ class FlaskDDDRepository:
         raise RuntimeError("No application found. Either work inside a view function or push an application context")
 
 
+def _import_manager(path: str) -> type:
+    module, _, name = path.rpartition('.')
+    return getattr(importlib.import_module(module), name)
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        return _import_manager(_LAZY_ATTRIBUTES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def _get_state(app: Flask) -> _FlaskDDDRepositoryState:
     if 'ddd_repository' not in app.extensions.keys():
         raise RuntimeError("flask_ddd_repository has not been initialised.")
@@ -0,0 +1,231 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List, Optional
+
+from flask import Flask, current_app, has_request_context
+from sqlalchemy.orm import Session
+
+from .cache import CacheBackend
+from .exceptions import WriteBufferFullException
+from .instrumentation import instrumented
+from .model import Model
+from .repository import SQLAlchemyRepository
+
+logger = logging.getLogger(__name__)
+
+# Seconds the interpreter exit waits at most for every buffer to be written
+_EXIT_TIMEOUT = 30.0
+
+# Buffers flushed at interpreter exit and emptied in forked child processes
+_buffered: 'weakref.WeakSet[BufferedSQLAlchemyRepository]' = weakref.WeakSet()
+
+
+class _FlushRequest:
+    __slots__ = ('done',)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class BufferedSQLAlchemyRepository(SQLAlchemyRepository):
+    """
+    Write-behind repository for append-only models: `insert_one` and `insert_many`
+    enqueue the models and return, a background thread writes them with
+    `bulk_insert_many` once `batch_size` models are waiting or `flush_interval`
+    seconds after the first one, whichever comes first.
+
+    The queue holds up to `max_queue_size` models, inserts wait up to `put_timeout`
+    seconds for room before raising `WriteBufferFullException`. Buffered models are
+    not visible to reads until they are written, and must not be modified after
+    their insert. Generated primary keys are not set on them.
+
+    Outside of requests, the teardown of an application context which buffered models
+    waits for them to be written. `flush` waits for the models enqueued before it, `close`
+    stops the thread once the queue is written, which happens at interpreter exit.
+    Failed batches are not retried: they are passed to `on_error`, or logged.
+    """
+
+    def __init__(self, model_class: type, cache: CacheBackend = None, batch_size: int = 500,
+                 flush_interval: float = 1.0, max_queue_size: int = 10000, put_timeout: Optional[float] = 5.0,
+                 on_error: Optional[Callable[[List[Model], Exception], None]] = None) -> None:
+        """
+        :param model_class: The mapped model class
+        :param cache: Optional read-through cache for `find_one`, invalidated by the writes of this repository
+        :param batch_size: The maximum number of models written at a time
+        :param flush_interval: Seconds a model waits at most for its batch to fill
+        :param max_queue_size: The maximum number of models waiting to be written
+        :param put_timeout: Seconds an insert waits for room in a full queue, None to wait indefinitely
+        :param on_error: Called with the models of a failed batch and the error
+        """
+        super().__init__(model_class, cache)
+        self.batch_size = int(max(1, batch_size))
+        self.flush_interval = float(flush_interval)
+        self.max_queue_size = int(max(1, max_queue_size))
+        self.put_timeout = put_timeout
+        self.on_error = on_error
+        self._lock = threading.Lock()
+        self._closed = False
+        self._reset()
+        _buffered.add(self)
+
+    def _reset(self) -> None:
+        self._queue: 'queue.Queue' = queue.Queue(self.max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+
+    @instrumented
+    def insert_one(self, model: Model, session: Session = None):
+        """
+        Enqueues the model, or inserts it with the session when one is provided
+        """
+        if session is not None or self._closed:
+            return super().insert_one(model, session)
+        self._enqueue([model])
+        return model
+
+    @instrumented
+    def insert_many(self, models: List[Model], session: Session = None):
+        """
+        Enqueues the models, or inserts them with the session when one is provided
+        """
+        if session is not None or self._closed:
+            return super().insert_many(models, session)
+        self._enqueue(models)
+        return models
+
+    def _enqueue(self, models: List[Model]) -> None:
+        app = current_app._get_current_object()
+        self._ensure_thread()
+        for model in models:
+            try:
+                self._queue.put((app, model), timeout=self.put_timeout)
+            except queue.Full:
+                raise WriteBufferFullException(
+                    f"Write buffer of {self._model_class.__name__} is full ({self.max_queue_size} models)"
+                ) from None
+        if not has_request_context():
+            # Jobs and commands write their models when their context ends, requests don't wait for them
+            self._get_manager().on_teardown(self, self.flush)
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=f'flask_ddd_repository_write_behind_{self._model_class.__name__}',
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until the models enqueued so far are written
+
+        :param timeout: Seconds to wait at most, None to wait indefinitely
+        :return: Whether the models were written within the timeout
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.empty()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        request = _FlushRequest()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return False
+        return request.done.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        Writes the queued models and stops the background thread. The later inserts are not buffered.
+
+        :param timeout: Seconds to wait at most for the queue to be written, None to wait indefinitely
+        :return: Whether the queue was written within the timeout, the models left are logged otherwise
+        """
+        self._closed = True
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        except queue.Full:
+            pass
+        if not thread.is_alive():
+            return True
+        logger.warning(
+            "Write buffer of %s not written within %ss, about %d models are left",
+            self._model_class.__name__, timeout, self._queue.qsize(),
+        )
+        return False
+
+    def _run(self) -> None:
+        while True:
+            batch: list = []
+            requests: List[_FlushRequest] = []
+            stop = False
+            deadline = None
+            while len(batch) < self.batch_size:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                if isinstance(item, _FlushRequest):
+                    requests.append(item)
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            self._write(batch)
+            for request in requests:
+                request.done.set()
+            if stop:
+                return
+
+    def _write(self, batch: list) -> None:
+        by_app: Dict[Flask, List[Model]] = {}
+        for app, model in batch:
+            by_app.setdefault(app, []).append(model)
+        for app, models in by_app.items():
+            try:
+                with app.app_context():
+                    self.bulk_insert_many(models, chunk_size=self.batch_size)
+            except Exception as e:
+                if self.on_error is None:
+                    logger.exception("Failed to write %d %s models", len(models), self._model_class.__name__)
+                    continue
+                try:
+                    self.on_error(models, e)
+                except Exception:
+                    logger.exception("Write-behind error callback failed")
+
+
+@atexit.register
+def _close_buffers() -> None:
+    deadline = time.monotonic() + _EXIT_TIMEOUT
+    for repository in list(_buffered):
+        repository.close(max(0.0, deadline - time.monotonic()))
+
+
+def _after_fork_in_child() -> None:
+    # The parent process writes its own queue, the background thread doesn't survive the fork
+    for repository in list(_buffered):
+        repository._lock = threading.Lock()
+        repository._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
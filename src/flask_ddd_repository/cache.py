@@ -0,0 +1,127 @@
+import pickle
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+
+class CacheStats:
+    """
+    Counters of a cache backend.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class CacheBackend(ABC):
+    """
+    Base class for the caches used by repositories. Keys are (model class, primary key tuple)
+    pairs and values are the column values of the model.
+    """
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    @abstractmethod
+    def get(self, key: Tuple[type, tuple]) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    def set(self, key: Tuple[type, tuple], value: dict) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: Tuple[type, tuple]) -> None:
+        pass
+
+
+class InMemoryCache(CacheBackend):
+    """
+    Process local cache, bounded to `maxsize` entries evicted in LRU order,
+    and expiring entries after `ttl` seconds when provided.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: 'OrderedDict[Hashable, Tuple[Optional[float], dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[type, tuple]) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= self._clock():
+                del self._entries[key]
+                self.stats.evictions += 1
+                entry = None
+
+            if entry is None:
+                self.stats.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[1]
+
+    def set(self, key: Tuple[type, tuple], value: dict) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl if self.ttl is not None else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key: Tuple[type, tuple]) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedStoreCache(CacheBackend):
+    """
+    Cache shared between processes through a key-value store client exposing
+    `get(name)`, `set(name, value, ex=seconds)` and `delete(*names)`, like redis-py.
+    Size bounds and evictions are left to the store configuration.
+    """
+
+    def __init__(self, client, ttl: Optional[int] = None, prefix: str = 'flask_ddd_repository'):
+        super().__init__()
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _name(self, key: Tuple[type, tuple]) -> str:
+        model_class, primary_key = key
+        return f'{self.prefix}:{model_class.__module__}.{model_class.__qualname__}:{primary_key!r}'
+
+    def get(self, key: Tuple[type, tuple]) -> Optional[dict]:
+        value = self.client.get(self._name(key))
+        if value is None:
+            self.stats.misses += 1
+            return None
+
+        self.stats.hits += 1
+        return pickle.loads(value)
+
+    def set(self, key: Tuple[type, tuple], value: dict) -> None:
+        self.client.set(self._name(key), pickle.dumps(value), ex=self.ttl)
+
+    def delete(self, key: Tuple[type, tuple]) -> None:
+        self.client.delete(self._name(key))
@@ -0,0 +1,96 @@
+import datetime
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Sequence
+
+from sqlalchemy import DateTime
+from sqlalchemy.sql.schema import Column
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - depends on the environment
+    numpy = None
+
+# Dtypes by the python type of the column, the other columns are object arrays
+_DTYPES = {
+    bool: 'bool',
+    int: 'int64',
+    float: 'float64',
+    datetime.datetime: 'datetime64[us]',
+    datetime.date: 'datetime64[D]',
+    datetime.timedelta: 'timedelta64[us]',
+}
+
+# NULLs can't be stored in these dtypes: integers become NaN floats, booleans objects
+_NULLABLE_DTYPES = {
+    'int64': 'float64',
+    'bool': 'object',
+}
+
+
+def column_dtype(column: Column) -> str:
+    """
+    Returns the NumPy dtype of a column type, `object` when it has no native
+    equivalent: strings, decimals, timezone aware datetimes...
+    """
+    if isinstance(column.type, DateTime) and column.type.timezone:
+        return 'object'
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return 'object'
+    return _DTYPES.get(python_type, 'object')
+
+
+class ColumnsBuilder:
+    """
+    Accumulates result rows column by column, one chunk at a time, into NumPy
+    arrays, or lists when NumPy is not installed.
+    """
+
+    def __init__(self, fields: Sequence[str], dtypes: Sequence[str]):
+        self._fields = list(fields)
+        self._dtypes = list(dtypes)
+        self._chunks: List[List[Any]] = [[] for _ in self._fields]
+
+    def add(self, rows: Iterable[tuple]) -> None:
+        columns = list(zip(*rows))
+        if not columns:
+            return
+        for chunks, values, dtype in zip(self._chunks, columns, self._dtypes):
+            if numpy is None:
+                chunks.extend(values)
+            else:
+                chunks.append(self._array(values, dtype))
+
+    @staticmethod
+    def _array(values: tuple, dtype: str):
+        if dtype in _NULLABLE_DTYPES and None in values:
+            dtype = _NULLABLE_DTYPES[dtype]
+        return numpy.array(values, dtype=dtype)
+
+    def build(self) -> Dict[str, Any]:
+        if numpy is None:
+            return dict(zip(self._fields, self._chunks))
+        return {
+            field: numpy.concatenate(chunks) if chunks else numpy.array([], dtype=dtype)
+            for field, chunks, dtype in zip(self._fields, self._chunks, self._dtypes)
+        }
+
+
+def concatenate(results: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Joins the columns of several results with the same fields
+    """
+    if numpy is None:
+        return {field: list(chain.from_iterable(result[field] for result in results)) for field in results[0]}
+    return {field: numpy.concatenate([result[field] for result in results]) for field in results[0]}
+
+
+def take(columns: Dict[str, Any], indices: Sequence[int]) -> Dict[str, Any]:
+    """
+    Returns the rows at `indices` of the columns, in that order
+    """
+    if numpy is None:
+        return {field: [values[index] for index in indices] for field, values in columns.items()}
+    indices = numpy.array(indices, dtype='int64')
+    return {field: values[indices] for field, values in columns.items()}
@@ -11,3 +11,11 @@ class StorageManager:
             return getattr(self, 'app')
 
         raise RuntimeError("No application found. Either work inside a view function or push an application context")
+
+    def teardown(self, exception: BaseException = None) -> None:
+        """
+        Releases the resources bound to the current application context
+
+        :param exception: The exception which ended the context, if any
+        """
+        pass
@@ -0,0 +1,126 @@
+import importlib
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional, Union
+
+import sqlalchemy.pool
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from ..instrumentation import record_checkout_wait
+
+_POOL_OPTION_TYPES = {
+    'pool_size': int,
+    'max_overflow': int,
+    'pool_timeout': float,
+    'pool_recycle': int,
+}
+_POOL_FLAGS = ('pool_pre_ping', 'pool_use_lifo')
+
+
+def _to_bool(value: Union[str, bool]) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def _to_pool_class(value: Union[str, type]) -> type:
+    if not isinstance(value, str):
+        return value
+    if '.' not in value:
+        return getattr(sqlalchemy.pool, value)
+    module, _, name = value.rpartition('.')
+    return getattr(importlib.import_module(module), name)
+
+
+def parse_pool_options(**options: Any) -> Dict[str, Any]:
+    """
+    Converts the pool options of a bind to the `create_engine` argument types,
+    as they are strings when read from environment variables. Empty options are left out.
+
+    :param options: pool_class (class, name in `sqlalchemy.pool` or dotted path), pool_size,
+        max_overflow, pool_timeout, pool_recycle, pool_pre_ping, pool_use_lifo
+    :return: The `create_engine` pool arguments
+    """
+    parsed = {}
+    for key, value in options.items():
+        if value is None:
+            continue
+        if key == 'pool_class':
+            parsed['poolclass'] = _to_pool_class(value)
+        elif key in _POOL_FLAGS:
+            parsed[key] = _to_bool(value)
+        elif key in _POOL_OPTION_TYPES:
+            parsed[key] = _POOL_OPTION_TYPES[key](value)
+        else:
+            raise TypeError(f"Unknown pool option '{key}'")
+    return parsed
+
+
+def _pool_value(pool: Pool, name: str) -> Optional[int]:
+    # Not every pool class keeps these counters, and some expose them as attributes
+    value = getattr(pool, name, None)
+    return value() if callable(value) else value
+
+
+class PoolStats(NamedTuple):
+    pool_class: str
+    size: Optional[int]
+    checked_out: Optional[int]
+    overflow: Optional[int]
+    waiters: int
+    checkouts: int
+    checkout_time_avg: float
+    checkout_time_max: float
+
+
+class PoolMonitor:
+    """
+    Measures the checkouts of an engine connection pool, following the pool
+    when the engine recreates it on dispose. Waiters are the checkouts in progress.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.waiters = 0
+        self.checkouts = 0
+        self.checkout_time_total = 0.0
+        self.checkout_time_max = 0.0
+        self._attach(engine.pool)
+        event.listen(engine, 'engine_disposed', lambda disposed: self._attach(disposed.pool))
+
+    def _attach(self, pool: Pool) -> None:
+        connect = pool.connect
+
+        def timed_connect(*args, **kwargs):
+            with self._lock:
+                self.waiters += 1
+            start = time.perf_counter()
+            try:
+                return connect(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                record_checkout_wait(elapsed)
+                with self._lock:
+                    self.waiters -= 1
+                    self.checkouts += 1
+                    self.checkout_time_total += elapsed
+                    self.checkout_time_max = max(self.checkout_time_max, elapsed)
+
+        pool.connect = timed_connect
+
+    def stats(self) -> PoolStats:
+        pool = self.engine.pool
+        with self._lock:
+            return PoolStats(
+                pool_class=type(pool).__name__,
+                size=_pool_value(pool, 'size'),
+                checked_out=_pool_value(pool, 'checkedout'),
+                overflow=_pool_value(pool, 'overflow'),
+                waiters=self.waiters,
+                checkouts=self.checkouts,
+                checkout_time_avg=self.checkout_time_total / self.checkouts if self.checkouts else 0.0,
+                checkout_time_max=self.checkout_time_max,
+            )
@@ -0,0 +1,104 @@
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+ROUND_ROBIN = 'round_robin'
+LEAST_CHECKED_OUT = 'least_checked_out'
+
+
+class ReplicaSet:
+    """
+    Read replicas of a primary engine. Replicas failing to connect, or failing a
+    health check, are left out of the rotation for `cooldown` seconds. The primary
+    is used when no replica is available.
+    """
+
+    def __init__(self, primary: Engine, replicas: List[Engine], strategy: str = ROUND_ROBIN,
+                 cooldown: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        if strategy not in (ROUND_ROBIN, LEAST_CHECKED_OUT):
+            raise ValueError(f"Unknown replica selection strategy '{strategy}'")
+        self.primary = primary
+        self.replicas = replicas
+        self.strategy = strategy
+        self.cooldown = float(cooldown)
+        self._clock = clock
+        self._counter = itertools.count()
+        self._unavailable_until: Dict[Engine, float] = {}
+        self._lock = threading.Lock()
+        for replica in replicas:
+            event.listen(replica, 'handle_error', self._on_error)
+
+    def available(self) -> List[Engine]:
+        now = self._clock()
+        with self._lock:
+            return [replica for replica in self.replicas if self._unavailable_until.get(replica, 0) <= now]
+
+    def choose(self) -> Engine:
+        """
+        Selects the engine for the next read session
+
+        :return: A replica, or the primary when none is available
+        """
+        replicas = self.available()
+        if not replicas:
+            return self.primary
+        if self.strategy == LEAST_CHECKED_OUT:
+            return min(replicas, key=lambda replica: _checked_out(replica))
+        return replicas[next(self._counter) % len(replicas)]
+
+    def mark_failed(self, replica: Engine) -> None:
+        with self._lock:
+            self._unavailable_until[replica] = self._clock() + self.cooldown
+
+    def health_check(self) -> Dict[Engine, bool]:
+        """
+        Runs a trivial query on every replica, removing the failing ones from the rotation
+
+        :return: The health of every replica
+        """
+        health = {}
+        for replica in self.replicas:
+            try:
+                with replica.connect() as connection:
+                    connection.execute(text('SELECT 1'))
+                health[replica] = True
+            except Exception:
+                self.mark_failed(replica)
+                health[replica] = False
+        return health
+
+    def _on_error(self, context) -> None:
+        # Errors without connection happened while connecting
+        if context.is_disconnect or context.connection is None:
+            self.mark_failed(context.engine)
+
+
+def _checked_out(engine: Engine) -> int:
+    checked_out = getattr(engine.pool, 'checkedout', None)
+    return checked_out() if callable(checked_out) else 0
+
+
+class ReplicaRoutingSession(Session):
+    """
+    Session routing the statements of every bind with replicas to one of them,
+    chosen once per session.
+    """
+
+    def __init__(self, *args, replica_sets: Dict[Engine, ReplicaSet] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._replica_sets = replica_sets or {}
+        self._chosen_replicas: Dict[Engine, Engine] = {}
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        primary = super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        replica_set = self._replica_sets.get(primary)
+        if replica_set is None:
+            return primary
+        if primary not in self._chosen_replicas:
+            self._chosen_replicas[primary] = replica_set.choose()
+        return self._chosen_replicas[primary]
@@ -0,0 +1,113 @@
+import logging
+import sys
+import time
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Attribute of the execution contexts holding the start time of their statement, gone with the context on failure
+_QUERY_START = '_flask_ddd_repository_query_start'
+
+_EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+    'mariadb': 'EXPLAIN ',
+}
+
+
+class SlowQuery(NamedTuple):
+    statement: str
+    parameters: Any
+    duration: float
+    method: Optional[str]
+    model: Optional[str]
+    plan: Optional[List[tuple]]
+
+
+class SlowQueryLog:
+    """
+    Logs the statements slower than `threshold` seconds, with the repository method
+    and model which issued them and, where the dialect supports it, their plan.
+
+    Nothing is listened to until an engine is attached, the caller is only looked up
+    for the slow statements.
+    """
+
+    def __init__(self, threshold: float, explain: bool = True, callback: Callable[[SlowQuery], Any] = None):
+        """
+        :param threshold: Duration in seconds from which a statement is logged
+        :param explain: Capture the plan of the slow statements
+        :param callback: Called with every slow query, besides the log
+        """
+        self.threshold = float(threshold)
+        self.explain = explain
+        self._callback = callback
+
+    def attach(self, engine: Engine) -> None:
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def detach(self, engine: Engine) -> None:
+        event.remove(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.remove(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        if context is not None:
+            setattr(context, _QUERY_START, time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        start = getattr(context, _QUERY_START, None)
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        if duration < self.threshold:
+            return
+
+        method, model = _repository_caller()
+        plan = self._explain(conn, statement, parameters) if self.explain and not executemany else None
+        slow_query = SlowQuery(statement, parameters, duration, method, model, plan)
+        logger.warning(
+            "Slow query (%.3fs) from %s.%s: %s %r%s",
+            duration, model, method, statement, parameters,
+            ''.join(f'\n  {row}' for row in plan) if plan else '',
+            extra={'slow_query': slow_query},
+        )
+        if self._callback is not None:
+            self._callback(slow_query)
+
+    def _explain(self, conn, statement: str, parameters) -> Optional[List[tuple]]:
+        prefix = _EXPLAIN_PREFIXES.get(conn.dialect.name)
+        if prefix is None:
+            return None
+        # On the DBAPI connection, with the statement paramstyle and out of the engine events
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return [tuple(row) for row in cursor.fetchall()]
+        except Exception:
+            logger.debug("Can't explain slow query: %s", statement, exc_info=True)
+            return None
+        finally:
+            cursor.close()
+
+
+def _repository_caller() -> Tuple[Optional[str], Optional[str]]:
+    # Imported here: the repository module depends on the managers
+    from ..repository import AbstractRepository
+
+    # The innermost public repository method, or the innermost private one for generators like `_iter_many`
+    caller = None, None
+    frame = sys._getframe(1)
+    while frame is not None:
+        repository = frame.f_locals.get('self')
+        if isinstance(repository, AbstractRepository):
+            if not frame.f_code.co_name.startswith('_'):
+                return frame.f_code.co_name, repository._model_class.__name__
+            if caller == (None, None):
+                caller = frame.f_code.co_name, repository._model_class.__name__
+        frame = frame.f_back
+    return caller
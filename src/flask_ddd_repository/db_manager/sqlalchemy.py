@@ -1,24 +1,170 @@
+import logging
 import os
 import re
-from typing import Dict, Optional, Union
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple, Union
 
-from flask import Flask
+from flask import Flask, g, has_app_context
+from sqlalchemy import event, inspect
 from sqlalchemy.engine import Engine, create_engine
 from sqlalchemy.engine.base import Connection
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.sql.schema import MetaData
+from sqlalchemy.pool import Pool, QueuePool
+from sqlalchemy.sql.schema import Index, MetaData, Table
 
+from ..instrumentation import BIND_NAME
 from .base import StorageManager
+from .pool import PoolMonitor, PoolStats, parse_pool_options
+from .replicas import ROUND_ROBIN, ReplicaRoutingSession, ReplicaSet
+from .slow_queries import SlowQueryLog
+
+_TABLE_ATTACH_CALLBACK = 'flask_ddd_repository.on_table_attach'
+_UNIT_OF_WORK_SESSIONS = 'flask_ddd_repository_sqlalchemy_sessions'
+_TEARDOWN_CALLBACKS = 'flask_ddd_repository_sqlalchemy_teardown_callbacks'
+_WARM_UP_THREADS = 32
+
+logger = logging.getLogger(__name__)
+
+# Managers whose engines are reset in forked child processes
+_managers: 'weakref.WeakSet[SQLAlchemyManager]' = weakref.WeakSet()
+
+
+@event.listens_for(Table, 'after_parent_attach')
+def _on_table_attach(table: Table, metadata: MetaData):
+    callback = metadata.info.get(_TABLE_ATTACH_CALLBACK)
+    if callback:
+        callback(table)
+
+
+def soft_delete_index(table: Union[Table, type], *columns: str, name: str = None, unique: bool = False) -> Index:
+    """
+    Declares a partial index on the rows which are not soft deleted (WHERE deleted_at IS NULL),
+    matching the criteria repositories add to their queries.
+
+    :param table: The table, or the mapped model class
+    :param columns: The indexed column names, the primary key columns by default
+    :param name: The index name, generated from the table and column names by default
+    :param unique: Whether the index is unique among the rows which are not soft deleted
+    :return: The index, attached to the table
+    """
+    if not isinstance(table, Table):
+        table = inspect(table).local_table
+    indexed = [table.c[column] for column in columns] or list(table.primary_key.columns)
+    live_rows = table.c.deleted_at.is_(None)
+    return Index(
+        name or f'ix_{table.name}_{"_".join(column.name for column in indexed)}_live',
+        *indexed,
+        unique=unique,
+        postgresql_where=live_rows,
+        sqlite_where=live_rows,
+    )
+
+
+class _LazyMetaData(MetaData):
+    """
+    MetaData whose engine is created on the first access to its bind
+    """
+
+    def __init__(self, create_bind: Callable[[], Engine]):
+        super().__init__()
+        self._create_bind = create_bind
+        self._bind_lock = threading.Lock()
+
+    @property
+    def bind(self):
+        if self._create_bind is not None:
+            with self._bind_lock:
+                if self._create_bind is not None:
+                    self._bind = self._create_bind()
+                    self._create_bind = None
+        return self._bind
+
+    @bind.setter
+    def bind(self, bind):
+        self._create_bind = None
+        MetaData.bind.fset(self, bind)
+
+    def is_bound(self):
+        return self._create_bind is not None or self._bind is not None
+
+
+def _after_fork_in_child() -> None:
+    for manager in list(_managers):
+        manager._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _is_in_process(engine: Engine) -> bool:
+    # The connections of in-memory SQLite databases hold the data, they can't be replaced
+    return engine.url.get_backend_name() == 'sqlite' and engine.url.database in (None, '', ':memory:')
+
+
+def _open_connection(pool: Pool, barrier: threading.Barrier) -> None:
+    try:
+        connection = pool.connect()
+    except BaseException:
+        barrier.abort()
+        raise
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        # Another connection failed, this one is pooled anyway
+        pass
+    finally:
+        connection.close()
+
+
+def _sync_engine(engine):
+    return getattr(engine, 'sync_engine', engine)
+
+
+def _parse_replicas(replicas: Union[str, List[dict]]) -> List[dict]:
+    if not isinstance(replicas, str):
+        return list(replicas)
+
+    parsed = []
+    for replica in filter(None, (replica.strip() for replica in replicas.split(','))):
+        host, _, port = replica.partition(':')
+        parsed.append(dict(db_host=host, db_port=port) if port else dict(db_host=host))
+    return parsed
+
+
+def _is_sqlite(db_type: str) -> bool:
+    # Dialect names may carry the driver, e.g. sqlite+pysqlite
+    return db_type.split('+')[0] == 'sqlite'
 
 
 class SQLAlchemyManager(StorageManager):
+    session_class: type = Session
+
     def __init__(self, app: Flask):
         self.app = app
+        self._sessionmakers: Dict[Tuple[Optional[str], bool], sessionmaker] = {}
+        self._pool_monitors: Dict[str, PoolMonitor] = {}
+        self._engines: Dict[str, Engine] = {}
+        self._replica_sets: Dict[str, ReplicaSet] = {}
+        self._replicated_binds: Set[str] = set()
+        self.unit_of_work: bool = bool(app.config.get('SQLALCHEMY_UNIT_OF_WORK', False))
+        self.lazy_engines: bool = bool(app.config.get('SQLALCHEMY_LAZY_ENGINES', False))
+        self.warm_up_connections: int = int(app.config.get('SQLALCHEMY_WARM_UP_CONNECTIONS', 0))
+        self.warm_up_after_fork: bool = bool(app.config.get('SQLALCHEMY_WARM_UP_AFTER_FORK', False))
+        threshold = app.config.get('SQLALCHEMY_SLOW_QUERY_THRESHOLD')
+        self.slow_query_log: Optional[SlowQueryLog] = SlowQueryLog(
+            threshold, explain=bool(app.config.get('SQLALCHEMY_SLOW_QUERY_EXPLAIN', True))
+        ) if threshold is not None else None
         if not app.config.get('SQLALCHEMY_BINDS'):
             self._init_from_env_vars()
         else:
             for bind in app.config.get('SQLALCHEMY_BINDS', []):
                 self.init_bind(**bind)
+        _managers.add(self)
+        if self.warm_up_connections and not self.warm_up_after_fork:
+            self.warm_up()
 
     def init_bind(
             self,
@@ -29,18 +175,71 @@ class SQLAlchemyManager(StorageManager):
             db_name: Optional[str] = None,
             db_user: Optional[str] = None,
             db_password: Optional[str] = None,
+            pool_class: Union[str, type, None] = None,
+            pool_size: Optional[int] = None,
+            max_overflow: Optional[int] = None,
+            pool_timeout: Optional[float] = None,
+            pool_recycle: Optional[int] = None,
+            pool_pre_ping: Optional[bool] = None,
+            pool_use_lifo: Optional[bool] = None,
+            replicas: Union[str, List[dict], None] = None,
+            replica_strategy: str = ROUND_ROBIN,
+            replica_cooldown: float = 30.0,
     ):
+        """
+        Creates the engine and the MetaData of a bind. Pool options left empty
+        keep the SQLAlchemy defaults (and the extension ones for non-SQLite binds).
+        With `SQLALCHEMY_LAZY_ENGINES` the engines of the bind and of its replicas
+        are created on the first access to the MetaData bind instead.
+
+        :param pool_class: Pool class, its name in `sqlalchemy.pool` or its dotted path
+        :param replicas: Read replicas, as dictionaries of the connection parameters differing
+            from the bind ones, or as a comma separated list of `host[:port]`
+        :param replica_strategy: Replica selection, `round_robin` or `least_checked_out`
+        :param replica_cooldown: Seconds a failing replica is left out of the rotation
+        """
         if not self.metadata().get(bind_name):
-            self.metadata()[bind_name] = MetaData(
-                bind=self._create_engine(
-                    db_type=db_type,
-                    db_host=db_host,
-                    db_port=db_port,
-                    db_name=db_name,
-                    db_user=db_user,
-                    db_password=db_password,
-                )
+            pool_options = {
+                key: value for key, value in dict(
+                    pool_class=pool_class,
+                    pool_size=pool_size,
+                    max_overflow=max_overflow,
+                    pool_timeout=pool_timeout,
+                    pool_recycle=pool_recycle,
+                    pool_pre_ping=pool_pre_ping,
+                    pool_use_lifo=pool_use_lifo,
+                ).items() if value is not None
+            }
+            connection = dict(
+                db_type=db_type,
+                db_host=db_host,
+                db_port=db_port,
+                db_name=db_name,
+                db_user=db_user,
+                db_password=db_password,
             )
+
+            def create_engines() -> Engine:
+                engine = self._create_engine(**connection, **pool_options)
+                self._observe_engine(bind_name, engine)
+                if replicas:
+                    replica_engines = []
+                    for index, replica in enumerate(_parse_replicas(replicas)):
+                        replica_engine = self._create_engine(**{**connection, **replica}, **pool_options)
+                        self._observe_engine(f'{bind_name}/replica_{index}', replica_engine)
+                        replica_engines.append(_sync_engine(replica_engine))
+                    self._replica_sets[bind_name] = ReplicaSet(
+                        _sync_engine(engine), replica_engines, replica_strategy, float(replica_cooldown)
+                    )
+                return engine
+
+            if replicas:
+                self._replicated_binds.add(bind_name)
+            metadata = _LazyMetaData(create_engines) if self.lazy_engines else MetaData(bind=create_engines())
+            metadata.info[_TABLE_ATTACH_CALLBACK] = self._on_table_attach
+            metadata.info[BIND_NAME] = bind_name
+            self.metadata()[bind_name] = metadata
+            self._sessionmakers.clear()
         else:
             # TODO: Create specific Exception
             raise Exception("Already defined")
@@ -53,43 +252,233 @@ class SQLAlchemyManager(StorageManager):
             db_name: Optional[str] = None,
             db_user: Optional[str] = None,
             db_password: Optional[str] = None,
+            **pool_options,
     ) -> Engine:
-        if db_type == 'sqlite':
-            sqlalchemy_db_uri = f'{db_type}://{"/" if db_host else ""}{db_host}'
-            return create_engine(
-                sqlalchemy_db_uri,
-                echo=self.app.debug,
-                echo_pool=self.app.debug,
-                # execution_options=app.config.get('SQLALCHEMY_EXECUTION_OPTIONS', {}),
-            )
+        return create_engine(
+            self._engine_url(db_type, db_host, db_port, db_name, db_user, db_password),
+            **self._engine_options(db_type, **pool_options),
+        )
+
+    def _engine_url(
+            self,
+            db_type: str,
+            db_host: str,
+            db_port: Optional[int] = None,
+            db_name: Optional[str] = None,
+            db_user: Optional[str] = None,
+            db_password: Optional[str] = None,
+    ) -> str:
+        if _is_sqlite(db_type):
+            return f'{db_type}://{"/" if db_host else ""}{db_host}'
         else:
-            sqlalchemy_db_uri = f'{db_type}://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
-            return create_engine(
-                sqlalchemy_db_uri,
-                echo=self.app.debug,
-                echo_pool=self.app.debug,
-                # execution_options=app.config.get('SQLALCHEMY_EXECUTION_OPTIONS', {}),
-                max_overflow=5,
-                pool_size=10,
-                pool_recycle=120,
-            )
+            return f'{db_type}://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
+
+    def _engine_options(self, db_type: str, **pool_options) -> dict:
+        options = dict(
+            echo=self.app.debug,
+            echo_pool=self.app.debug,
+            # execution_options=app.config.get('SQLALCHEMY_EXECUTION_OPTIONS', {}),
+        )
+        pool_options = parse_pool_options(**pool_options)
+        if not _is_sqlite(db_type):
+            options.update(pool_recycle=120)
+            # Only queue pools are sized, NullPool and the like reject these arguments
+            if issubclass(pool_options.get('poolclass', QueuePool), QueuePool):
+                options.update(
+                    max_overflow=5,
+                    pool_size=10,
+                )
+        options.update(pool_options)
+        return options
+
+    def pool_stats(self) -> Dict[str, PoolStats]:
+        """
+        Returns a snapshot of the connection pool of every bind: checked out connections,
+        overflow, checkouts in progress (waiters) and checkout latency.
+
+        :return: The pool statistics, by bind name
+        """
+        return {bind_name: monitor.stats() for bind_name, monitor in self._pool_monitors.items()}
+
+    def _observe_engine(self, name: str, engine: Engine) -> None:
+        # Async engines are observed through their sync facade
+        if isinstance(_sync_engine(engine), Engine):
+            self._engines[name] = _sync_engine(engine)
+            self._pool_monitors[name] = PoolMonitor(_sync_engine(engine))
+            if self.slow_query_log is not None:
+                self.slow_query_log.attach(_sync_engine(engine))
+
+    def warm_up(self, connections: Optional[int] = None) -> Dict[str, int]:
+        """
+        Opens pooled connections of every bind and replica in parallel, so that the
+        first requests don't pay the connection handshake. Lazy engines are created.
+        Only queue pools keep their connections for the other threads, the other
+        engines are skipped, as well as async ones. Failures are logged.
+
+        :param connections: Connections per engine, up to its pool size, `SQLALCHEMY_WARM_UP_CONNECTIONS` by default
+        :return: The connections opened, by engine name
+        """
+        connections = self.warm_up_connections if connections is None else int(connections)
+        self.binds()
+        pools = {
+            name: engine.pool for name, engine in self._engines.items()
+            if isinstance(engine.pool, QueuePool) and not engine.dialect.is_async
+        }
+        counts = {name: min(connections, pool.size()) for name, pool in pools.items()}
+        if sum(counts.values()) <= 0:
+            return {}
+
+        # Connections stay checked out until those of their engine are all open, so that none
+        # of them is reused, and are closed by the thread which opened them
+        barriers = {name: threading.Barrier(count) for name, count in counts.items() if count > 0}
+        workers = max(max(counts.values()), min(sum(counts.values()), _WARM_UP_THREADS))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='flask_ddd_repository_warm_up') as executor:
+            futures = {
+                name: [executor.submit(_open_connection, pools[name], barrier) for _ in range(barrier.parties)]
+                for name, barrier in barriers.items()
+            }
+        opened = {}
+        for name, engine_futures in futures.items():
+            opened[name] = 0
+            for future in engine_futures:
+                try:
+                    future.result()
+                    opened[name] += 1
+                except Exception:
+                    logger.warning("Failed to open a connection of '%s' on warm-up", name, exc_info=True)
+        return opened
+
+    def _after_fork(self) -> None:
+        # Connections inherited from the parent process still belong to it: they are dropped without being closed
+        for engine in self._engines.values():
+            if not _is_in_process(engine):
+                engine.dispose(close=False)
+        if self.warm_up_connections and self.warm_up_after_fork:
+            self.warm_up()
+
+    def create_session(self, bind_name: str = None, read_only: bool = False) -> Session:
+        """
+        Creates a session for a bind, or for all of them when no bind name is given
 
-    def create_session(self, bind_name: str = None) -> Session:
+        :param bind_name: The bind name
+        :param read_only: Route the session statements to the bind replicas, when there are any
+        :return: The session
+        """
+        key = (bind_name or None, read_only and self.has_replicas())
+        session = self._sessionmakers.get(key)
+        if session is None:
+            session = self._sessionmakers[key] = self._create_sessionmaker(*key)
+
+        return session()
+
+    def _create_sessionmaker(self, bind_name: Optional[str] = None, read_only: bool = False) -> sessionmaker:
+        """
+        Builds the session factory for a bind, or the multi-bind one routing
+        every known table to its own engine when no bind name is given.
+        The result is cached by `create_session` until the binds or their tables change.
+
+        :param bind_name: The bind name, None for the multi-bind factory
+        :param read_only: Route the sessions to the bind replicas
+        :return: The session factory
+        """
+        # Engines are resolved first, lazy ones register their replicas when they are created
         if not bind_name:
-            session = sessionmaker(
-                binds={
-                    table: meta.bind
-                    for meta in self.metadata().values()
-                    for table in meta.tables.values()
-                }
-            )
-        elif self.binds().get(bind_name):
-            session = sessionmaker(bind=self.binds().get(bind_name))
+            binds = dict(binds={
+                table: meta.bind
+                for meta in self.metadata().values()
+                for table in meta.tables.values()
+            })
+        elif bind_name in self.metadata() and self.metadata()[bind_name].bind:
+            binds = dict(bind=self.metadata()[bind_name].bind)
         else:
             # TODO: Create specific Exception
             raise Exception(f"Bind '{bind_name}' not initialised")
 
-        return session()
+        # Models are handed out after their session is closed, so they must not be expired on commit
+        options = dict(class_=self.session_class, expire_on_commit=False)
+        if read_only:
+            options.update(self._replica_session_options())
+        return sessionmaker(**binds, **options)
+
+    def _replica_session_options(self) -> dict:
+        return dict(
+            class_=ReplicaRoutingSession,
+            replica_sets={replica_set.primary: replica_set for replica_set in self._replica_sets.values()},
+        )
+
+    def has_replicas(self) -> bool:
+        return bool(self._replicated_binds)
+
+    def check_replicas(self) -> Dict[str, List[bool]]:
+        """
+        Runs the health check of every replica, failing replicas are left out of the rotation for a while
+
+        :return: The health of the replicas, by bind name
+        """
+        return {
+            bind_name: list(replica_set.health_check().values())
+            for bind_name, replica_set in self._replica_sets.items()
+        }
+
+    def unit_of_work_session(self, bind_name: str = None) -> Session:
+        """
+        Returns the session shared by the current application context for a bind,
+        opening it on first use. It is committed, or rolled back, on teardown.
+
+        :param bind_name: The bind name, None for the multi-bind session
+        :return: The application context session
+        """
+        sessions = g.setdefault(_UNIT_OF_WORK_SESSIONS, {})
+        bind_name = bind_name or None
+        if bind_name not in sessions:
+            sessions[bind_name] = self.create_session(bind_name)
+        return sessions[bind_name]
+
+    def has_unit_of_work(self) -> bool:
+        """
+        :return: Whether a session has been opened by the unit of work of the current application context
+        """
+        return has_app_context() and bool(g.get(_UNIT_OF_WORK_SESSIONS))
+
+    def on_teardown(self, key: Hashable, callback: Callable[[], None]) -> None:
+        """
+        Calls `callback` once on teardown of the current application context, after the unit of work
+
+        :param key: Identifies the callback, registering the same key again replaces it
+        :param callback: Called without arguments, its errors are logged
+        """
+        g.setdefault(_TEARDOWN_CALLBACKS, {})[key] = callback
+
+    def teardown(self, exception: BaseException = None) -> None:
+        sessions: Dict[Optional[str], Session] = g.pop(_UNIT_OF_WORK_SESSIONS, {})
+        error = exception
+        try:
+            for session in sessions.values():
+                try:
+                    if error is None:
+                        session.commit()
+                    else:
+                        session.rollback()
+                except Exception as e:
+                    # Roll back the remaining sessions as well
+                    session.rollback()
+                    error = e
+                finally:
+                    session.close()
+        finally:
+            for callback in g.pop(_TEARDOWN_CALLBACKS, {}).values():
+                try:
+                    callback()
+                except Exception:
+                    logger.exception("Teardown callback failed")
+
+        if error is not exception:
+            raise error
+
+    def _on_table_attach(self, table: Table) -> None:
+        # Only the multi-bind factories hold a table map, single bind factories stay valid.
+        self._sessionmakers.pop((None, False), None)
+        self._sessionmakers.pop((None, True), None)
 
     def binds(self) -> Dict[str, Union[Engine, Connection, None]]:
         return {key: metadata.bind for key, metadata in self.metadata().items()}
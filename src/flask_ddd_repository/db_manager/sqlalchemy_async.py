@@ -0,0 +1,49 @@
+from typing import Optional
+
+from flask import Flask
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from ..exceptions import UnitOfWorkNotSupportedException
+from .replicas import ReplicaRoutingSession
+from .sqlalchemy import SQLAlchemyManager
+
+
+class AsyncSQLAlchemyManager(SQLAlchemyManager):
+    """
+    Manager of SQLAlchemy asyncio engines and sessions. Binds are configured like
+    `SQLAlchemyManager` ones, with an async driver in `db_type` (e.g. `sqlite+aiosqlite`,
+    `postgresql+asyncpg`). The MetaData objects are bound to the async engines, so the
+    schema has to be created through `AsyncConnection.run_sync`.
+
+    Sessions can't be shared with the application context, as its teardown is synchronous:
+    `SQLALCHEMY_UNIT_OF_WORK` is rejected.
+    """
+
+    session_class: type = AsyncSession
+
+    def __init__(self, app: Flask):
+        if app.config.get('SQLALCHEMY_UNIT_OF_WORK'):
+            raise UnitOfWorkNotSupportedException("Async sessions can't be shared with the application context")
+        super().__init__(app)
+
+    def _create_engine(
+            self,
+            db_type: str,
+            db_host: str,
+            db_port: Optional[int] = None,
+            db_name: Optional[str] = None,
+            db_user: Optional[str] = None,
+            db_password: Optional[str] = None,
+            **pool_options,
+    ) -> AsyncEngine:
+        return create_async_engine(
+            self._engine_url(db_type, db_host, db_port, db_name, db_user, db_password),
+            **self._engine_options(db_type, **pool_options),
+        )
+
+    def _replica_session_options(self) -> dict:
+        # AsyncSession proxies a sync session, which does the routing
+        return dict(super()._replica_session_options(), class_=AsyncSession, sync_session_class=ReplicaRoutingSession)
+
+    def unit_of_work_session(self, bind_name: str = None) -> AsyncSession:
+        raise UnitOfWorkNotSupportedException("Async sessions can't be shared with the application context")
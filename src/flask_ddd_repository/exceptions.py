@@ -1,2 +1,22 @@
 class ModelNotFoundException(Exception):
     pass
+
+
+class InvalidCursorException(Exception):
+    pass
+
+
+class SoftDeleteNotSupportedException(Exception):
+    pass
+
+
+class UnitOfWorkNotSupportedException(Exception):
+    pass
+
+
+class WriteBufferFullException(Exception):
+    pass
+
+
+class VersionConflictException(Exception):
+    pass
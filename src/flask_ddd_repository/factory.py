@@ -1,6 +1,91 @@
+import weakref
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Union
+
+# Creation plans by model class, computed on first use and dropped when classes are mapped
+_plans: 'weakref.WeakKeyDictionary[type, _CreatePlan]' = weakref.WeakKeyDictionary()
+_generation = 0
+
+
+class _CreatePlan:
+    """
+    The assignable attributes of a model class: those of an instance created without
+    arguments, dunder names excluded. Checking them replaces a `hasattr` per value,
+    which goes through the descriptors of mapped attributes.
+    """
+    __slots__ = ('model_class', 'attributes', 'generation')
+
+    def __init__(self, model_class: type):
+        _listen_for_mappers()
+        self.model_class = model_class
+        self.attributes = frozenset(name for name in dir(model_class()) if not name.startswith('__'))
+        self.generation = _generation
+
+    def create(self, values: Mapping[str, Any]):
+        model = self.model_class()
+        attributes = self.attributes
+        for key, value in values.items():
+            if key in attributes:
+                setattr(model, key, value)
+        return model
+
+    def create_many(self, values: Iterable[Mapping[str, Any]]) -> list:
+        model_class, attributes = self.model_class, self.attributes
+        models = []
+        for item in values:
+            model = model_class()
+            for key, value in item.items():
+                if key in attributes:
+                    setattr(model, key, value)
+            models.append(model)
+        return models
+
+    def create_from_columns(self, columns: Mapping[str, Sequence]) -> list:
+        # No dictionary per row: values are zipped column by column
+        keys = [key for key in columns if key in self.attributes]
+        if len({len(columns[key]) for key in keys}) > 1:
+            raise ValueError("Columns must have the same length")
+        model_class = self.model_class
+        models = []
+        for row in zip(*(columns[key] for key in keys)):
+            model = model_class()
+            for key, value in zip(keys, row):
+                setattr(model, key, value)
+            models.append(model)
+        return models
+
+
+def _listen_for_mappers() -> None:
+    # Registered by the first plan, models can be imported without SQLAlchemy
+    from sqlalchemy import event
+    from sqlalchemy.orm import Mapper
+
+    if not event.contains(Mapper, 'after_configured', _clear_plans):
+        # Mapping a class adds its column attributes, configuring the mappers adds the backrefs
+        event.listen(Mapper, 'instrument_class', _clear_plans_of_mapped_class)
+        event.listen(Mapper, 'after_configured', _clear_plans)
+
+
+def _clear_plans_of_mapped_class(mapper, model_class: type) -> None:
+    _clear_plans()
+
+
+def _clear_plans() -> None:
+    global _generation
+    _generation += 1
+    _plans.clear()
+
+
 class Factory:
     def __init__(self, model_class):
         self._model_class = model_class
+        self._plan = None
+
+    def _get_plan(self) -> _CreatePlan:
+        if self._plan is None or self._plan.generation != _generation:
+            self._plan = _plans.get(self._model_class)
+            if self._plan is None:
+                self._plan = _plans[self._model_class] = _CreatePlan(self._model_class)
+        return self._plan
 
     def create(self, values: dict):
         """
@@ -9,10 +94,17 @@ class Factory:
         :param values: Key-value dictionary for model values
         :return: The model instance object
         """
-        model = self._model_class()
+        return self._get_plan().create(values)
 
-        for key, value in values.items():
-            if hasattr(model, key):
-                setattr(model, key, value)
+    def create_many(self, values: Union[Iterable[dict], Dict[str, Sequence]]) -> List:
+        """
+        Creates several model objects with the attribute lookups of the model class done once
 
-        return model
+        :param values: Key-value dictionaries for model values, or columns: a dictionary
+            of equal length sequences of values, by key
+        :return: The model instance objects
+        """
+        plan = self._get_plan()
+        if isinstance(values, Mapping):
+            return plan.create_from_columns(values)
+        return plan.create_many(values)
@@ -0,0 +1,329 @@
+import functools
+import inspect
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from flask import current_app, has_app_context
+from flask.signals import Namespace
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_signals = Namespace()
+
+#: Sent with the `record` of every instrumented repository call, needs blinker
+repository_called = _signals.signal('flask-ddd-repository-called')
+
+# Metadata info key holding the bind name, set by the SQLAlchemy manager
+BIND_NAME = 'flask_ddd_repository.bind_name'
+
+
+class CallRecord(NamedTuple):
+    method: str
+    model: str
+    bind: Optional[str]
+    duration: float
+    statements: int
+    rows: int
+    checkout_wait: float
+    error: bool
+
+
+class MetricsSink(ABC):
+    """
+    Receives the records of the instrumented repository calls
+    """
+
+    @abstractmethod
+    def record(self, record: CallRecord) -> None:
+        pass
+
+
+class CallbackSink(MetricsSink):
+    def __init__(self, callback: Callable[[CallRecord], Any]):
+        self._callback = callback
+
+    def record(self, record: CallRecord) -> None:
+        self._callback(record)
+
+
+class SignalSink(MetricsSink):
+    """
+    Publishes the records through the `repository_called` Flask signal, sent by the current application
+    """
+
+    def record(self, record: CallRecord) -> None:
+        repository_called.send(current_app._get_current_object() if has_app_context() else None, record=record)
+
+
+class _Histogram:
+    """
+    Log-linear histogram: every power of two is split in `precision` buckets, so
+    percentiles are approximated within 1 / `precision` of their value.
+    """
+
+    def __init__(self, precision: int = 16):
+        self._precision = precision
+        self._buckets: Dict[int, int] = {}
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        bucket = self._bucket(value)
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+        self.count += 1
+
+    def _bucket(self, value: float) -> int:
+        if value <= 0:
+            return -2 ** 31
+        mantissa, exponent = math.frexp(value)
+        return exponent * self._precision + int((mantissa - 0.5) * 2 * self._precision)
+
+    def _upper_bound(self, bucket: int) -> float:
+        if bucket == -2 ** 31:
+            return 0.0
+        exponent, step = divmod(bucket, self._precision)
+        return math.ldexp(0.5 + (step + 1) / (2 * self._precision), exponent)
+
+    def percentile(self, percent: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                return self._upper_bound(bucket)
+        return self._upper_bound(max(self._buckets))
+
+
+class MethodStats(NamedTuple):
+    calls: int
+    errors: int
+    total_time: float
+    statements: int
+    rows: int
+    checkout_wait: float
+    p50: float
+    p95: float
+    p99: float
+
+
+class MetricsAggregator(MetricsSink):
+    """
+    Aggregates the records in memory by (method, model, bind), with percentile histograms of the durations
+    """
+
+    def __init__(self, precision: int = 16):
+        self._precision = precision
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple[str, str, Optional[str]], List] = {}
+
+    def record(self, record: CallRecord) -> None:
+        key = (record.method, record.model, record.bind)
+        with self._lock:
+            totals = self._totals.get(key)
+            if totals is None:
+                totals = self._totals[key] = [0, 0, 0.0, 0, 0, 0.0, _Histogram(self._precision)]
+            totals[0] += 1
+            totals[1] += record.error
+            totals[2] += record.duration
+            totals[3] += record.statements
+            totals[4] += record.rows
+            totals[5] += record.checkout_wait
+            totals[6].add(record.duration)
+
+    def stats(self) -> Dict[Tuple[str, str, Optional[str]], MethodStats]:
+        with self._lock:
+            return {
+                key: MethodStats(*totals[:6], *(totals[6].percentile(percent) for percent in (50, 95, 99)))
+                for key, totals in self._totals.items()
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._totals.clear()
+
+
+class _Call:
+    __slots__ = ('statements', 'checkout_wait', 'rows')
+
+    def __init__(self):
+        self.statements = 0
+        self.checkout_wait = 0.0
+        self.rows = 0
+
+
+_sinks: List[MetricsSink] = []
+_sinks_lock = threading.Lock()
+_current_call: 'ContextVar[Optional[_Call]]' = ContextVar('flask_ddd_repository_call', default=None)
+
+
+def add_sink(sink: MetricsSink) -> None:
+    """
+    Attaches a sink. The statement counting engine event is only listened to while a sink is attached.
+    """
+    with _sinks_lock:
+        if not _sinks:
+            event.listen(Engine, 'before_cursor_execute', _count_statement)
+        _sinks.append(sink)
+
+
+def remove_sink(sink: MetricsSink) -> None:
+    with _sinks_lock:
+        _sinks.remove(sink)
+        if not _sinks:
+            event.remove(Engine, 'before_cursor_execute', _count_statement)
+
+
+def _count_statement(*args) -> None:
+    call = _current_call.get()
+    if call is not None:
+        call.statements += 1
+
+
+def record_checkout_wait(seconds: float) -> None:
+    """
+    Adds a connection checkout time to the current instrumented call
+    """
+    call = _current_call.get()
+    if call is not None:
+        call.checkout_wait += seconds
+
+
+def _row_count(result: Any) -> int:
+    if isinstance(result, bool) or result is None:
+        return 0
+    if isinstance(result, int):
+        return result
+    # UpsertResult, then BatchResult and Page
+    inserted, updated = getattr(result, 'inserted', None), getattr(result, 'updated', None)
+    if isinstance(inserted, int) and isinstance(updated, int):
+        return inserted + updated
+    items = getattr(result, 'items', None)
+    if isinstance(items, list):
+        return len(items)
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    # Columns by field
+    if isinstance(result, dict):
+        return len(next(iter(result.values()), ()))
+    return 1
+
+
+def _publish(name: str, repository, bind_name: Optional[str], call: _Call, start: float, error: bool) -> None:
+    duration = time.perf_counter() - start
+    # Nested calls are accounted in the calls around them
+    parent = _current_call.get()
+    if parent is not None:
+        parent.statements += call.statements
+        parent.checkout_wait += call.checkout_wait
+    record = CallRecord(
+        method=name,
+        model=repository._model_class.__name__,
+        bind=bind_name if bind_name is not None else repository._bind_name(),
+        duration=duration,
+        statements=call.statements,
+        rows=call.rows,
+        checkout_wait=call.checkout_wait,
+        error=error,
+    )
+    for sink in list(_sinks):
+        sink.record(record)
+
+
+def instrumented(method: Callable) -> Callable:
+    """
+    Records the calls of a repository method while a sink is attached. Generators
+    are measured from their creation until they are exhausted or closed.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not _sinks:
+            return method(self, *args, **kwargs)
+
+        call = _Call()
+        token = _current_call.set(call)
+        start = time.perf_counter()
+        error = True
+        try:
+            result = method(self, *args, **kwargs)
+            error = False
+        finally:
+            _current_call.reset(token)
+            if error:
+                _publish(name, self, None, call, start, error)
+        if inspect.isgenerator(result):
+            return _instrumented_generator(name, self, result, call, start)
+        call.rows = _row_count(result)
+        _publish(name, self, None, call, start, error)
+        return result
+
+    return wrapper
+
+
+def _instrumented_generator(name: str, repository, generator: Iterator, call: _Call, start: float) -> Iterator:
+    error = False
+    try:
+        while True:
+            token = _current_call.set(call)
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+            except BaseException:
+                error = True
+                raise
+            finally:
+                _current_call.reset(token)
+            call.rows += 1
+            yield item
+    finally:
+        generator.close()
+        _publish(name, repository, None, call, start, error)
+
+
+class _InstrumentedSession:
+    def __init__(self, context, repository, bind_name: Optional[str]):
+        self._context = context
+        self._repository = repository
+        self._bind_name = bind_name
+        self._call = _Call()
+
+    def __enter__(self):
+        self._token = _current_call.set(self._call)
+        self._start = time.perf_counter()
+        try:
+            return self._context.__enter__()
+        except BaseException:
+            self._exit(True)
+            raise
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            return self._context.__exit__(exc_type, exc_value, traceback)
+        finally:
+            self._exit(exc_type is not None)
+
+    def _exit(self, error: bool) -> None:
+        _current_call.reset(self._token)
+        _publish('session', self._repository, self._bind_name, self._call, self._start, error)
+
+
+def instrumented_session(function: Callable) -> Callable:
+    """
+    Records the lifetime of the sessions managed by a repository, commit included, while a sink is attached
+    """
+
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        context = function(self, *args, **kwargs)
+        if not _sinks:
+            return context
+        return _InstrumentedSession(context, self, kwargs.get('bind_name'))
+
+    return wrapper
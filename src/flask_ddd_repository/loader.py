@@ -0,0 +1,84 @@
+from typing import Any, Dict, Iterable, List, Union
+
+from .exceptions import ModelNotFoundException
+
+
+class Deferred:
+    """
+    Result of a queued lookup, resolved with the other pending lookups of its loader on first access.
+    """
+
+    def __init__(self, loader: 'FindOneLoader', primary_key_value: Any):
+        self._loader = loader
+        self.primary_key_value = primary_key_value
+
+    def get(self):
+        """
+        Returns the model, dispatching the pending lookups of the loader if needed
+
+        :return: The model
+        """
+        model = self._loader._result(self.primary_key_value)
+        if model is None:
+            raise ModelNotFoundException(f"Model not found with primary key value: {self.primary_key_value}")
+        return model
+
+
+class FindOneLoader:
+    """
+    Coalesces `find_one` lookups into batched `find_many_by_pks` queries. Lookups are
+    queued by `load` and all the pending ones are resolved together when the first result
+    is accessed. Results are kept for the loader lifetime, and dropped by repository writes.
+    """
+
+    def __init__(self, repository, include_soft_deleted: bool = False):
+        self._repository = repository
+        self._include_soft_deleted = include_soft_deleted
+        self._pending: Dict[tuple, Any] = {}
+        self._results: Dict[tuple, Any] = {}
+
+    def load(self, primary_key_value: Union[str, int]) -> Deferred:
+        """
+        Queues the lookup of a model
+
+        :param primary_key_value: The primary key value
+        :return: The deferred model
+        """
+        key = self._repository._primary_key_tuple(primary_key_value)
+        if key not in self._results:
+            self._pending[key] = primary_key_value
+        return Deferred(self, primary_key_value)
+
+    def load_many(self, primary_key_values: Iterable[Union[str, int]]) -> List[Deferred]:
+        return [self.load(primary_key_value) for primary_key_value in primary_key_values]
+
+    def dispatch(self) -> None:
+        """
+        Resolves all the pending lookups with a batched query
+        """
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        result = self._repository.find_many_by_pks(
+            list(pending.values()), include_soft_deleted=self._include_soft_deleted
+        )
+        self._results.update({key: None for key in pending})
+        self._results.update({self._repository._model_primary_key(model): model for model in result.items})
+
+    def clear(self, primary_key_values: Iterable[tuple] = None) -> None:
+        """
+        Forgets the results of the given primary key tuples, all of them when not provided
+        """
+        if primary_key_values is None:
+            self._results.clear()
+        else:
+            for key in primary_key_values:
+                self._results.pop(key, None)
+
+    def _result(self, primary_key_value: Any):
+        key = self._repository._primary_key_tuple(primary_key_value)
+        if key not in self._results:
+            self._pending[key] = primary_key_value
+            self.dispatch()
+        return self._results.get(key)
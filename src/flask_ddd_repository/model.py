@@ -9,6 +9,8 @@ class Model(ABC):
     """
     Base model class to be used for all entities.
     """
+    # Instances of the subclasses have a dictionary unless they declare slots too
+    __slots__ = ()
 
     __factory: Type = Factory
     # TODO: Implement metaclass to check for variables assignment
@@ -35,3 +37,21 @@ class Model(ABC):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     deleted_at: Optional[datetime] = None
+
+
+class CompactModel(Model):
+    """
+    Base class of domain objects which are not mapped, storing their attributes in
+    slots instead of an instance dictionary: large in-memory collections take less
+    memory. Subclasses declare their own attributes in `__slots__` and call this
+    constructor, which sets the timestamps to None.
+
+    Mapped classes must use `Model`, SQLAlchemy keeps its state in the instance
+    dictionary.
+    """
+    __slots__ = ('created_at', 'updated_at', 'deleted_at')
+
+    def __init__(self):
+        self.created_at = None
+        self.updated_at = None
+        self.deleted_at = None
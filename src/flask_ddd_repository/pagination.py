@@ -0,0 +1,87 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from typing import Any, List, NamedTuple, Optional, Sequence
+from uuid import UUID
+
+from .exceptions import InvalidCursorException
+
+
+class Page(NamedTuple):
+    """
+    A page of results and the opaque cursor pointing to the following one,
+    None when there are no more results.
+    """
+    items: List[Any]
+    next_cursor: Optional[str]
+
+
+def _encode_datetime(value: datetime) -> list:
+    offset = value.utcoffset()
+    return [*value.timetuple()[:6], value.microsecond, offset.total_seconds() if offset is not None else None]
+
+
+def _decode_datetime(value: list) -> datetime:
+    *components, offset = value
+    return datetime(*components, tzinfo=timezone(timedelta(seconds=offset)) if offset is not None else None)
+
+
+# Tags for the values JSON can't represent natively, ordered so that subclasses come first.
+_VALUE_TYPES = (
+    ('dt', datetime, _encode_datetime, _decode_datetime),
+    ('d', date, lambda value: [value.year, value.month, value.day], lambda value: date(*value)),
+    ('t', time, lambda value: [value.hour, value.minute, value.second, value.microsecond], lambda value: time(*value)),
+    ('dec', Decimal, str, Decimal),
+    ('uuid', UUID, str, UUID),
+)
+
+
+def _encode_value(value: Any) -> Any:
+    for tag, value_type, encode, _ in _VALUE_TYPES:
+        if isinstance(value, value_type):
+            return {tag: encode(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        (tag, encoded), = value.items()
+        for value_tag, _, _, decode in _VALUE_TYPES:
+            if tag == value_tag:
+                return decode(encoded)
+        raise ValueError(f"Unknown value tag: {tag}")
+    return value
+
+
+def encode_cursor(keys: Sequence[str], values: Sequence[Any]) -> str:
+    """
+    Encodes the ordering keys and the values of the last row of a page into an opaque cursor
+
+    :param keys: The ordering keys the values refer to
+    :param values: The values of the ordering keys
+    :return: The cursor
+    """
+    payload = json.dumps({'k': list(keys), 'v': [_encode_value(value) for value in values]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str, keys: Sequence[str]) -> List[Any]:
+    """
+    Decodes a cursor produced by `encode_cursor` for the same ordering keys
+
+    :param cursor: The cursor
+    :param keys: The ordering keys expected in the cursor
+    :return: The values of the ordering keys
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        values = [_decode_value(value) for value in payload['v']]
+        cursor_keys = payload['k']
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError) as e:
+        raise InvalidCursorException(f"Invalid cursor: {cursor}") from e
+
+    if cursor_keys != list(keys) or len(values) != len(keys):
+        raise InvalidCursorException(f"Cursor doesn't match the requested ordering: {cursor}")
+    return values
@@ -1,15 +1,70 @@
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
-from typing import List, Union
+from itertools import groupby, islice
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
 
-from flask import current_app
+from flask import current_app, g, has_app_context
+from sqlalchemy import and_, bindparam, event, false, func, inspect, literal_column, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.engine.base import Engine, Connection
-from sqlalchemy.orm import Session, Query
+from sqlalchemy.orm import Session, Query, RelationshipProperty, defaultload, joinedload, lazyload, load_only, \
+    make_transient_to_detached, raiseload, selectinload, subqueryload
+from sqlalchemy.orm.attributes import InstrumentedAttribute, set_committed_value
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.schema import Column, Table
 
 from . import get_managers, DB_MANAGER_SQLALCHEMY
+from .cache import CacheBackend
+from .columnar import ColumnsBuilder, column_dtype
 from .db_manager.sqlalchemy import SQLAlchemyManager
-from .exceptions import ModelNotFoundException
+from .exceptions import ModelNotFoundException, SoftDeleteNotSupportedException, VersionConflictException
+from .instrumentation import BIND_NAME, instrumented, instrumented_session
+from .loader import FindOneLoader
 from .model import Model
+from .pagination import Page, decode_cursor, encode_cursor
+from .statement_cache import StatementCache, default_statement_cache
+
+
+# Session info flag set by the first write, the session must not populate the cache afterwards
+_SESSION_WRITES = 'flask_ddd_repository.writes'
+# Session info list of the (cache, key) pairs written by the transaction, deleted again once it commits
+_SESSION_DIRTY_KEYS = 'flask_ddd_repository.dirty_cache_keys'
+_LOADERS = 'flask_ddd_repository_loaders'
+# Dialects ordering NULLs after the other values in ascending order, and before them in descending order
+NULLS_LAST_DIALECTS = frozenset({'postgresql', 'oracle'})
+# Relationship loading strategies of the load plans
+_LOADER_STRATEGIES = {
+    'selectin': selectinload,
+    'joined': joinedload,
+    'subquery': subqueryload,
+    'lazy': lazyload,
+    'raise': raiseload,
+}
+
+
+@event.listens_for(Session, 'after_commit')
+def _delete_dirty_cache_keys(session: Session) -> None:
+    # Another session may have cached the previous row between the write and the commit
+    for cache, key in session.info.pop(_SESSION_DIRTY_KEYS, ()):
+        cache.delete(key)
+
+
+class UpsertResult(NamedTuple):
+    inserted: int
+    updated: int
+
+
+class BatchResult(NamedTuple):
+    items: List[Any]
+    missing: List[Any]
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
 
 
 class AbstractRepository(ABC):
@@ -22,11 +77,33 @@ class AbstractRepository(ABC):
         self._model_class = model_class
 
     @abstractmethod
-    def find_one(self, primary_key_value: Union[str, int], include_soft_deleted=False):
+    def find_one(self, primary_key_value: Union[str, int], include_soft_deleted=False,
+                 fields: Optional[Sequence[str]] = None, hydrate: bool = True,
+                 load_plan: Optional[Dict[str, str]] = None):
+        pass
+
+    @abstractmethod
+    def find_many(self, search_filter: dict, limit: int = 50, offset: int = 0, include_soft_deleted: bool = False,
+                  order_by: Sequence[str] = (), fields: Optional[Sequence[str]] = None, hydrate: bool = True,
+                  load_plan: Optional[Dict[str, str]] = None):
+        pass
+
+    @abstractmethod
+    def iter_many(self, search_filter: dict, chunk_size: int = 1000, include_soft_deleted: bool = False,
+                  order_by: Sequence[str] = (), fields: Optional[Sequence[str]] = None, hydrate: bool = True,
+                  load_plan: Optional[Dict[str, str]] = None):
+        pass
+
+    @abstractmethod
+    def find_columns(self, search_filter: dict, fields: Sequence[str], include_soft_deleted: bool = False,
+                     order_by: Sequence[str] = (), chunk_size: int = 10000,
+                     dtypes: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
         pass
 
     @abstractmethod
-    def find_many(self, search_filter: dict, limit: int = 50, offset: int = 0, include_soft_deleted: bool = False):
+    def find_page(self, search_filter: dict, order_by: Sequence[str] = (), after: Optional[str] = None,
+                  limit: int = 50, include_soft_deleted: bool = False,
+                  load_plan: Optional[Dict[str, str]] = None) -> Page:
         pass
 
     @abstractmethod
@@ -65,12 +142,42 @@ class AbstractRepository(ABC):
 class SQLAlchemyRepository(AbstractRepository):
     """
     Generic repository which uses SQLAlchemy ORM persistence layer
-    """
 
+    Reads load the relationships of the models following a load plan: the loading
+    strategy by relationship path, dotted for nested relationships, among `selectin`,
+    `joined`, `subquery`, `lazy` and `raise`. The plan of a call is merged over the
+    `load_plan` of the repository. Models read with a plan bypass the cache.
+    """
+    load_plan: Dict[str, str] = {}
+
+    def __init__(self, model_class: type, cache: CacheBackend = None, statement_cache: StatementCache = None,
+                 load_plan: Optional[Dict[str, str]] = None) -> None:
+        """
+        :param model_class: The mapped model class
+        :param cache: Optional read-through cache for `find_one`, invalidated by the writes of this repository
+        :param statement_cache: Cache of the `find_one` and `find_many` statements, shared by default
+        :param load_plan: Loading strategies by relationship path, replacing the plan of the class
+        """
+        super().__init__(model_class)
+        self._cache = cache
+        self._statements = statement_cache if statement_cache is not None else default_statement_cache
+        if load_plan is not None:
+            self.load_plan = load_plan
+
+    @instrumented_session
     @contextmanager
-    def _managed_session(self, parent_session: Session = None):
-        if not parent_session:
-            session = self._get_manager().create_session()
+    def _managed_session(self, parent_session: Session = None, read_only: bool = False, bind_name: str = None):
+        manager = self._get_manager() if not parent_session else None
+        # Reads go to the replicas unless the unit of work already holds writes they would not see
+        use_replicas = read_only and manager is not None and manager.has_replicas() and not manager.has_unit_of_work()
+        if not parent_session and manager.unit_of_work and not use_replicas:
+            # The application context owns the transaction, it is committed on teardown
+            session = manager.unit_of_work_session(bind_name)
+            assert isinstance(session.get_bind(self._model_class), (Engine, Connection))
+            yield session
+            session.flush()
+        elif not parent_session:
+            session = manager.create_session(bind_name, read_only=use_replicas)
             assert isinstance(session.get_bind(self._model_class), (Engine, Connection))
             try:
                 yield session
@@ -88,64 +195,812 @@ class SQLAlchemyRepository(AbstractRepository):
     def _get_manager(self) -> SQLAlchemyManager:
         return get_managers(current_app._get_current_object())[DB_MANAGER_SQLALCHEMY]
 
-    def _query(self, session: Session) -> Query:
-        return session.query(self._model_class)
+    def _query(self, session: Session, include_soft_deleted: bool = False, fields: Optional[Sequence[str]] = None,
+               hydrate: bool = True, load_plan: Tuple[Tuple[str, str], ...] = ()) -> Query:
+        if fields is not None and not hydrate:
+            query = session.query(*self._attributes(fields))
+        else:
+            query = session.query(self._model_class).options(*self._load_only(fields), *self._load_options(load_plan))
+        return query.filter(*self._soft_delete_criteria(include_soft_deleted))
+
+    def _select(self, search_filter: dict, include_soft_deleted: bool = False, order_by: Sequence[str] = (),
+                fields: Optional[Sequence[str]] = None, hydrate: bool = True,
+                load_plan: Tuple[Tuple[str, str], ...] = ()) -> Select:
+        if fields is not None and not hydrate:
+            statement = select(*self._attributes(fields))
+        else:
+            statement = select(self._model_class).options(*self._load_only(fields), *self._load_options(load_plan))
+        return statement \
+            .filter(*self._soft_delete_criteria(include_soft_deleted)) \
+            .filter_by(**search_filter) \
+            .order_by(*self._order_by_clauses(self._ordering(order_by)))
+
+    def _attributes(self, fields: Sequence[str]) -> List[InstrumentedAttribute]:
+        if not fields:
+            raise ValueError("At least one field must be projected")
+        return [self._attribute(field) for field in fields]
+
+    def _load_only(self, fields: Optional[Sequence[str]]) -> list:
+        # The primary key is always loaded, the other columns are deferred
+        return [load_only(*self._attributes(fields))] if fields is not None else []
+
+    def _load_plan(self, load_plan: Optional[Dict[str, str]] = None) -> Tuple[Tuple[str, str], ...]:
+        """
+        Merges the load plan of a call over the one of the repository
+
+        :return: The sorted (path, strategy) pairs, usable as a cache key
+        """
+        return tuple(sorted({**self.load_plan, **(load_plan or {})}.items()))
+
+    def _load_options(self, load_plan: Tuple[Tuple[str, str], ...]) -> list:
+        options = []
+        for path, strategy in load_plan:
+            if strategy not in _LOADER_STRATEGIES:
+                raise ValueError(f"Unknown loading strategy '{strategy}', expected one of {list(_LOADER_STRATEGIES)}")
+            # The relationships leading to the last one keep their own strategy
+            option, model_class = None, self._model_class
+            keys = path.split('.')
+            for index, key in enumerate(keys):
+                attribute = getattr(model_class, key, None)
+                if not isinstance(attribute, InstrumentedAttribute) \
+                        or not isinstance(attribute.property, RelationshipProperty):
+                    raise AttributeError(f"'{model_class.__name__}' has no relationship '{key}'")
+                loader = _LOADER_STRATEGIES[strategy] if index == len(keys) - 1 else defaultload
+                option = loader(attribute) if option is None else getattr(option, loader.__name__)(attribute)
+                model_class = attribute.property.mapper.class_
+            options.append(option)
+        return options
+
+    def _soft_delete_criteria(self, include_soft_deleted: bool = False) -> list:
+        deleted_at = self._soft_delete_column()
+        return [deleted_at.is_(None)] if deleted_at is not None and not include_soft_deleted else []
+
+    def _primary_key_attributes(self) -> List[str]:
+        mapper = inspect(self._model_class)
+        return [mapper.get_property_by_column(column).key for column in mapper.primary_key]
+
+    def _table(self) -> Table:
+        return inspect(self._model_class).local_table
+
+    def _bind_name(self) -> Optional[str]:
+        return self._table().metadata.info.get(BIND_NAME)
+
+    def _model_to_row(self, model: Model, include_generated: bool = False) -> Dict[str, Any]:
+        """
+        Extracts the column values of a model, keyed by column key. Empty values
+        are left out for the columns the database can generate, unless requested.
+
+        :param model: The model instance
+        :param include_generated: Include empty values of generated columns
+        :return: Column-value dictionary
+        """
+        table = self._table()
+        row = {}
+        for prop in inspect(self._model_class).column_attrs:
+            column = prop.columns[0]
+            if column.table is not table:
+                continue
+            value = getattr(model, prop.key)
+            if value is None and not include_generated and (
+                    (column.primary_key and column.autoincrement is not False)
+                    or column.default is not None
+                    or column.server_default is not None
+            ):
+                continue
+            row[column.key] = value
+        return row
+
+    def _primary_key_in(self, primary_key_values: Sequence[tuple]):
+        columns = list(self._table().primary_key.columns)
+        if len(columns) == 1:
+            return columns[0].in_([value for value, in primary_key_values])
+        return tuple_(*columns).in_(primary_key_values)
+
+    def _primary_key_tuple(self, primary_key_value) -> tuple:
+        return tuple(primary_key_value) if len(self._table().primary_key.columns) > 1 else (primary_key_value,)
+
+    def _soft_delete_column(self) -> Optional[Column]:
+        prop = inspect(self._model_class).column_attrs.get('deleted_at')
+        return prop.columns[0] if prop is not None else None
+
+    def _model_values(self, model: Model) -> Dict[str, Any]:
+        return {prop.key: getattr(model, prop.key) for prop in inspect(self._model_class).column_attrs}
+
+    def _model_from_values(self, values: Dict[str, Any]) -> Model:
+        # Rebuilt like the ORM loads rows: without calling __init__, and detached with its identity
+        model = inspect(self._model_class).class_manager.new_instance()
+        for key, value in values.items():
+            set_committed_value(model, key, value)
+        make_transient_to_detached(model)
+        return model
+
+    def _invalidate_cache(self, session: Session, primary_key_values: Iterable[tuple]) -> None:
+        session.info[_SESSION_WRITES] = True
+        primary_key_values = [value for value in primary_key_values if None not in value]
+        if self._cache is not None:
+            # Deleted now for the reads of this transaction, and on commit for those of the other ones
+            dirty_keys = session.info.setdefault(_SESSION_DIRTY_KEYS, [])
+            for primary_key_value in primary_key_values:
+                self._cache.delete((self._model_class, primary_key_value))
+                dirty_keys.append((self._cache, (self._model_class, primary_key_value)))
+        if has_app_context():
+            for (repository, _), loader in g.get(_LOADERS, {}).items():
+                if repository._model_class is self._model_class:
+                    loader.clear(primary_key_values)
+
+    def _cached_model(self, cache_key: Tuple[type, tuple], include_soft_deleted: bool) -> Tuple[bool, Optional[Model]]:
+        """
+        Looks up a model in the cache
+
+        :return: Whether the key is cached, and the model unless it is excluded as soft deleted
+        """
+        values = self._cache.get(cache_key) if self._cache is not None else None
+        if values is None:
+            return False, None
+        if values.get('deleted_at') is not None and not include_soft_deleted:
+            return True, None
+        return True, self._model_from_values(values)
+
+    def _cache_model(self, session: Session, model: Model) -> None:
+        if self._cache is not None and not session.info.get(_SESSION_WRITES):
+            self._cache.set((self._model_class, self._model_primary_key(model)), self._model_values(model))
+
+    def _existing_primary_keys(self, session: Session, primary_key_values: Sequence[tuple]) -> Set[tuple]:
+        columns = list(self._table().primary_key.columns)
+        return {
+            tuple(row) for row in
+            session.execute(select(columns).where(self._primary_key_in(primary_key_values)))
+        }
+
+    def _ordering(self, order_by: Sequence[str]) -> List[Tuple[str, bool]]:
+        """
+        Parses the ordering keys, prefixed by `-` for descending order
+
+        :param order_by: The ordering keys
+        :return: List of (attribute name, descending) tuples
+        """
+        return [(key[1:], True) if key.startswith('-') else (key, False) for key in order_by]
+
+    def _order_by_clauses(self, ordering: List[Tuple[str, bool]]) -> list:
+        return [
+            self._attribute(key).desc() if descending else self._attribute(key).asc()
+            for key, descending in ordering
+        ]
+
+    def _attribute(self, key: str) -> InstrumentedAttribute:
+        attribute = getattr(self._model_class, key, None)
+        if not isinstance(attribute, InstrumentedAttribute):
+            raise AttributeError(f"'{self._model_class.__name__}' has no mapped attribute '{key}'")
+        return attribute
 
     def _find_model_or_fail(self, session: Session, primary_key_value: Union[str, int],
-                            include_soft_deleted: bool = False):
-        model = self._query(session).get(primary_key_value)
+                            include_soft_deleted: bool = False, fields: Optional[Tuple[str, ...]] = None,
+                            hydrate: bool = True, load_plan: Tuple[Tuple[str, str], ...] = ()):
+        statement = self._statements.get(
+            ('find_one', type(self), inspect(self._model_class), include_soft_deleted, fields, hydrate, load_plan),
+            lambda: self._select({}, include_soft_deleted, fields=fields, hydrate=hydrate, load_plan=load_plan)
+            .where(and_(*(
+                column == bindparam(f'pk_{index}')
+                for index, column in enumerate(self._table().primary_key.columns)
+            ))),
+        )
+        result = session.execute(statement, {
+            f'pk_{index}': value for index, value in enumerate(self._primary_key_tuple(primary_key_value))
+        })
+        model = self._scalars(result, fields, hydrate, load_plan).one_or_none()
         if not model:
             raise ModelNotFoundException(f"Model not found with primary key value: {primary_key_value}")
-
-        # if model is None \
-        #         or (not include_soft_deleted and isinstance(model, AbstractSoftDeleteMixin) and model.is_deleted):
-        #     raise EntityNotFoundException(f"Entity not found with primary key value: {primary_key_value}")
-        #
         return model
 
-    def find_one(self, primary_key_value: Union[str, int], include_soft_deleted: bool = False):
-        with self._managed_session() as managed_session:
-            return self._find_model_or_fail(managed_session, primary_key_value)
-
-    def find_many(self, search_filter: dict, limit: int = 50, offset: int = 0, include_soft_deleted=False):
+    @instrumented
+    def find_one(self, primary_key_value: Union[str, int], include_soft_deleted: bool = False,
+                 session: Session = None, fields: Optional[Sequence[str]] = None, hydrate: bool = True,
+                 load_plan: Optional[Dict[str, str]] = None):
+        """
+        Finds a model by primary key
+
+        :param primary_key_value: The primary key value
+        :param include_soft_deleted: Include soft deleted models
+        :param session: The session to use, a new one is created if not provided
+        :param fields: Load only these attributes, and the primary key, bypassing the cache
+        :param hydrate: With `fields`, return a model whose other attributes are deferred, otherwise a named tuple
+            row of the fields, out of the identity map
+        :param load_plan: Loading strategies by relationship path, merged over the plan of the repository
+        :return: The model, or the row
+        """
+        load_plan = self._load_plan(load_plan)
+        if fields is not None or load_plan:
+            with self._managed_session(session, read_only=True) as managed_session:
+                return self._find_model_or_fail(
+                    managed_session, primary_key_value, include_soft_deleted,
+                    tuple(fields) if fields is not None else None, hydrate, load_plan,
+                )
+
+        cached, model = self._cached_model(
+            (self._model_class, self._primary_key_tuple(primary_key_value)), include_soft_deleted
+        )
+        if cached and model is None:
+            raise ModelNotFoundException(f"Model not found with primary key value: {primary_key_value}")
+        if cached:
+            return model
+
+        with self._managed_session(session, read_only=True) as managed_session:
+            model = self._find_model_or_fail(managed_session, primary_key_value, include_soft_deleted)
+            self._cache_model(managed_session, model)
+            return model
+
+    @instrumented
+    def find_many_by_pks(self, primary_key_values: Iterable[Union[str, int]], chunk_size: int = 500,
+                         include_soft_deleted: bool = False, session: Session = None,
+                         load_plan: Optional[Dict[str, str]] = None) -> BatchResult:
+        """
+        Finds models by primary key with one `WHERE pk IN (...)` query per chunk of keys
+        missing from the cache.
+
+        :param primary_key_values: The primary key values
+        :param chunk_size: Maximum number of primary keys per query
+        :param include_soft_deleted: Include soft deleted models
+        :param session: The session to use, a new one is created if not provided
+        :param load_plan: Loading strategies by relationship path, merged over the plan of the repository
+        :return: The models found, in the input order, and the primary key values not found
+        """
+        primary_key_values = list(primary_key_values)
+        keys = [self._primary_key_tuple(value) for value in primary_key_values]
+        load_plan = self._load_plan(load_plan)
+        found: Dict[tuple, Model] = {}
+        uncached = []
+        for key in dict.fromkeys(keys):
+            if load_plan:
+                uncached.append(key)
+                continue
+            cached, model = self._cached_model((self._model_class, key), include_soft_deleted)
+            if model is not None:
+                found[key] = model
+            elif not cached:
+                uncached.append(key)
+
+        if uncached:
+            with self._managed_session(session, read_only=True) as managed_session:
+                query = self._query(managed_session, include_soft_deleted, load_plan=load_plan)
+                for chunk in _chunks(uncached, int(max(1, chunk_size))):
+                    for model in query.filter(self._primary_key_in(chunk)):
+                        found[self._model_primary_key(model)] = model
+                        self._cache_model(managed_session, model)
+
+        return BatchResult(
+            [found[key] for key in keys if key in found],
+            [value for value, key in zip(primary_key_values, keys) if key not in found],
+        )
+
+    def loader(self, include_soft_deleted: bool = False) -> FindOneLoader:
+        """
+        Returns the loader of the current application context, which batches the lookups
+        queued with `load` into `find_many_by_pks` queries.
+
+        :param include_soft_deleted: Include soft deleted models
+        :return: The application context loader
+        """
+        loaders = g.setdefault(_LOADERS, {})
+        if (self, include_soft_deleted) not in loaders:
+            loaders[(self, include_soft_deleted)] = FindOneLoader(self, include_soft_deleted)
+        return loaders[(self, include_soft_deleted)]
+
+    @instrumented
+    def find_many(self, search_filter: dict, limit: int = 50, offset: int = 0, include_soft_deleted=False,
+                  order_by: Sequence[str] = (), session: Session = None, fields: Optional[Sequence[str]] = None,
+                  hydrate: bool = True, load_plan: Optional[Dict[str, str]] = None):
+        """
+        Finds the models matching equality filters
+
+        :param search_filter: Key-value dictionary of equality filters
+        :param limit: The maximum number of models
+        :param offset: The number of models skipped
+        :param include_soft_deleted: Include soft deleted models
+        :param order_by: Ordering keys, prefixed by `-` for descending order
+        :param session: The session to use, a new one is created if not provided
+        :param fields: Load only these attributes, and the primary key
+        :param hydrate: With `fields`, return models whose other attributes are deferred, otherwise named tuple
+            rows of the fields, out of the identity map
+        :param load_plan: Loading strategies by relationship path, merged over the plan of the repository
+        :return: The models, or the rows
+        """
         limit = int(max(0, limit))
-        offset = int(min(offset, 0))
-        with self._managed_session() as session:
-            query = self._query(session)
-            query.filter_by(**search_filter)
-            query.limit(limit)
-            query.offset(offset)
-            return query.all()
-
+        offset = int(max(0, offset))
+        fields = tuple(fields) if fields is not None else None
+        load_plan = self._load_plan(load_plan)
+        statement = self._find_many_statement(
+            search_filter, bool(offset), include_soft_deleted, tuple(order_by), fields, hydrate, load_plan
+        )
+        parameters = self._filter_parameters(search_filter)
+        parameters.update(limit=limit, offset=offset)
+        with self._managed_session(session, read_only=True) as managed_session:
+            result = managed_session.execute(statement, parameters)
+            return self._scalars(result, fields, hydrate, load_plan).all()
+
+    @staticmethod
+    def _scalars(result, fields: Optional[Sequence[str]], hydrate: bool, load_plan: Tuple[Tuple[str, str], ...]):
+        if fields is not None and not hydrate:
+            return result
+        # Joined loads of collections repeat the models
+        return result.scalars().unique() if load_plan else result.scalars()
+
+    def _find_many_statement(self, search_filter: dict, offset: bool, include_soft_deleted: bool,
+                             order_by: Tuple[str, ...], fields: Optional[Tuple[str, ...]] = None,
+                             hydrate: bool = True, load_plan: Tuple[Tuple[str, str], ...] = ()) -> Select:
+        """
+        Returns the cached statement of a `find_many` shape: the filter shape, the
+        ordering and whether there is an offset. Values are bound on execution.
+        """
+        shape = self._filter_shape(search_filter)
+
+        def build() -> Select:
+            statement = self._select(
+                self._bound_filter(shape),
+                include_soft_deleted,
+                order_by,
+                fields,
+                hydrate,
+                load_plan,
+            ).limit(bindparam('limit'))
+            return statement.offset(bindparam('offset')) if offset else statement
+
+        return self._statements.get(
+            ('find_many', type(self), inspect(self._model_class), shape, offset, include_soft_deleted, order_by,
+             fields, hydrate, load_plan),
+            build,
+        )
+
+    @staticmethod
+    def _filter_shape(search_filter: dict) -> Tuple[Tuple[str, bool], ...]:
+        # The keys compared to None are apart since they compile to IS NULL
+        return tuple(sorted((key, value is None) for key, value in search_filter.items()))
+
+    @staticmethod
+    def _bound_filter(shape: Tuple[Tuple[str, bool], ...]) -> dict:
+        return {key: None if is_null else bindparam(f'filter_{key}') for key, is_null in shape}
+
+    @staticmethod
+    def _filter_parameters(search_filter: dict) -> Dict[str, Any]:
+        return {f'filter_{key}': value for key, value in search_filter.items() if value is not None}
+
+    @instrumented
+    def iter_many(self, search_filter: dict, chunk_size: int = 1000, include_soft_deleted: bool = False,
+                  order_by: Sequence[str] = (), fields: Optional[Sequence[str]] = None,
+                  hydrate: bool = True, load_plan: Optional[Dict[str, str]] = None) -> Iterator[Model]:
+        """
+        Streams the matching models fetching `chunk_size` rows at a time, through a
+        server-side cursor where the dialect supports it.
+
+        The generator uses its own session, opened on the first iteration and closed
+        when it is exhausted or closed, and doesn't need the application context,
+        so it can be returned from a streamed response. The session reads from the
+        bind replicas when there are any.
+
+        :param search_filter: Key-value dictionary of equality filters
+        :param chunk_size: The number of rows fetched at a time
+        :param include_soft_deleted: Include soft deleted models
+        :param order_by: Ordering keys, prefixed by `-` for descending order
+        :param fields: Load only these attributes, and the primary key
+        :param hydrate: With `fields`, yield models whose other attributes are deferred, otherwise named tuple
+            rows of the fields, out of the identity map
+        :param load_plan: Loading strategies by relationship path, merged over the plan of the repository.
+            The relationships are loaded chunk by chunk, collections can't be joined.
+        :return: Generator of models, or of rows
+        """
+        return self._iter_many(
+            self._get_manager(), search_filter, int(max(1, chunk_size)), include_soft_deleted, order_by,
+            fields=fields, hydrate=hydrate, load_plan=self._load_plan(load_plan),
+        )
+
+    def _iter_many(self, manager: SQLAlchemyManager, search_filter: dict, chunk_size: int,
+                   include_soft_deleted: bool, order_by: Sequence[str], bind_name: str = None,
+                   fields: Optional[Sequence[str]] = None, hydrate: bool = True,
+                   load_plan: Tuple[Tuple[str, str], ...] = ()) -> Iterator[Model]:
+        session = manager.create_session(bind_name, read_only=True)
+        try:
+            yield from self._query(session, include_soft_deleted, fields, hydrate, load_plan) \
+                .filter_by(**search_filter) \
+                .order_by(*self._order_by_clauses(self._ordering(order_by))) \
+                .execution_options(stream_results=True) \
+                .yield_per(chunk_size)
+        finally:
+            session.close()
+
+    @instrumented
+    def find_columns(self, search_filter: dict, fields: Sequence[str], include_soft_deleted: bool = False,
+                     order_by: Sequence[str] = (), chunk_size: int = 10000, dtypes: Optional[Dict[str, str]] = None,
+                     session: Session = None) -> Dict[str, Any]:
+        """
+        Finds the matching rows as columns: one NumPy array per field, or one list when
+        NumPy is not installed. The rows are fetched `chunk_size` at a time from a Core
+        result, without building models, and converted chunk by chunk.
+
+        The dtypes follow the mapped column types: int64, float64, bool, datetime64 and
+        timedelta64, object for the other ones. Integer columns holding NULLs become
+        float64 with NaN, boolean ones object arrays.
+
+        :param search_filter: Key-value dictionary of equality filters
+        :param fields: The attributes to export
+        :param include_soft_deleted: Include soft deleted rows
+        :param order_by: Ordering keys, prefixed by `-` for descending order
+        :param chunk_size: The number of rows fetched and converted at a time
+        :param dtypes: NumPy dtypes by field, replacing the inferred ones
+        :param session: The session to use, a new one is created if not provided
+        :return: The columns, by field
+        """
+        fields = tuple(fields)
+        chunk_size = int(max(1, chunk_size))
+        columns = [attribute.property.columns[0] for attribute in self._attributes(fields)]
+        builder = ColumnsBuilder(fields, [
+            (dtypes or {}).get(field, column_dtype(column)) for field, column in zip(fields, columns)
+        ])
+        shape = self._filter_shape(search_filter)
+        statement = self._statements.get(
+            ('find_columns', type(self), inspect(self._model_class), shape, include_soft_deleted, tuple(order_by), fields),
+            lambda: self._select(self._bound_filter(shape), include_soft_deleted, order_by, fields, hydrate=False),
+        )
+        with self._managed_session(session, read_only=True) as managed_session:
+            connection = managed_session.connection(bind_arguments={'mapper': inspect(self._model_class)})
+            result = connection \
+                .execution_options(stream_results=True, max_row_buffer=chunk_size) \
+                .execute(statement, self._filter_parameters(search_filter))
+            for rows in result.partitions(chunk_size):
+                builder.add(rows)
+        return builder.build()
+
+    @instrumented
+    def find_page(self, search_filter: dict, order_by: Sequence[str] = (), after: Optional[str] = None,
+                  limit: int = 50, include_soft_deleted: bool = False, session: Session = None,
+                  load_plan: Optional[Dict[str, str]] = None) -> Page:
+        """
+        Keyset pagination: returns the rows following the `after` cursor, so that
+        deep pages cost the same as the first one. The primary key is always
+        appended to the ordering to make it unique.
+
+        :param search_filter: Key-value dictionary of equality filters
+        :param order_by: Ordering keys, prefixed by `-` for descending order
+        :param after: The `next_cursor` of the previous page, None for the first page
+        :param limit: The page size
+        :param include_soft_deleted: Include soft deleted models
+        :param session: The session to use, a new one is created if not provided
+        :param load_plan: Loading strategies by relationship path, merged over the plan of the repository
+        :return: The page of models and the cursor of the next page
+        """
+        limit = int(max(1, limit))
+        ordering = self._page_ordering(order_by)
+        keys = [key for key, _ in ordering]
+
+        with self._managed_session(session, read_only=True) as managed_session:
+            query = self._query(managed_session, include_soft_deleted, load_plan=self._load_plan(load_plan)) \
+                .filter_by(**search_filter)
+            if after is not None:
+                nulls_last = managed_session.get_bind(self._model_class).dialect.name in NULLS_LAST_DIALECTS
+                query = query.filter(self._keyset_criteria(ordering, decode_cursor(after, keys), nulls_last))
+            items = query.order_by(*self._order_by_clauses(ordering)).limit(limit + 1).all()
+
+        if len(items) <= limit:
+            return Page(items, None)
+        return Page(items[:limit], encode_cursor(keys, [getattr(items[limit - 1], key) for key in keys]))
+
+    def _page_ordering(self, order_by: Sequence[str]) -> List[Tuple[str, bool]]:
+        ordering = self._ordering(order_by)
+        return ordering + [(key, False) for key in self._primary_key_attributes() if key not in dict(ordering)]
+
+    def _keyset_criteria(self, ordering: List[Tuple[str, bool]], values: list, nulls_last: bool = False):
+        # (a > :a) OR (a = :a AND b > :b) OR ..., comparisons flipped for descending keys
+        criteria = []
+        for position, (key, descending) in enumerate(ordering):
+            criteria.append(and_(
+                *(self._equal_criterion(previous, values[index])
+                  for index, (previous, _) in enumerate(ordering[:position])),
+                self._after_criterion(key, values[position], descending, nulls_last),
+            ))
+        return or_(*criteria)
+
+    def _equal_criterion(self, key: str, value):
+        attribute = self._attribute(key)
+        return attribute.is_(None) if value is None else attribute == value
+
+    def _after_criterion(self, key: str, value, descending: bool, nulls_last: bool):
+        """
+        The rows following a value of an ordering key. Comparisons with NULL are never
+        true: NULLs are placed where the dialect orders them.
+
+        :param nulls_last: Whether the dialect orders NULLs after the other values in ascending order
+        """
+        attribute = self._attribute(key)
+        # In the direction of the ordering, are NULLs after the other values?
+        nulls_after = nulls_last != descending
+        if value is None:
+            return false() if nulls_after else attribute.isnot(None)
+        following = attribute < value if descending else attribute > value
+        return or_(following, attribute.is_(None)) if nulls_after else following
+
+    @instrumented
     def insert_one(self, model: Model, session: Session = None):
         with self._managed_session(session) as managed_session:
             managed_session.add(model)
+            self._invalidate_cache(managed_session, [self._model_primary_key(model)])
         return model
 
+    @instrumented
     def insert_many(self, models: List[Model], session: Session = None):
         with self._managed_session(session) as managed_session:
             for model in models:
                 managed_session.add(model)
+            self._invalidate_cache(managed_session, [self._model_primary_key(model) for model in models])
         return models
 
-    def update_one(self, model: Model, upsert=False, session: Session = None):
-        pass
-        # with self._managed_session(session) as managed_session:
-        #     model_from_db = self._find_model_or_fail(managed_session, getattr(model, model.primary_key))
-        #     managed_session.add(model)
-        # return self.find_one(getattr(model, model.primary_key))
-
-    def update_many(self, models: List[Model], upsert=False) -> List[Model]:
-        pass
-
-    def delete_one(self, primary_key_value: Union[str, int], soft_delete=True) -> bool:
-        pass
+    @instrumented
+    def bulk_insert_many(self, models: List[Model], chunk_size: int = 1000, return_defaults: bool = False,
+                         session: Session = None) -> List[Model]:
+        """
+        Inserts the models with Core executemany INSERT statements of up to `chunk_size`
+        rows, bypassing the ORM unit of work. The models are not added to the session.
+
+        Generated primary keys are set on the models only when `return_defaults` is
+        requested: with a single RETURNING executemany where the dialect supports it,
+        otherwise with one statement per row.
+
+        :param models: The models to insert
+        :param chunk_size: Maximum number of rows per statement
+        :param return_defaults: Set the generated primary keys on the models
+        :param session: The session to use, a new one is created if not provided
+        :return: The models
+        """
+        table = self._table()
+        primary_key = [(column.key, inspect(self._model_class).get_property_by_column(column).key)
+                       for column in table.primary_key.columns]
+        with self._managed_session(session) as managed_session:
+            dialect = managed_session.get_bind(self._model_class).dialect
+            self._invalidate_cache(managed_session, [self._model_primary_key(model) for model in models])
+            for chunk in _chunks(models, int(max(1, chunk_size))):
+                rows = [(model, self._model_to_row(model)) for model in chunk]
+                # executemany needs the same keys for every row: group rows missing the same generated values
+                for _, group in groupby(rows, key=lambda item: item[1].keys()):
+                    group = list(group)
+                    if not return_defaults:
+                        managed_session.execute(table.insert(), [row for _, row in group])
+                    elif dialect.insert_executemany_returning:
+                        result = managed_session.execute(
+                            table.insert().returning(*table.primary_key.columns), [row for _, row in group]
+                        )
+                        for (model, _), inserted in zip(group, result):
+                            for column_key, key in primary_key:
+                                setattr(model, key, inserted[column_key])
+                    else:
+                        for model, row in group:
+                            inserted = managed_session.execute(table.insert(), row).inserted_primary_key
+                            for (_, key), value in zip(primary_key, inserted):
+                                setattr(model, key, value)
+        return models
 
-    def delete_many(self, primary_key_value: Union[List[str], List[int]], soft_delete=True) -> bool:
-        pass
+    @instrumented
+    def update_one(self, model: Model, upsert=False, session: Session = None):
+        """
+        Writes the model. Models mapped with a `version_id_col` are written with a single
+        UPDATE of their changed columns which increments the version, guarded by the
+        version of the model: `VersionConflictException` is raised when the row has
+        been changed, or deleted, since. A versioned model without version is inserted
+        when `upsert` is requested.
+
+        :param model: The model to write, with a primary key value
+        :param upsert: Insert the model if it doesn't exist yet
+        :param session: The session to use, a new one is created if not provided
+        :return: The model
+        """
+        mapper = inspect(self._model_class)
+        if mapper.version_id_col is not None and mapper.version_id_generator is not False:
+            version_key = mapper.get_property_by_column(mapper.version_id_col).key
+            if upsert and getattr(model, version_key) is None:
+                return self.insert_one(model, session)
+            return self._update_versioned(model, version_key, session)
+
+        result = self.update_many([model], upsert=upsert, session=session)
+        if not (result.inserted or result.updated):
+            raise ModelNotFoundException(f"Model not found with primary key value: {self._primary_key_of(model)}")
+        return model
 
-    def restore_one(self, primary_key_value: Union[str, int]) -> Model:
-        pass
+    @instrumented
+    def update_many(self, models: List[Model], upsert=False, chunk_size: int = 1000,
+                    session: Session = None) -> UpsertResult:
+        """
+        Writes the models with set-based statements of up to `chunk_size` rows.
+        Without upsert, an executemany UPDATE keyed on the primary key counts the
+        updated rows by itself: one round-trip per chunk. Upserts are native on
+        PostgreSQL (INSERT ... ON CONFLICT DO UPDATE, one round-trip per chunk) and
+        SQLite (ON CONFLICT, after looking up the existing keys to count them), an
+        executemany UPDATE followed by an executemany INSERT of the missing rows elsewhere.
+
+        :param models: The models to write, all of them with a primary key value
+        :param upsert: Insert the models which don't exist yet
+        :param chunk_size: Maximum number of rows per statement
+        :param session: The session to use, a new one is created if not provided
+        :return: The number of inserted and updated rows
+        """
+        table = self._table()
+        primary_key = [column.key for column in table.primary_key.columns]
+        inserted = updated = 0
+        with self._managed_session(session) as managed_session:
+            dialect = managed_session.get_bind(self._model_class).dialect
+            for chunk in _chunks(models, int(max(1, chunk_size))):
+                # A statement can't affect the same row twice: the last model wins
+                rows: Dict[tuple, Dict[str, Any]] = {}
+                for model in chunk:
+                    row = self._model_to_row(model, include_generated=True)
+                    key = tuple(row[column] for column in primary_key)
+                    if None in key:
+                        raise ValueError(f"Can't update a model without primary key value: {model}")
+                    rows[key] = row
+                self._invalidate_cache(managed_session, rows)
+
+                if upsert and dialect.name == 'postgresql':
+                    chunk_inserted = self._upsert_postgresql(managed_session, list(rows.values()))
+                    inserted += chunk_inserted
+                    updated += len(rows) - chunk_inserted
+                    continue
+
+                if not upsert:
+                    count = self._update_rows(managed_session, list(rows.values()))
+                    if count is None:
+                        count = len(self._existing_primary_keys(managed_session, list(rows)))
+                    updated += count
+                    continue
+
+                existing = self._existing_primary_keys(managed_session, list(rows))
+                if upsert and dialect.name == 'sqlite':
+                    self._upsert_sqlite(managed_session, list(rows.values()))
+                else:
+                    self._update_rows(managed_session, [row for key, row in rows.items() if key in existing])
+                    if len(existing) < len(rows):
+                        managed_session.execute(
+                            table.insert(), [row for key, row in rows.items() if key not in existing]
+                        )
+                updated += len(existing)
+                inserted += len(rows) - len(existing)
+        return UpsertResult(inserted, updated)
+
+    def _update_versioned(self, model: Model, version_key: str, session: Session = None):
+        mapper = inspect(self._model_class)
+        state = inspect(model)
+        table = self._table()
+        version = getattr(model, version_key)
+        primary_key = self._model_primary_key(model)
+        if version is None or None in primary_key:
+            raise ValueError(f"Can't update a versioned model without primary key and version values: {model}")
+
+        # Loaded models write their changed attributes, the other ones all their columns
+        values = {}
+        for prop in mapper.column_attrs:
+            column = prop.columns[0]
+            if column.table is not table or column.primary_key or column is mapper.version_id_col:
+                continue
+            if state.key is None or state.attrs[prop.key].history.has_changes():
+                values[prop.key] = (column, getattr(model, prop.key))
+        if not values:
+            return model
+
+        new_version = mapper.version_id_generator(version)
+        statement = table.update() \
+            .where(and_(*(column == value for column, value in zip(mapper.primary_key, primary_key)))) \
+            .where(mapper.version_id_col == version) \
+            .values({column: value for column, value in values.values()})
+        with self._managed_session(session) as managed_session:
+            self._invalidate_cache(managed_session, [primary_key])
+            result = managed_session.execute(statement.values({mapper.version_id_col: new_version}))
+            if result.rowcount != 1:
+                raise VersionConflictException(
+                    f"Model with primary key value {self._primary_key_of(model)} is not at version {version}"
+                )
+            # Before the unit of work flushes, which would write the model again at its old version
+            for key, (_, value) in values.items():
+                set_committed_value(model, key, value)
+            set_committed_value(model, version_key, new_version)
+        return model
 
-    def restore_many(self, primary_key_value: Union[List[str], List[int]]) -> List[Model]:
-        pass
+    def _model_primary_key(self, model: Model) -> tuple:
+        return tuple(getattr(model, key) for key in self._primary_key_attributes())
+
+    def _primary_key_of(self, model: Model):
+        values = self._model_primary_key(model)
+        return values[0] if len(values) == 1 else values
+
+    def _upsert_postgresql(self, session: Session, rows: List[Dict[str, Any]]) -> int:
+        table = self._table()
+        statement = postgresql.insert(table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(table.primary_key.columns),
+            set_={key: statement.excluded[key] for key in rows[0] if key not in table.primary_key.columns},
+        )
+        # xmax is zero only for the freshly inserted row versions
+        return sum(session.execute(statement.returning(literal_column('xmax = 0'))).scalars())
+
+    def _upsert_sqlite(self, session: Session, rows: List[Dict[str, Any]]) -> None:
+        table = self._table()
+        statement = sqlite.insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(table.primary_key.columns),
+            set_={key: statement.excluded[key] for key in rows[0] if key not in table.primary_key.columns},
+        )
+        session.execute(statement, rows)
+
+    def _update_rows(self, session: Session, rows: List[Dict[str, Any]]) -> Optional[int]:
+        """
+        :return: The number of updated rows, None when the dialect doesn't count the rows of an executemany
+        """
+        table = self._table()
+        values = [key for key in rows[0] if key not in table.primary_key.columns] if rows else []
+        if not values:
+            return 0 if not rows else None
+        statement = table.update() \
+            .where(and_(*(column == bindparam(f'pk_{column.key}') for column in table.primary_key.columns))) \
+            .values({key: bindparam(f'value_{key}') for key in values})
+        result = session.execute(statement, [
+            {**{f'pk_{column.key}': row[column.key] for column in table.primary_key.columns},
+             **{f'value_{key}': row[key] for key in values}}
+            for row in rows
+        ])
+        dialect = session.get_bind(self._model_class).dialect
+        sane_rowcount = dialect.supports_sane_multi_rowcount if len(rows) > 1 else dialect.supports_sane_rowcount
+        return result.rowcount if sane_rowcount else None
+
+    @instrumented
+    def delete_one(self, primary_key_value: Union[str, int], soft_delete=True, session: Session = None) -> int:
+        return self.delete_many([primary_key_value], soft_delete=soft_delete, session=session)
+
+    @instrumented
+    def delete_many(self, primary_key_value: Union[List[str], List[int]], soft_delete=True, chunk_size: int = 1000,
+                    session: Session = None) -> int:
+        """
+        Deletes the models with one statement per chunk of primary keys, without loading them.
+        A soft delete sets `deleted_at` on the models which are not deleted yet.
+
+        :param primary_key_value: The primary key values
+        :param soft_delete: Set `deleted_at` instead of deleting the rows
+        :param chunk_size: Maximum number of primary keys per statement
+        :param session: The session to use, a new one is created if not provided
+        :return: The number of affected rows
+        """
+        table = self._table()
+        if soft_delete:
+            deleted_at = self._soft_delete_column_or_fail()
+            statement = table.update().where(deleted_at.is_(None)).values({deleted_at: func.now()})
+        else:
+            statement = table.delete()
+        return self._execute_for_primary_keys(statement, primary_key_value, chunk_size, session)
+
+    @instrumented
+    def restore_one(self, primary_key_value: Union[str, int], session: Session = None) -> int:
+        return self.restore_many([primary_key_value], session=session)
+
+    @instrumented
+    def restore_many(self, primary_key_value: Union[List[str], List[int]], chunk_size: int = 1000,
+                     session: Session = None) -> int:
+        """
+        Restores soft deleted models with one statement per chunk of primary keys, without loading them.
+
+        :param primary_key_value: The primary key values
+        :param chunk_size: Maximum number of primary keys per statement
+        :param session: The session to use, a new one is created if not provided
+        :return: The number of affected rows
+        """
+        deleted_at = self._soft_delete_column_or_fail()
+        statement = self._table().update().where(deleted_at.isnot(None)).values({deleted_at: None})
+        return self._execute_for_primary_keys(statement, primary_key_value, chunk_size, session)
+
+    def _soft_delete_column_or_fail(self) -> Column:
+        deleted_at = self._soft_delete_column()
+        if deleted_at is None:
+            raise SoftDeleteNotSupportedException(f"'{self._model_class.__name__}' has no mapped 'deleted_at' column")
+        return deleted_at
+
+    def _execute_for_primary_keys(self, statement, primary_key_values: Iterable, chunk_size: int,
+                                  session: Session = None) -> int:
+        affected = 0
+        with self._managed_session(session) as managed_session:
+            for chunk in _chunks(primary_key_values, int(max(1, chunk_size))):
+                keys = [self._primary_key_tuple(value) for value in chunk]
+                self._invalidate_cache(managed_session, keys)
+                criteria = self._primary_key_in(keys)
+                affected += managed_session.execute(statement.where(criteria)).rowcount
+        return affected
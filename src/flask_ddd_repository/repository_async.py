@@ -0,0 +1,174 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from flask import current_app
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import get_managers, DB_MANAGER_SQLALCHEMY_ASYNC
+from .cache import CacheBackend
+from .db_manager.sqlalchemy_async import AsyncSQLAlchemyManager
+from .model import Model
+from .pagination import Page
+from .repository import AbstractRepository, BatchResult, SQLAlchemyRepository, UpsertResult
+
+
+class AsyncSQLAlchemyRepository(AbstractRepository):
+    """
+    Generic repository which uses SQLAlchemy ORM persistence layer through asyncio sessions.
+    Methods are coroutines running the `SQLAlchemyRepository` statements with `AsyncSession.run_sync`.
+
+    Relationships can't be lazy loaded by the async sessions: reads load them following
+    the load plan, as described by `SQLAlchemyRepository`.
+    """
+    load_plan: Dict[str, str] = {}
+
+    def __init__(self, model_class: type, cache: CacheBackend = None,
+                 load_plan: Optional[Dict[str, str]] = None) -> None:
+        """
+        :param model_class: The mapped model class
+        :param cache: Optional read-through cache for `find_one`, invalidated by the writes of this repository
+        :param load_plan: Loading strategies by relationship path, replacing the plan of the class
+        """
+        super().__init__(model_class)
+        self._repository = SQLAlchemyRepository(
+            model_class, cache, load_plan=load_plan if load_plan is not None else self.load_plan
+        )
+
+    @asynccontextmanager
+    async def _managed_session(self, parent_session: AsyncSession = None, read_only: bool = False):
+        if not parent_session:
+            session = self._get_manager().create_session(read_only=read_only)
+            try:
+                yield session
+                await session.commit()
+            except:
+                await session.rollback()
+                raise
+            finally:
+                await session.close()
+        else:
+            yield parent_session
+
+    def _get_manager(self) -> AsyncSQLAlchemyManager:
+        return get_managers(current_app._get_current_object())[DB_MANAGER_SQLALCHEMY_ASYNC]
+
+    async def _run(self, method: Callable, *args, session: AsyncSession = None, read_only: bool = False, **kwargs):
+        # The sync session given by run_sync is passed on as the parent session of the sync repository
+        async with self._managed_session(session, read_only) as managed_session:
+            return await managed_session.run_sync(
+                lambda sync_session: method(*args, session=sync_session, **kwargs)
+            )
+
+    async def find_one(self, primary_key_value: Union[str, int], include_soft_deleted: bool = False,
+                       session: AsyncSession = None, fields: Optional[Sequence[str]] = None, hydrate: bool = True,
+                       load_plan: Optional[Dict[str, str]] = None):
+        return await self._run(
+            self._repository.find_one, primary_key_value, include_soft_deleted,
+            session=session, read_only=True, fields=fields, hydrate=hydrate, load_plan=load_plan,
+        )
+
+    async def find_many(self, search_filter: dict, limit: int = 50, offset: int = 0, include_soft_deleted=False,
+                        order_by: Sequence[str] = (), session: AsyncSession = None,
+                        fields: Optional[Sequence[str]] = None, hydrate: bool = True,
+                        load_plan: Optional[Dict[str, str]] = None):
+        return await self._run(
+            self._repository.find_many, search_filter, limit, offset, include_soft_deleted, order_by,
+            session=session, read_only=True, fields=fields, hydrate=hydrate, load_plan=load_plan,
+        )
+
+    async def find_many_by_pks(self, primary_key_values: Iterable[Union[str, int]], chunk_size: int = 500,
+                               include_soft_deleted: bool = False, session: AsyncSession = None,
+                               load_plan: Optional[Dict[str, str]] = None) -> BatchResult:
+        return await self._run(
+            self._repository.find_many_by_pks, primary_key_values, chunk_size, include_soft_deleted,
+            session=session, read_only=True, load_plan=load_plan,
+        )
+
+    def iter_many(self, search_filter: dict, chunk_size: int = 1000, include_soft_deleted: bool = False,
+                  order_by: Sequence[str] = (), fields: Optional[Sequence[str]] = None,
+                  hydrate: bool = True, load_plan: Optional[Dict[str, str]] = None) -> AsyncIterator[Model]:
+        """
+        Streams the matching models fetching `chunk_size` rows at a time. The async
+        generator uses its own session, opened on the first iteration and closed
+        when it is exhausted or closed.
+
+        :param search_filter: Key-value dictionary of equality filters
+        :param chunk_size: The number of rows fetched at a time
+        :param include_soft_deleted: Include soft deleted models
+        :param order_by: Ordering keys, prefixed by `-` for descending order
+        :param fields: Load only these attributes, and the primary key
+        :param hydrate: With `fields`, yield models whose other attributes are deferred, otherwise named tuple rows
+        :param load_plan: Loading strategies by relationship path, collections can't be joined
+        :return: Async generator of models, or of rows
+        """
+        return self._iter_many(
+            self._get_manager(), search_filter, int(max(1, chunk_size)), include_soft_deleted, order_by,
+            fields, hydrate, self._repository._load_plan(load_plan),
+        )
+
+    async def _iter_many(self, manager: AsyncSQLAlchemyManager, search_filter: dict, chunk_size: int,
+                         include_soft_deleted: bool, order_by: Sequence[str], fields: Optional[Sequence[str]],
+                         hydrate: bool, load_plan: Tuple[Tuple[str, str], ...]) -> AsyncIterator[Model]:
+        async with manager.create_session(read_only=True) as session:
+            statement = self._repository._select(
+                search_filter, include_soft_deleted, order_by, fields, hydrate, load_plan
+            )
+            statement = statement.execution_options(yield_per=chunk_size)
+            if fields is not None and not hydrate:
+                result = await session.stream(statement)
+            else:
+                result = await session.stream_scalars(statement)
+            async for model in result:
+                yield model
+
+    async def find_columns(self, search_filter: dict, fields: Sequence[str], include_soft_deleted: bool = False,
+                           order_by: Sequence[str] = (), chunk_size: int = 10000,
+                           dtypes: Optional[Dict[str, str]] = None, session: AsyncSession = None) -> Dict[str, Any]:
+        return await self._run(
+            self._repository.find_columns, search_filter, fields, include_soft_deleted, order_by, chunk_size, dtypes,
+            session=session, read_only=True,
+        )
+
+    async def find_page(self, search_filter: dict, order_by: Sequence[str] = (), after: Optional[str] = None,
+                        limit: int = 50, include_soft_deleted: bool = False, session: AsyncSession = None,
+                        load_plan: Optional[Dict[str, str]] = None) -> Page:
+        return await self._run(
+            self._repository.find_page, search_filter, order_by, after, limit, include_soft_deleted,
+            session=session, read_only=True, load_plan=load_plan,
+        )
+
+    async def insert_one(self, model: Model, session: AsyncSession = None):
+        return await self._run(self._repository.insert_one, model, session=session)
+
+    async def insert_many(self, models: List[Model], session: AsyncSession = None):
+        return await self._run(self._repository.insert_many, models, session=session)
+
+    async def bulk_insert_many(self, models: List[Model], chunk_size: int = 1000, return_defaults: bool = False,
+                               session: AsyncSession = None) -> List[Model]:
+        return await self._run(
+            self._repository.bulk_insert_many, models, chunk_size, return_defaults, session=session
+        )
+
+    async def update_one(self, model: Model, upsert=False, session: AsyncSession = None):
+        return await self._run(self._repository.update_one, model, upsert, session=session)
+
+    async def update_many(self, models: List[Model], upsert=False, chunk_size: int = 1000,
+                          session: AsyncSession = None) -> UpsertResult:
+        return await self._run(self._repository.update_many, models, upsert, chunk_size, session=session)
+
+    async def delete_one(self, primary_key_value: Union[str, int], soft_delete=True,
+                         session: AsyncSession = None) -> int:
+        return await self._run(self._repository.delete_one, primary_key_value, soft_delete, session=session)
+
+    async def delete_many(self, primary_key_value: Union[List[str], List[int]], soft_delete=True,
+                          chunk_size: int = 1000, session: AsyncSession = None) -> int:
+        return await self._run(
+            self._repository.delete_many, primary_key_value, soft_delete, chunk_size, session=session
+        )
+
+    async def restore_one(self, primary_key_value: Union[str, int], session: AsyncSession = None) -> int:
+        return await self._run(self._repository.restore_one, primary_key_value, session=session)
+
+    async def restore_many(self, primary_key_value: Union[List[str], List[int]], chunk_size: int = 1000,
+                           session: AsyncSession = None) -> int:
+        return await self._run(self._repository.restore_many, primary_key_value, chunk_size, session=session)
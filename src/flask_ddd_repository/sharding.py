@@ -0,0 +1,466 @@
+import atexit
+import contextvars
+import heapq
+import threading
+import weakref
+import zlib
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from flask import current_app, has_app_context
+from sqlalchemy.orm import Session
+
+from .cache import CacheBackend
+from .columnar import concatenate, take
+from .exceptions import ModelNotFoundException
+from .instrumentation import instrumented
+from .model import Model
+from .pagination import Page, encode_cursor
+from .repository import NULLS_LAST_DIALECTS, BatchResult, SQLAlchemyRepository, UpsertResult
+
+# Repositories whose fan-out pools are shut down at interpreter exit
+_repositories: 'weakref.WeakSet[ShardedSQLAlchemyRepository]' = weakref.WeakSet()
+
+
+class HashSharding:
+    """
+    Spreads the shard key values over the binds by a stable hash of their string value
+    """
+
+    def __init__(self, binds: Sequence[str]) -> None:
+        if not binds:
+            raise ValueError("Hash sharding needs at least one bind")
+        self.binds = list(binds)
+
+    def __call__(self, value: Any) -> str:
+        return self.binds[zlib.crc32(str(value).encode('utf8')) % len(self.binds)]
+
+
+class RangeSharding:
+    """
+    Assigns the shard key values to the binds by range: every bind holds the values
+    from its lower bound, included, up to the lower bound of the next one.
+    """
+
+    def __init__(self, ranges: Sequence[Tuple[Any, str]]) -> None:
+        """
+        :param ranges: (lower bound, bind name) pairs
+        """
+        if not ranges:
+            raise ValueError("Range sharding needs at least one range")
+        ranges = sorted(ranges, key=lambda item: item[0])
+        self._lower_bounds = [lower_bound for lower_bound, _ in ranges]
+        self._binds = [bind_name for _, bind_name in ranges]
+        self.binds = list(dict.fromkeys(self._binds))
+
+    def __call__(self, value: Any) -> str:
+        index = bisect_right(self._lower_bounds, value) - 1
+        if index < 0:
+            raise ValueError(f"Shard key value {value!r} is lower than every range")
+        return self._binds[index]
+
+
+class _SortKey:
+    """
+    Orders models like an ORDER BY mixing ascending and descending keys, NULLs first
+    in ascending order unless the dialect orders them last
+    """
+    __slots__ = ('values', 'descending', 'nulls_last')
+
+    def __init__(self, values: tuple, descending: Sequence[bool], nulls_last: bool = False) -> None:
+        self.values = values
+        self.descending = descending
+        self.nulls_last = nulls_last
+
+    def __lt__(self, other: '_SortKey') -> bool:
+        for value, other_value, descending in zip(self.values, other.values, self.descending):
+            if value == other_value:
+                continue
+            if value is None or other_value is None:
+                return (value is None) != (descending != self.nulls_last)
+            return value > other_value if descending else value < other_value
+        return False
+
+
+class ShardedSQLAlchemyRepository(SQLAlchemyRepository):
+    """
+    Repository of a model whose rows are spread over several binds by a shard key.
+
+    Writes are split per shard and executed on every shard concurrently, in one
+    transaction per shard: a batch is not atomic across shards. Reads with the
+    shard key hit a single shard, the other ones fan out to every shard on a
+    thread pool and their results are merged. Under the unit of work the shards
+    are visited one after the other by the application context thread.
+
+    Primary key values must be unique across the shards, the mapped table must
+    exist on every bind.
+    """
+
+    def __init__(self, model_class: type, shard_key: str, sharding: Union[HashSharding, RangeSharding],
+                 cache: CacheBackend = None, max_workers: Optional[int] = None,
+                 load_plan: Optional[Dict[str, str]] = None) -> None:
+        """
+        :param model_class: The mapped model class
+        :param shard_key: The model attribute whose value selects the shard
+        :param sharding: Callable returning the bind name of a shard key value, with the list of its `binds`
+        :param cache: Optional read-through cache for `find_one`, invalidated by the writes of this repository
+        :param max_workers: Threads of the fan-out pool, one per shard by default
+        :param load_plan: Loading strategies by relationship path, replacing the plan of the class
+        """
+        super().__init__(model_class, cache, load_plan=load_plan)
+        self._shard_key = shard_key
+        self._sharding = sharding
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        _repositories.add(self)
+
+    @property
+    def shards(self) -> List[str]:
+        return list(self._sharding.binds)
+
+    def shard_for(self, shard_key_value: Any) -> str:
+        return self._sharding(shard_key_value)
+
+    def _shard_of(self, model: Model) -> str:
+        value = getattr(model, self._shard_key)
+        if value is None:
+            raise ValueError(f"Can't shard a model without '{self._shard_key}' value: {model}")
+        return self.shard_for(value)
+
+    def _shards_for_filter(self, search_filter: dict) -> List[str]:
+        if self._shard_key in search_filter:
+            return [self.shard_for(search_filter[self._shard_key])]
+        return self.shards
+
+    def _group_by_shard(self, models: Iterable[Model]) -> Dict[str, List[Model]]:
+        groups: Dict[str, List[Model]] = {}
+        for model in models:
+            groups.setdefault(self._shard_of(model), []).append(model)
+        return groups
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers or len(self.shards),
+                    thread_name_prefix='flask_ddd_repository_shard',
+                )
+            return self._executor
+
+    def close(self) -> None:
+        """
+        Shuts the fan-out thread pool down, a new one is started by the next fan-out
+        """
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def _on_shards(self, calls: Dict[str, Callable[[Session], Any]], read_only: bool = False) -> List[Any]:
+        """
+        Runs every call with a session of its shard
+
+        :param calls: The calls, by bind name
+        :param read_only: Route the sessions to the bind replicas
+        :return: The results, in the order of the calls
+        """
+        def run(bind_name: str, call: Callable[[Session], Any]):
+            with self._managed_session(read_only=read_only, bind_name=bind_name) as session:
+                return call(session)
+
+        # Sessions of the unit of work belong to the application context thread
+        if len(calls) < 2 or self._get_manager().unit_of_work:
+            return [run(bind_name, call) for bind_name, call in calls.items()]
+
+        app = current_app._get_current_object()
+
+        def run_in_context(bind_name: str, call: Callable[[Session], Any]):
+            if has_app_context():
+                return run(bind_name, call)
+            with app.app_context():
+                return run(bind_name, call)
+
+        # Every worker runs in a copy of the caller context, sharing its application context
+        futures = [
+            self._get_executor().submit(contextvars.copy_context().run, run_in_context, bind_name, call)
+            for bind_name, call in calls.items()
+        ]
+        return [future.result() for future in futures]
+
+    def _nulls_last(self, manager=None) -> bool:
+        # The shards are expected to share their dialect
+        bind = (manager or self._get_manager()).binds()[self.shards[0]]
+        return bind.dialect.name in NULLS_LAST_DIALECTS
+
+    def _sort_key(self, ordering: List[Tuple[str, bool]], nulls_last: bool) -> Callable[[Model], _SortKey]:
+        descending = [descending for _, descending in ordering]
+        return lambda model: _SortKey(tuple(getattr(model, key) for key, _ in ordering), descending, nulls_last)
+
+    def _merge(self, results: Iterable[List[Model]], ordering: List[Tuple[str, bool]]) -> List[Model]:
+        models = list(chain.from_iterable(results))
+        return sorted(models, key=self._sort_key(ordering, self._nulls_last())) if ordering else models
+
+    @instrumented
+    def find_one(self, primary_key_value: Union[str, int], include_soft_deleted: bool = False,
+                 session: Session = None, fields: Optional[Sequence[str]] = None, hydrate: bool = True,
+                 load_plan: Optional[Dict[str, str]] = None, shard_key: Any = None):
+        """
+        Finds a model on the shard of `shard_key`, or on every shard when it isn't given
+
+        :param primary_key_value: The primary key value
+        :param include_soft_deleted: Include soft deleted models
+        :param session: The session to use, which selects the shard
+        :param fields: Load only these attributes, and the primary key
+        :param hydrate: With `fields`, return a model whose other attributes are deferred, otherwise a row
+        :param load_plan: Loading strategies by relationship path, merged over the plan of the repository
+        :param shard_key: The shard key value of the model
+        :return: The model, or the row
+        """
+        base = super()
+        if session is not None:
+            return base.find_one(primary_key_value, include_soft_deleted, session, fields, hydrate, load_plan)
+        if shard_key is not None:
+            return self._on_shards({
+                self.shard_for(shard_key): lambda shard_session: base.find_one(
+                    primary_key_value, include_soft_deleted, shard_session, fields, hydrate, load_plan
+                ),
+            }, read_only=True)[0]
+        if fields is not None:
+            return self._find_projection_on_shards(
+                primary_key_value, include_soft_deleted, fields, hydrate, load_plan
+            )
+
+        items = self.find_many_by_pks(
+            [primary_key_value], include_soft_deleted=include_soft_deleted, load_plan=load_plan
+        ).items
+        if not items:
+            raise ModelNotFoundException(f"Model not found with primary key value: {primary_key_value}")
+        return items[0]
+
+    def _find_projection_on_shards(self, primary_key_value: Union[str, int], include_soft_deleted: bool,
+                                   fields: Sequence[str], hydrate: bool, load_plan: Optional[Dict[str, str]]):
+        base = super()
+
+        def find_or_none(shard_session: Session):
+            try:
+                return base.find_one(
+                    primary_key_value, include_soft_deleted, shard_session, fields, hydrate, load_plan
+                )
+            except ModelNotFoundException:
+                return None
+
+        for found in self._on_shards({bind_name: find_or_none for bind_name in self.shards}, read_only=True):
+            if found is not None:
+                return found
+        raise ModelNotFoundException(f"Model not found with primary key value: {primary_key_value}")
+
+    @instrumented
+    def find_many_by_pks(self, primary_key_values: Iterable[Union[str, int]], chunk_size: int = 500,
+                         include_soft_deleted: bool = False, session: Session = None,
+                         load_plan: Optional[Dict[str, str]] = None) -> BatchResult:
+        base = super()
+        if session is not None:
+            return base.find_many_by_pks(primary_key_values, chunk_size, include_soft_deleted, session, load_plan)
+
+        primary_key_values = list(primary_key_values)
+        results = self._on_shards({
+            bind_name: lambda shard_session: base.find_many_by_pks(
+                primary_key_values, chunk_size, include_soft_deleted, shard_session, load_plan
+            )
+            for bind_name in self.shards
+        }, read_only=True)
+        found = {self._model_primary_key(model): model for result in results for model in result.items}
+        keys = [self._primary_key_tuple(value) for value in primary_key_values]
+        return BatchResult(
+            [found[key] for key in keys if key in found],
+            [value for value, key in zip(primary_key_values, keys) if key not in found],
+        )
+
+    @instrumented
+    def find_many(self, search_filter: dict, limit: int = 50, offset: int = 0, include_soft_deleted=False,
+                  order_by: Sequence[str] = (), session: Session = None, fields: Optional[Sequence[str]] = None,
+                  hydrate: bool = True, load_plan: Optional[Dict[str, str]] = None):
+        """
+        Finds the models of the shard of the shard key filter, or of every shard: each
+        of them returns its first `offset + limit` models, merged in `order_by` order.
+        Rows are merged on their fields, which must include the ordering keys.
+        """
+        base = super()
+        if session is not None:
+            return base.find_many(
+                search_filter, limit, offset, include_soft_deleted, order_by, session, fields, hydrate, load_plan
+            )
+
+        limit = int(max(0, limit))
+        offset = int(max(0, offset))
+        shards = self._shards_for_filter(search_filter)
+        if len(shards) == 1:
+            return self._on_shards({
+                shards[0]: lambda shard_session: base.find_many(
+                    search_filter, limit, offset, include_soft_deleted, order_by, shard_session, fields, hydrate,
+                    load_plan,
+                ),
+            }, read_only=True)[0]
+
+        results = self._on_shards({
+            bind_name: lambda shard_session: base.find_many(
+                search_filter, limit + offset, 0, include_soft_deleted, order_by, shard_session, fields, hydrate,
+                load_plan,
+            )
+            for bind_name in shards
+        }, read_only=True)
+        return self._merge(results, self._ordering(order_by))[offset:offset + limit]
+
+    def _iter_many(self, manager, search_filter: dict, chunk_size: int, include_soft_deleted: bool,
+                   order_by: Sequence[str], bind_name: str = None, fields: Optional[Sequence[str]] = None,
+                   hydrate: bool = True, load_plan: Tuple[Tuple[str, str], ...] = ()) -> Iterator[Model]:
+        base = super()
+        iterators = [
+            base._iter_many(
+                manager, search_filter, chunk_size, include_soft_deleted, order_by, shard, fields, hydrate, load_plan
+            )
+            for shard in ([bind_name] if bind_name else self._shards_for_filter(search_filter))
+        ]
+        ordering = self._ordering(order_by)
+        # Every shard streams in order, the streams are merged lazily
+        yield from heapq.merge(*iterators, key=self._sort_key(ordering, self._nulls_last(manager))) \
+            if ordering else chain(*iterators)
+
+    @instrumented
+    def find_columns(self, search_filter: dict, fields: Sequence[str], include_soft_deleted: bool = False,
+                     order_by: Sequence[str] = (), chunk_size: int = 10000, dtypes: Optional[Dict[str, str]] = None,
+                     session: Session = None) -> Dict[str, Any]:
+        """
+        Exports the columns of the shard of the shard key filter, or of every shard
+        joined and merged in `order_by` order, whose keys must be among the fields.
+        """
+        base = super()
+        if session is not None:
+            return base.find_columns(search_filter, fields, include_soft_deleted, order_by, chunk_size, dtypes, session)
+
+        ordering = self._ordering(order_by)
+        shards = self._shards_for_filter(search_filter)
+        missing = [key for key, _ in ordering if key not in fields]
+        if len(shards) > 1 and missing:
+            raise ValueError(f"Can't merge the shards on keys missing from the fields: {missing}")
+
+        results = self._on_shards({
+            bind_name: lambda shard_session: base.find_columns(
+                search_filter, fields, include_soft_deleted, order_by, chunk_size, dtypes, shard_session
+            )
+            for bind_name in shards
+        }, read_only=True)
+        if len(results) == 1:
+            return results[0]
+        columns = concatenate(results)
+        if not ordering:
+            return columns
+        keys = list(zip(*(list(columns[key]) for key, _ in ordering)))
+        descending = [descending for _, descending in ordering]
+        nulls_last = self._nulls_last()
+        return take(columns, sorted(
+            range(len(keys)), key=lambda index: _SortKey(keys[index], descending, nulls_last)
+        ))
+
+    @instrumented
+    def find_page(self, search_filter: dict, order_by: Sequence[str] = (), after: Optional[str] = None,
+                  limit: int = 50, include_soft_deleted: bool = False, session: Session = None,
+                  load_plan: Optional[Dict[str, str]] = None) -> Page:
+        base = super()
+        if session is not None:
+            return base.find_page(search_filter, order_by, after, limit, include_soft_deleted, session, load_plan)
+
+        limit = int(max(1, limit))
+        pages = self._on_shards({
+            bind_name: lambda shard_session: base.find_page(
+                search_filter, order_by, after, limit, include_soft_deleted, shard_session, load_plan
+            )
+            for bind_name in self._shards_for_filter(search_filter)
+        }, read_only=True)
+        ordering = self._page_ordering(order_by)
+        items = self._merge((page.items for page in pages), ordering)
+        if len(items) <= limit and not any(page.next_cursor for page in pages):
+            return Page(items, None)
+        keys = [key for key, _ in ordering]
+        return Page(items[:limit], encode_cursor(keys, [getattr(items[limit - 1], key) for key in keys]))
+
+    @instrumented
+    def insert_one(self, model: Model, session: Session = None):
+        base = super()
+        if session is not None:
+            return base.insert_one(model, session)
+        return self._on_shards({
+            self._shard_of(model): lambda shard_session: base.insert_one(model, shard_session),
+        })[0]
+
+    @instrumented
+    def insert_many(self, models: List[Model], session: Session = None):
+        base = super()
+        if session is not None:
+            return base.insert_many(models, session)
+        self._on_shards({
+            bind_name: lambda shard_session, shard_models=shard_models: base.insert_many(shard_models, shard_session)
+            for bind_name, shard_models in self._group_by_shard(models).items()
+        })
+        return models
+
+    @instrumented
+    def bulk_insert_many(self, models: List[Model], chunk_size: int = 1000, return_defaults: bool = False,
+                         session: Session = None) -> List[Model]:
+        base = super()
+        if session is not None:
+            return base.bulk_insert_many(models, chunk_size, return_defaults, session)
+        self._on_shards({
+            bind_name: lambda shard_session, shard_models=shard_models: base.bulk_insert_many(
+                shard_models, chunk_size, return_defaults, shard_session
+            )
+            for bind_name, shard_models in self._group_by_shard(models).items()
+        })
+        return models
+
+    @instrumented
+    def update_one(self, model: Model, upsert=False, session: Session = None):
+        base = super()
+        if session is not None:
+            return base.update_one(model, upsert, session)
+        return self._on_shards({
+            self._shard_of(model): lambda shard_session: base.update_one(model, upsert, shard_session),
+        })[0]
+
+    @instrumented
+    def update_many(self, models: List[Model], upsert=False, chunk_size: int = 1000,
+                    session: Session = None) -> UpsertResult:
+        base = super()
+        if session is not None:
+            return base.update_many(models, upsert, chunk_size, session)
+        results = self._on_shards({
+            bind_name: lambda shard_session, shard_models=shard_models: base.update_many(
+                shard_models, upsert, chunk_size, shard_session
+            )
+            for bind_name, shard_models in self._group_by_shard(models).items()
+        })
+        return UpsertResult(sum(result.inserted for result in results), sum(result.updated for result in results))
+
+    def _execute_for_primary_keys(self, statement, primary_key_values: Iterable, chunk_size: int,
+                                  session: Session = None) -> int:
+        # Deletes and restores only know the primary keys: they run on every shard
+        base = super()
+        if session is not None:
+            return base._execute_for_primary_keys(statement, primary_key_values, chunk_size, session)
+
+        primary_key_values = list(primary_key_values)
+        return sum(self._on_shards({
+            bind_name: lambda shard_session: base._execute_for_primary_keys(
+                statement, primary_key_values, chunk_size, shard_session
+            )
+            for bind_name in self.shards
+        }))
+
+
+@atexit.register
+def _close_repositories() -> None:
+    for repository in list(_repositories):
+        repository.close()
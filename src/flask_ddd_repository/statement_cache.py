@@ -0,0 +1,74 @@
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Mapper
+from sqlalchemy.sql import Executable
+
+from .cache import CacheStats
+
+_caches: 'weakref.WeakSet[StatementCache]' = weakref.WeakSet()
+
+
+class StatementCache:
+    """
+    Statements built by the repositories, keyed by their shape (repository class,
+    model mapper, filter keys, ordering...) with the values left as bound parameters.
+    Subclasses may narrow `_select`, so their statements are kept apart. SQLAlchemy
+    compiles a statement once per engine, so a cached statement skips both the
+    build and the compiled cache key computation of its later executions.
+
+    Bounded to `maxsize` statements evicted in LRU order, cleared whenever
+    mappers are configured. A remapped class gets a new mapper, hence new keys.
+    """
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self.stats = CacheStats()
+        self._statements: 'OrderedDict[Hashable, Executable]' = OrderedDict()
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def get(self, key: Hashable, build: Callable[[], Executable]) -> Executable:
+        """
+        Returns the statement of a shape, building it on the first use
+
+        :param key: The shape of the statement
+        :param build: Builds the statement
+        :return: The statement
+        """
+        with self._lock:
+            statement = self._statements.get(key)
+            if statement is not None:
+                self._statements.move_to_end(key)
+                self.stats.hits += 1
+                return statement
+            self.stats.misses += 1
+
+        statement = build()
+        with self._lock:
+            self._statements[key] = statement
+            self._statements.move_to_end(key)
+            while len(self._statements) > self.maxsize:
+                self._statements.popitem(last=False)
+                self.stats.evictions += 1
+        return statement
+
+    def clear(self) -> None:
+        with self._lock:
+            self._statements.clear()
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+
+@event.listens_for(Mapper, 'after_configured')
+def _clear_caches() -> None:
+    for cache in list(_caches):
+        cache.clear()
+
+
+#: Shared by the repositories unless they are given their own
+default_statement_cache = StatementCache()
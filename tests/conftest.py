@@ -1,7 +1,7 @@
 import flask
 import pytest
 from flask_ddd_repository import FlaskDDDRepository, get_managers, DB_MANAGER_SQLALCHEMY
-from sqlalchemy import Table, Column, Integer, String
+from sqlalchemy import Table, Column, Integer, String, DateTime
 from sqlalchemy.orm import mapper
 
 
@@ -51,6 +51,7 @@ def Model(app, repo):
         Column('id', Integer, primary_key=True),
         Column('name', String),
         Column('lastname', String),
+        Column('deleted_at', DateTime),
     )
     mapper(Model, test_table)
     meta.create_all()
@@ -0,0 +1,56 @@
+from unittest.mock import patch
+
+from flask import Flask
+from flask_ddd_repository.db_manager.sqlalchemy import SQLAlchemyManager
+from flask_ddd_repository.repository import SQLAlchemyRepository
+from sqlalchemy import Table, Column, Integer
+from sqlalchemy.orm import Session
+
+
+class TestSessionFactoryCache:
+    def _manager(self, app: Flask, binds: int = 5, tables: int = 20) -> SQLAlchemyManager:
+        manager = SQLAlchemyManager(app)
+        for bind in range(binds):
+            manager.init_bind(bind_name=f'bind_{bind}', db_type='sqlite', db_host=':memory:')
+            for table in range(tables):
+                Table(f'table_{table}', manager.metadata()[f'bind_{bind}'], Column('id', Integer, primary_key=True))
+        return manager
+
+    def test_create_session_reuses_the_cached_session_factory(self, app: Flask):
+        manager = self._manager(app)
+        create_sessionmaker = manager._create_sessionmaker
+        with patch.object(manager, '_create_sessionmaker', side_effect=create_sessionmaker) as create:
+            for _ in range(3):
+                manager.create_session().close()
+                manager.create_session('bind_0').close()
+            assert create.call_count == 2
+            # A new table invalidates the multi-bind factory only
+            Table('new_table', manager.metadata()['bind_1'], Column('id', Integer, primary_key=True))
+            manager.create_session().close()
+            manager.create_session('bind_0').close()
+            assert create.call_count == 3
+
+
+class TestBulkInsert:
+    rows = 5000
+
+    def test_bulk_insert_many_writes_every_row_in_executemany_batches(self, app: Flask, Model):
+        repo = SQLAlchemyRepository(Model)
+        models = [Model(f'name_{index}', 'Doe') for index in range(self.rows)]
+        with app.test_request_context():
+            with patch.object(Session, 'execute', autospec=True, side_effect=Session.execute) as execute:
+                assert repo.bulk_insert_many(models, chunk_size=2000) is models
+            assert [len(call.args[2]) for call in execute.call_args_list] == [2000, 2000, 1000]
+            assert len(repo.find_many({}, limit=self.rows * 2)) == self.rows
+
+    def test_bulk_insert_many_returns_the_primary_keys_of_every_group(self, app: Flask, Model):
+        repo = SQLAlchemyRepository(Model)
+        models = [Model(f'name_{index}', 'Doe') for index in range(self.rows)]
+        # Rows with and without a primary key are inserted by separate statements
+        for index in range(0, self.rows, 1000):
+            models[index].id = self.rows * 10 + index
+        with app.test_request_context():
+            repo.bulk_insert_many(models, chunk_size=1000, return_defaults=True)
+            assert len({m.id for m in models}) == self.rows and None not in {m.id for m in models}
+            found = repo.find_many_by_pks([m.id for m in models]).items
+            assert [m.name for m in found] == [m.name for m in models]
@@ -0,0 +1,103 @@
+import threading
+from unittest.mock import patch
+
+from flask import Flask
+from flask_ddd_repository.buffered import BufferedSQLAlchemyRepository, _close_buffers
+from flask_ddd_repository.exceptions import WriteBufferFullException
+from flask_ddd_repository.repository import SQLAlchemyRepository
+from pytest import fixture, raises
+
+
+@fixture
+def sqlalchemy_binds(tmp_path):
+    # The background thread needs a database shared between connections
+    return [{'bind_name': 'test_sqlite_memory', 'db_type': 'sqlite', 'db_host': str(tmp_path / 'buffered.db')}]
+
+
+def _names(app: Flask, Model):
+    with app.test_request_context():
+        return sorted(model.name for model in SQLAlchemyRepository(Model).find_many({}))
+
+
+class TestBufferedSQLAlchemyRepository:
+    def test_inserts_return_before_the_models_are_written(self, app: Flask, Model):
+        repo = BufferedSQLAlchemyRepository(Model, flush_interval=60)
+        with app.test_request_context():
+            model = Model('John', 'Doe')
+            assert repo.insert_one(model) is model
+            repo.insert_many([Model('Jane', 'Doe')])
+        assert _names(app, Model) == []
+        assert repo.flush(timeout=5)
+        assert _names(app, Model) == ['Jane', 'John']
+        repo.close()
+
+    def test_writes_full_batches_and_after_the_interval(self, app: Flask, Model):
+        repo = BufferedSQLAlchemyRepository(Model, batch_size=2, flush_interval=0.05)
+        written = threading.Semaphore(0)
+        bulk_insert_many = SQLAlchemyRepository.bulk_insert_many
+
+        def record(self, models, *args, **kwargs):
+            result = bulk_insert_many(self, models, *args, **kwargs)
+            written.release()
+            return result
+
+        with patch.object(SQLAlchemyRepository, 'bulk_insert_many', autospec=True, side_effect=record) as bulk:
+            with app.test_request_context():
+                repo.insert_many([Model(name, 'Doe') for name in ['A', 'B', 'C']])
+            assert written.acquire(timeout=5) and written.acquire(timeout=5)
+        assert [len(call.args[1]) for call in bulk.call_args_list] == [2, 1]
+        assert _names(app, Model) == ['A', 'B', 'C']
+        repo.close()
+
+    def test_full_queue_raises_after_put_timeout(self, app: Flask, Model):
+        repo = BufferedSQLAlchemyRepository(Model, max_queue_size=1, put_timeout=0.01)
+        # The background thread is not started, nothing takes from the queue
+        with patch.object(repo, '_ensure_thread'), app.test_request_context():
+            repo.insert_one(Model('John', 'Doe'))
+            with raises(WriteBufferFullException):
+                repo.insert_one(Model('Jane', 'Doe'))
+
+    def test_failed_batches_are_passed_to_the_callback(self, app: Flask, Model):
+        failures = []
+        repo = BufferedSQLAlchemyRepository(Model, on_error=lambda models, e: failures.append((models, e)))
+        with app.test_request_context():
+            model = Model('John', 'Doe')
+            model.id = 'not an id'
+            repo.insert_one(model)
+        repo.flush(timeout=5)
+        assert len(failures) == 1 and failures[0][0] == [model]
+        repo.close()
+
+    def test_context_teardown_and_exit_write_the_queue(self, app: Flask, Model):
+        repo = BufferedSQLAlchemyRepository(Model, flush_interval=60)
+        with app.app_context():
+            repo.insert_one(Model('John', 'Doe'))
+        assert _names(app, Model) == ['John']
+
+        with app.test_request_context():
+            repo.insert_one(Model('Jane', 'Doe'))
+        _close_buffers()
+        assert _names(app, Model) == ['Jane', 'John']
+        # Closed repositories write synchronously
+        with app.test_request_context():
+            repo.insert_one(Model('Jim', 'Doe'))
+        assert _names(app, Model) == ['Jane', 'Jim', 'John']
+
+    def test_close_gives_up_on_a_stalled_writer_after_the_timeout(self, app: Flask, Model, caplog):
+        repo = BufferedSQLAlchemyRepository(Model, max_queue_size=1)
+        stalled = threading.Event()
+        with patch.object(repo, '_run', side_effect=stalled.wait), app.test_request_context():
+            repo.insert_one(Model('John', 'Doe'))
+            # The queue is full and nothing takes from it
+            assert repo.close(timeout=0.05) is False
+        assert 'about 1 models are left' in caplog.records[-1].getMessage()
+        stalled.set()
+
+    def test_flush_gives_up_on_a_stalled_writer_after_the_timeout(self, app: Flask, Model):
+        repo = BufferedSQLAlchemyRepository(Model, max_queue_size=1)
+        stalled = threading.Event()
+        with patch.object(repo, '_run', side_effect=stalled.wait), app.test_request_context():
+            repo.insert_one(Model('John', 'Doe'))
+            # The queue is full and nothing takes from it
+            assert repo.flush(timeout=0.05) is False
+        stalled.set()
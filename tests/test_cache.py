@@ -0,0 +1,80 @@
+from flask_ddd_repository.cache import InMemoryCache, SharedStoreCache
+
+
+class FakeSharedStore:
+    """Local stand-in for a shared key-value store client, with the redis-py call signatures."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.values = {}
+
+    def get(self, name):
+        value, expires_at = self.values.get(name, (None, None))
+        if expires_at is not None and expires_at <= self.clock():
+            del self.values[name]
+            return None
+        return value
+
+    def set(self, name, value, ex=None):
+        self.values[name] = (value, self.clock() + ex if ex is not None else None)
+
+    def delete(self, *names):
+        for name in names:
+            self.values.pop(name, None)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestInMemoryCache:
+    def test_evicts_least_recently_used_entries(self):
+        cache = InMemoryCache(maxsize=2)
+        cache.set((int, (1,)), {'id': 1})
+        cache.set((int, (2,)), {'id': 2})
+        assert cache.get((int, (1,))) == {'id': 1}
+        cache.set((int, (3,)), {'id': 3})
+        assert cache.get((int, (2,))) is None
+        assert cache.get((int, (1,))) == {'id': 1}
+        assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (2, 1, 1)
+
+    def test_expires_entries_after_ttl(self):
+        clock = Clock()
+        cache = InMemoryCache(ttl=10, clock=clock)
+        cache.set((int, (1,)), {'id': 1})
+        clock.now = 9
+        assert cache.get((int, (1,))) == {'id': 1}
+        clock.now = 10
+        assert cache.get((int, (1,))) is None
+        assert len(cache) == 0
+        assert cache.stats.evictions == 1
+
+    def test_delete_and_clear(self):
+        cache = InMemoryCache()
+        cache.set((int, (1,)), {'id': 1})
+        cache.set((int, (2,)), {'id': 2})
+        cache.delete((int, (1,)))
+        assert cache.get((int, (1,))) is None
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.stats.hit_rate == 0
+
+
+class TestSharedStoreCache:
+    def test_round_trips_values_through_the_store(self):
+        clock = Clock()
+        store = FakeSharedStore(clock)
+        cache = SharedStoreCache(store, ttl=10, prefix='test')
+        cache.set((int, (1,)), {'id': 1})
+        assert list(store.values) == ["test:builtins.int:(1,)"]
+        assert SharedStoreCache(store, prefix='test').get((int, (1,))) == {'id': 1}
+        clock.now = 10
+        assert cache.get((int, (1,))) is None
+        cache.set((int, (1,)), {'id': 1})
+        cache.delete((int, (1,)))
+        assert cache.get((int, (1,))) is None
+        assert (cache.stats.hits, cache.stats.misses) == (0, 2)
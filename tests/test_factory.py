@@ -0,0 +1,56 @@
+import sys
+
+from flask_ddd_repository.model import CompactModel, Model
+from pytest import raises
+from sqlalchemy import Column, Integer, MetaData, String, Table, inspect
+from sqlalchemy.orm import mapper
+
+
+class Person(Model):
+    def __init__(self, name: str = None, lastname: str = None):
+        self.name = name
+        self.lastname = lastname
+
+
+class CompactPerson(CompactModel):
+    __slots__ = ('name', 'lastname')
+
+    def __init__(self, name: str = None, lastname: str = None):
+        super().__init__()
+        self.name = name
+        self.lastname = lastname
+
+
+class TestFactory:
+    def test_create_assigns_only_the_model_attributes(self):
+        person = Person.get_factory().create({'name': 'John', 'deleted_at': 1, 'unknown': 'ignored'})
+        assert (person.name, person.lastname, person.deleted_at) == ('John', None, 1)
+        assert not hasattr(person, 'unknown')
+
+    def test_create_many_from_rows_or_columns(self):
+        factory = Person.get_factory()
+        people = factory.create_many([{'name': 'John'}, {'name': 'Jane', 'lastname': 'Doe'}])
+        assert [(p.name, p.lastname) for p in people] == [('John', None), ('Jane', 'Doe')]
+
+        people = factory.create_many({'name': ['John', 'Jane'], 'lastname': ['Doe', 'Roe'], 'unknown': [1]})
+        assert [(p.name, p.lastname) for p in people] == [('John', 'Doe'), ('Jane', 'Roe')]
+        with raises(ValueError):
+            factory.create_many({'name': ['John', 'Jane'], 'lastname': ['Doe']})
+
+    def test_mapped_attributes_are_set_through_instrumentation(self):
+        class Mapped(Model):
+            pass
+
+        # The plan computed before mapping must not write mapped attributes to the instance dictionary
+        Mapped.get_factory().create({'name': 'John'})
+        mapper(Mapped, Table('mapped', MetaData(), Column('id', Integer, primary_key=True), Column('name', String)))
+        created = [Mapped.get_factory().create({'name': 'John'}), *Mapped.get_factory().create_many({'name': ['Jane']})]
+        for mapped in created:
+            assert inspect(mapped).attrs.name.history.added == [mapped.name]
+
+    def test_compact_models_have_no_instance_dictionary(self):
+        people = CompactPerson.get_factory().create_many({'name': ['John', 'Jane'], 'deleted_at': [None, 1]})
+        assert [(p.name, p.lastname, p.deleted_at) for p in people] == [('John', None, None), ('Jane', None, 1)]
+        assert not hasattr(people[0], '__dict__')
+        person = Person('John', 'Doe')
+        assert sys.getsizeof(people[0]) < sys.getsizeof(person) + sys.getsizeof(person.__dict__)
@@ -1,8 +1,11 @@
+import subprocess
+import sys
 from unittest.mock import patch, PropertyMock
 
 from flask import Flask
 from flask_ddd_repository import FlaskDDDRepository, DB_MANAGER_SQLALCHEMY, _FlaskDDDRepositoryState, get_managers
 from flask_ddd_repository.db_manager.sqlalchemy import SQLAlchemyManager
+from pytest import raises
 
 
 class TestFlaskDDDRepository:
@@ -38,3 +41,27 @@ class TestFlaskDDDRepository:
         repo.init_app(app, (DB_MANAGER_SQLALCHEMY,))
         assert repo.teardown in app.teardown_appcontext_funcs
 
+    @patch.object(SQLAlchemyManager, 'teardown')
+    def test_teardown_forwards_exception_to_managers(self, mocked_manager_teardown, app: Flask):
+        repo = FlaskDDDRepository(app)
+        exception = Exception()
+        with app.app_context():
+            repo.teardown(exception)
+        mocked_manager_teardown.assert_any_call(exception)
+
+    def test_package_import_defers_sqlalchemy(self):
+        imported = subprocess.run(
+            [sys.executable, '-c', "import sys, flask_ddd_repository; print('sqlalchemy' in sys.modules)"],
+            capture_output=True, text=True, check=True,
+        )
+        assert imported.stdout.strip() == 'False'
+
+    def test_managers_are_reachable_from_the_package(self):
+        import flask_ddd_repository
+        from flask_ddd_repository.db_manager.base import StorageManager
+        from flask_ddd_repository.db_manager.sqlalchemy_async import AsyncSQLAlchemyManager
+        assert flask_ddd_repository.SQLAlchemyManager is SQLAlchemyManager
+        assert flask_ddd_repository.AsyncSQLAlchemyManager is AsyncSQLAlchemyManager
+        assert flask_ddd_repository.StorageManager is StorageManager
+        with raises(AttributeError):
+            flask_ddd_repository.Unknown
@@ -0,0 +1,85 @@
+from unittest.mock import patch
+
+from flask import Flask
+from flask_ddd_repository import instrumentation
+from flask_ddd_repository.exceptions import ModelNotFoundException
+from flask_ddd_repository.instrumentation import CallbackSink, MetricsAggregator, SignalSink, _Histogram, \
+    add_sink, remove_sink
+from flask_ddd_repository.repository import SQLAlchemyRepository
+from pytest import fixture, raises
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+@fixture
+def records():
+    records = []
+    sink = CallbackSink(records.append)
+    add_sink(sink)
+    yield records
+    remove_sink(sink)
+
+
+class TestInstrumentation:
+    def test_records_tagged_calls_with_statements_rows_and_checkouts(self, app: Flask, Model, records):
+        repo = SQLAlchemyRepository(Model)
+        with app.test_request_context():
+            repo.insert_many([Model('John', 'Doe'), Model('Jane', 'Doe')])
+            records.clear()
+            repo.find_many({'lastname': 'Doe'})
+
+        session, find_many = records
+        assert (find_many.method, find_many.model, find_many.bind) == ('find_many', 'Model', 'test_sqlite_memory')
+        assert (find_many.statements, find_many.rows, find_many.error) == (1, 2, False)
+        assert find_many.duration >= session.duration > 0
+        assert find_many.checkout_wait == session.checkout_wait > 0
+        assert (session.method, session.statements) == ('session', 1)
+
+    def test_records_errors_and_streamed_rows(self, app: Flask, Model, records):
+        repo = SQLAlchemyRepository(Model)
+        with app.test_request_context():
+            repo.insert_many([Model('John', 'Doe'), Model('Jane', 'Doe')])
+            with raises(ModelNotFoundException):
+                repo.find_one(22)
+            assert records[-1].method == 'find_one' and records[-1].error
+            records.clear()
+            iterator = repo.iter_many({}, chunk_size=1)
+            assert records == []
+            assert len(list(iterator)) == 2
+        assert [(record.method, record.rows, record.statements) for record in records] == [('iter_many', 2, 1)]
+
+    def test_nothing_is_measured_without_sink(self, app: Flask, Model):
+        repo = SQLAlchemyRepository(Model)
+        assert not event.contains(Engine, 'before_cursor_execute', instrumentation._count_statement)
+        with patch.object(instrumentation, '_publish') as publish:
+            with app.test_request_context():
+                repo.find_many({})
+        publish.assert_not_called()
+
+    def test_aggregator_and_signal_sinks(self, app: Flask, Model):
+        aggregator, signal = MetricsAggregator(), SignalSink()
+        add_sink(aggregator)
+        add_sink(signal)
+        try:
+            repo = SQLAlchemyRepository(Model)
+            with patch.object(instrumentation.repository_called, 'send') as send:
+                with app.test_request_context():
+                    for _ in range(3):
+                        repo.find_many({})
+        finally:
+            remove_sink(aggregator)
+            remove_sink(signal)
+
+        stats = aggregator.stats()[('find_many', 'Model', 'test_sqlite_memory')]
+        assert (stats.calls, stats.errors, stats.statements, stats.rows) == (3, 0, 3, 0)
+        assert 0 < stats.p50 <= stats.p95 <= stats.p99
+        assert send.call_count == 6
+        assert send.call_args.args == (app,)
+
+    def test_histogram_percentiles_are_approximated_within_precision(self):
+        histogram = _Histogram(precision=16)
+        for value in range(1, 101):
+            histogram.add(value / 1000)
+        for percent in (50, 95, 99):
+            assert percent / 1000 <= histogram.percentile(percent) <= percent / 1000 * (1 + 1 / 16)
+        assert _Histogram().percentile(50) == 0.0
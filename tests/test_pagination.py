@@ -0,0 +1,26 @@
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from uuid import uuid4
+
+from flask_ddd_repository.exceptions import InvalidCursorException
+from flask_ddd_repository.pagination import decode_cursor, encode_cursor
+from pytest import raises
+
+
+class TestCursor:
+    def test_cursor_round_trips_values(self):
+        values = [
+            1, 'name', None, 1.5,
+            datetime(2020, 6, 21, 10, 30, 5, 123), datetime(2020, 6, 21, tzinfo=timezone(timedelta(hours=2))),
+            date(2020, 6, 21), time(10, 30), Decimal('10.25'), uuid4(),
+        ]
+        keys = [f'key_{index}' for index in range(len(values))]
+        assert decode_cursor(encode_cursor(keys, values), keys) == values
+
+    def test_decode_cursor_fails_on_malformed_cursor(self):
+        with raises(InvalidCursorException):
+            decode_cursor('not a cursor', ['id'])
+
+    def test_decode_cursor_fails_on_different_keys(self):
+        with raises(InvalidCursorException):
+            decode_cursor(encode_cursor(['id'], [1]), ['name'])
@@ -0,0 +1,164 @@
+import threading
+from unittest.mock import patch
+
+from flask import Flask
+from flask_ddd_repository import get_managers, DB_MANAGER_SQLALCHEMY
+from flask_ddd_repository.exceptions import ModelNotFoundException
+from flask_ddd_repository.repository import SQLAlchemyRepository
+from flask_ddd_repository.sharding import HashSharding, RangeSharding, ShardedSQLAlchemyRepository, _SortKey
+from pytest import fixture, raises
+from sqlalchemy import inspect
+
+
+@fixture
+def sqlalchemy_binds(tmp_path):
+    return [
+        {'bind_name': 'test_sqlite_memory', 'db_type': 'sqlite', 'db_host': str(tmp_path / 'shard_0.db')},
+        {'bind_name': 'shard_1', 'db_type': 'sqlite', 'db_host': str(tmp_path / 'shard_1.db')},
+    ]
+
+
+@fixture
+def sharded_repo(app: Flask, Model):
+    inspect(Model).local_table.create(get_managers(app)[DB_MANAGER_SQLALCHEMY].binds()['shard_1'])
+    # Ids below 100 live on the first shard
+    return ShardedSQLAlchemyRepository(Model, 'id', RangeSharding([(0, 'test_sqlite_memory'), (100, 'shard_1')]))
+
+
+def _model(Model, id, name, lastname='Doe'):
+    model = Model(name, lastname)
+    model.id = id
+    return model
+
+
+def _shard_names(app: Flask, Model, bind_name):
+    session = get_managers(app)[DB_MANAGER_SQLALCHEMY].create_session(bind_name)
+    try:
+        return sorted(model.name for model in session.query(Model))
+    finally:
+        session.close()
+
+
+class TestSharding:
+    def test_hash_sharding_is_stable_and_spreads_values(self):
+        sharding = HashSharding(['a', 'b', 'c'])
+        assert [sharding(value) for value in range(30)] == [sharding(value) for value in range(30)]
+        assert {sharding(value) for value in range(30)} == {'a', 'b', 'c'}
+
+    def test_range_sharding_uses_lower_bounds(self):
+        sharding = RangeSharding([(100, 'b'), (0, 'a'), (200, 'a')])
+        assert [sharding(0), sharding(99), sharding(100), sharding(250)] == ['a', 'a', 'b', 'a']
+        assert sharding.binds == ['a', 'b']
+        with raises(ValueError):
+            sharding(-1)
+
+    def test_sort_key_places_nulls_like_the_dialect(self):
+        def ordered(descending, nulls_last):
+            return [values[0] for values in sorted(
+                [(1,), (None,), (2,)], key=lambda values: _SortKey(values, [descending], nulls_last)
+            )]
+
+        assert ordered(False, nulls_last=False) == [None, 1, 2]
+        assert ordered(True, nulls_last=False) == [2, 1, None]
+        assert ordered(False, nulls_last=True) == [1, 2, None]
+        assert ordered(True, nulls_last=True) == [None, 2, 1]
+
+
+class TestShardedSQLAlchemyRepository:
+    def test_writes_are_split_per_shard(self, app: Flask, Model, sharded_repo):
+        with app.test_request_context():
+            sharded_repo.insert_many([_model(Model, 1, 'John'), _model(Model, 101, 'Jane')])
+            sharded_repo.insert_one(_model(Model, 2, 'Jim'))
+            sharded_repo.bulk_insert_many([_model(Model, 102, 'Joe'), _model(Model, 3, 'Jack')])
+        assert _shard_names(app, Model, 'test_sqlite_memory') == ['Jack', 'Jim', 'John']
+        assert _shard_names(app, Model, 'shard_1') == ['Jane', 'Joe']
+
+        with app.test_request_context():
+            result = sharded_repo.update_many([_model(Model, 1, 'Johnny'), _model(Model, 103, 'Jill')], upsert=True)
+            assert (result.inserted, result.updated) == (1, 1)
+            assert sharded_repo.delete_many([1, 101], soft_delete=False) == 2
+        assert _shard_names(app, Model, 'test_sqlite_memory') == ['Jack', 'Jim']
+        assert _shard_names(app, Model, 'shard_1') == ['Jill', 'Joe']
+
+    def test_find_one_with_shard_key_hits_a_single_shard(self, app: Flask, Model, sharded_repo):
+        with app.test_request_context():
+            sharded_repo.insert_many([_model(Model, 1, 'John'), _model(Model, 101, 'Jane')])
+            managed_session = sharded_repo._managed_session
+            with patch.object(SQLAlchemyRepository, '_managed_session', wraps=managed_session) as sessions:
+                assert sharded_repo.find_one(101, shard_key=101).name == 'Jane'
+            assert [call.kwargs['bind_name'] for call in sessions.call_args_list if 'bind_name' in call.kwargs] == \
+                ['shard_1']
+            assert sharded_repo.find_one(1).name == 'John'
+            with raises(ModelNotFoundException):
+                sharded_repo.find_one(1, shard_key=101)
+            with raises(ModelNotFoundException):
+                sharded_repo.find_one(5)
+
+    def test_find_many_fans_out_on_threads_and_merges(self, app: Flask, Model, sharded_repo):
+        with app.test_request_context():
+            sharded_repo.insert_many([
+                _model(Model, 1, 'John'), _model(Model, 101, 'Jane'), _model(Model, 2, 'Jim', 'Roe'),
+                _model(Model, 102, 'Joe', 'Roe'), _model(Model, 3, 'Jack'),
+            ])
+            threads = set()
+            find_many = SQLAlchemyRepository.find_many
+            # Both shards must be queried at the same time to get past the barrier
+            barrier = threading.Barrier(2, timeout=5)
+
+            def record_thread(*args, **kwargs):
+                threads.add(threading.get_ident())
+                barrier.wait()
+                return find_many(*args, **kwargs)
+
+            with patch.object(SQLAlchemyRepository, 'find_many', side_effect=record_thread, autospec=True):
+                names = [m.name for m in sharded_repo.find_many({}, order_by=['-lastname', 'name'])]
+            assert names == ['Jim', 'Joe', 'Jack', 'Jane', 'John']
+            assert len(threads) == 2 and threading.get_ident() not in threads
+            assert [m.name for m in sharded_repo.find_many({}, order_by=['name'], limit=2, offset=1)] == ['Jane', 'Jim']
+            assert [m.name for m in sharded_repo.find_many({'id': 102})] == ['Joe']
+            assert sharded_repo.find_many_by_pks([102, 7, 1]).missing == [7]
+            assert [m.name for m in sharded_repo.iter_many({}, order_by=['-name'])] == \
+                ['John', 'Joe', 'Jim', 'Jane', 'Jack']
+
+    def test_close_shuts_the_fan_out_pool_down(self, app: Flask, Model, sharded_repo):
+        with app.test_request_context():
+            sharded_repo.find_many({})
+            executor = sharded_repo._executor
+            sharded_repo.close()
+            assert sharded_repo._executor is None and executor._shutdown
+            assert sharded_repo.find_many({}) == []
+        sharded_repo.close()
+
+    def test_find_columns_joins_and_merges_shards(self, app: Flask, Model, sharded_repo):
+        with app.test_request_context(), patch('flask_ddd_repository.columnar.numpy', None):
+            sharded_repo.insert_many([_model(Model, id, name) for id, name in
+                                      [(1, 'C'), (101, 'B'), (2, 'A'), (102, 'D')]])
+            assert sharded_repo.find_columns({}, ['id', 'name'], order_by=['-name']) == {
+                'id': [102, 1, 101, 2],
+                'name': ['D', 'C', 'B', 'A'],
+            }
+            assert sorted(sharded_repo.find_columns({}, ['name'])['name']) == ['A', 'B', 'C', 'D']
+            assert sharded_repo.find_columns({'id': 101}, ['name'], order_by=['id']) == {'name': ['B']}
+            with raises(ValueError):
+                sharded_repo.find_columns({}, ['id'], order_by=['name'])
+
+    def test_find_page_walks_all_shards(self, app: Flask, Model, sharded_repo):
+        with app.test_request_context():
+            sharded_repo.insert_many([_model(Model, id, name) for id, name in
+                                      [(1, 'A'), (101, 'B'), (2, 'C'), (102, 'D'), (103, 'E')]])
+            names, cursor = [], None
+            while True:
+                page = sharded_repo.find_page({}, order_by=['name'], after=cursor, limit=2)
+                names += [m.name for m in page.items]
+                cursor = page.next_cursor
+                if cursor is None:
+                    break
+            assert names == ['A', 'B', 'C', 'D', 'E']
+
+    def test_unit_of_work_visits_shards_in_app_context_thread(self, app: Flask, Model, sharded_repo):
+        get_managers(app)[DB_MANAGER_SQLALCHEMY].unit_of_work = True
+        with app.test_request_context():
+            sharded_repo.insert_many([_model(Model, 1, 'John'), _model(Model, 101, 'Jane')])
+            assert _shard_names(app, Model, 'shard_1') == []
+        assert _shard_names(app, Model, 'test_sqlite_memory') == ['John']
+        assert _shard_names(app, Model, 'shard_1') == ['Jane']
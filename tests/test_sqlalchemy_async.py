@@ -0,0 +1,121 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+from flask_ddd_repository import FlaskDDDRepository, DB_MANAGER_SQLALCHEMY_ASYNC, get_managers
+from flask_ddd_repository.db_manager.sqlalchemy_async import AsyncSQLAlchemyManager
+from flask_ddd_repository.exceptions import ModelNotFoundException, UnitOfWorkNotSupportedException
+from flask_ddd_repository.repository_async import AsyncSQLAlchemyRepository
+from pytest import raises
+from sqlalchemy import Table, Column, Integer, String, DateTime
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import mapper
+
+pytest.importorskip('aiosqlite')
+
+
+@pytest.fixture
+def async_app(app: Flask):
+    app.config['SQLALCHEMY_BINDS'] = [{'bind_name': 'test_aiosqlite_memory', 'db_type': 'sqlite+aiosqlite',
+                                       'db_host': ':memory:'}]
+    FlaskDDDRepository(app, (DB_MANAGER_SQLALCHEMY_ASYNC,))
+    return app
+
+
+@pytest.fixture
+def AsyncModel(async_app: Flask):
+    class AsyncModel(FlaskDDDRepository.Model):
+        def __init__(self, name):
+            self.name = name
+
+    meta = get_managers(async_app)[DB_MANAGER_SQLALCHEMY_ASYNC].metadata()['test_aiosqlite_memory']
+    mapper(AsyncModel, Table(
+        'async_model', meta,
+        Column('id', Integer, primary_key=True),
+        Column('name', String),
+        Column('deleted_at', DateTime),
+    ))
+    return AsyncModel
+
+
+def run(app: Flask, scenario):
+    async def with_schema():
+        meta = get_managers(app)[DB_MANAGER_SQLALCHEMY_ASYNC].metadata()['test_aiosqlite_memory']
+        engine = meta.bind
+        async with engine.begin() as connection:
+            await connection.run_sync(meta.create_all)
+        try:
+            return await scenario()
+        finally:
+            await engine.dispose()
+
+    with app.app_context():
+        return asyncio.run(with_schema())
+
+
+class TestAsyncSQLAlchemyManager:
+    def test_manager_creates_async_engines_and_sessions(self, async_app: Flask):
+        manager = get_managers(async_app)[DB_MANAGER_SQLALCHEMY_ASYNC]
+        assert isinstance(manager, AsyncSQLAlchemyManager)
+        assert isinstance(manager.binds()['test_aiosqlite_memory'], AsyncEngine)
+        assert isinstance(manager.create_session(), AsyncSession)
+        assert isinstance(manager.create_session('test_aiosqlite_memory'), AsyncSession)
+
+    def test_manager_rejects_the_unit_of_work(self, app: Flask):
+        app.config['SQLALCHEMY_BINDS'] = [{'bind_name': 'test_aiosqlite_memory', 'db_type': 'sqlite+aiosqlite',
+                                           'db_host': ':memory:'}]
+        app.config['SQLALCHEMY_UNIT_OF_WORK'] = True
+        with raises(UnitOfWorkNotSupportedException):
+            AsyncSQLAlchemyManager(app)
+
+
+class TestAsyncSQLAlchemyRepository:
+    def test_writes_and_reads(self, async_app: Flask, AsyncModel):
+        repo = AsyncSQLAlchemyRepository(AsyncModel)
+
+        async def scenario():
+            john, jane = await repo.insert_many([AsyncModel('John'), AsyncModel('Jane')])
+            assert (await repo.find_one(john.id)).name == 'John'
+            await repo.bulk_insert_many([AsyncModel('Jim')])
+            jane.name = 'Janet'
+            assert await repo.update_many([jane]) == (0, 1)
+            assert await repo.delete_one(john.id) == 1
+            with raises(ModelNotFoundException):
+                await repo.find_one(john.id)
+            assert [m.name for m in await repo.find_many({}, order_by=['id'])] == ['Janet', 'Jim']
+            assert (await repo.find_page({}, limit=1)).next_cursor is not None
+            assert (await repo.find_many_by_pks([john.id, jane.id])).missing == [john.id]
+            assert await repo.restore_many([john.id]) == 1
+            return [m.name async for m in repo.iter_many({}, chunk_size=2, order_by=['-name'])]
+
+        assert run(async_app, scenario) == ['John', 'Jim', 'Janet']
+
+    def test_projections(self, async_app: Flask, AsyncModel):
+        repo = AsyncSQLAlchemyRepository(AsyncModel)
+
+        async def scenario():
+            john, _ = await repo.insert_many([AsyncModel('John'), AsyncModel('Jane')])
+            assert (await repo.find_one(john.id, fields=['name'], hydrate=False)) == ('John',)
+            assert [row.name for row in await repo.find_many({}, order_by=['name'], fields=['name'], hydrate=False)] \
+                == ['Jane', 'John']
+            with patch('flask_ddd_repository.columnar.numpy', None):
+                assert (await repo.find_columns({}, ['name'], order_by=['-name'], chunk_size=1)) \
+                    == {'name': ['John', 'Jane']}
+            return [tuple(row) async for row in repo.iter_many({}, order_by=['id'], fields=['id'], hydrate=False)]
+
+        assert run(async_app, scenario) == [(1,), (2,)]
+
+    def test_rolls_back_on_failure(self, async_app: Flask, AsyncModel):
+        repo = AsyncSQLAlchemyRepository(AsyncModel)
+
+        async def scenario():
+            with raises(ValueError):
+                await repo.update_many([AsyncModel('John')], upsert=True)
+            session = get_managers(async_app)[DB_MANAGER_SQLALCHEMY_ASYNC].create_session()
+            await repo.insert_one(AsyncModel('Jane'), session=session)
+            await session.rollback()
+            await session.close()
+            return await repo.find_many({})
+
+        assert run(async_app, scenario) == []
@@ -1,7 +1,16 @@
-from flask import Flask
-from flask_ddd_repository.exceptions import ModelNotFoundException
+from unittest.mock import MagicMock, patch
+
+from flask import Flask, g
+from flask_ddd_repository import get_managers, DB_MANAGER_SQLALCHEMY
+from flask_ddd_repository.cache import InMemoryCache
+from flask_ddd_repository.exceptions import ModelNotFoundException, InvalidCursorException, \
+    SoftDeleteNotSupportedException, VersionConflictException
 from flask_ddd_repository.repository import SQLAlchemyRepository
-from pytest import raises
+from pytest import fixture, importorskip, raises
+from sqlalchemy import Column, ForeignKey, Integer, String, Table, create_engine, event, inspect
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import Session, mapper, relationship
 
 
 class TestSQLAlchemyRepository:
@@ -10,3 +19,616 @@ class TestSQLAlchemyRepository:
         with raises(ModelNotFoundException):
             with app.test_request_context():
                 repo.find_one(22)
+
+    def test_unit_of_work_shares_one_session_and_commits_on_teardown(self, app: Flask, Model):
+        get_managers(app)[DB_MANAGER_SQLALCHEMY].unit_of_work = True
+        repo = SQLAlchemyRepository(Model)
+        with patch.object(Session, 'commit', autospec=True, side_effect=Session.commit) as commit:
+            with app.test_request_context():
+                repo.insert_one(Model('John', 'Doe'))
+                repo.insert_many([Model('Jane', 'Doe'), Model('Jim', 'Doe')])
+                commit.assert_not_called()
+                assert len(g.flask_ddd_repository_sqlalchemy_sessions) == 1
+            commit.assert_called_once()
+        with app.test_request_context():
+            assert len(repo.find_many({})) == 3
+
+    def test_unit_of_work_rolls_back_on_teardown_with_exception(self, app: Flask, Model):
+        get_managers(app)[DB_MANAGER_SQLALCHEMY].unit_of_work = True
+        repo = SQLAlchemyRepository(Model)
+        with raises(RuntimeError):
+            with app.test_request_context():
+                repo.insert_one(Model('John', 'Doe'))
+                raise RuntimeError()
+        with app.test_request_context():
+            assert repo.find_many({}) == []
+
+    def _populate(self, app: Flask, Model, names=('John', 'Jane', 'Jim', 'Joe', 'Jack')):
+        repo = SQLAlchemyRepository(Model)
+        with app.test_request_context():
+            repo.insert_many([Model(name, 'Doe' if index % 2 else 'Roe') for index, name in enumerate(names)])
+        return repo
+
+    def test_find_many_filters_orders_and_paginates_in_sql(self, app: Flask, Model):
+        repo = self._populate(app, Model)
+        with app.test_request_context():
+            assert [m.name for m in repo.find_many({'lastname': 'Roe'}, order_by=['name'])] == ['Jack', 'Jim', 'John']
+            assert [m.name for m in repo.find_many({}, order_by=['-name'], limit=2, offset=1)] == ['Joe', 'Jim']
+            assert repo.find_many({}, limit=0) == []
+
+    def test_find_page_walks_all_results_with_cursor(self, app: Flask, Model):
+        repo = self._populate(app, Model)
+        names, cursor = [], None
+        with app.test_request_context():
+            while True:
+                page = repo.find_page({}, order_by=['lastname', '-name'], after=cursor, limit=2)
+                names += [m.name for m in page.items]
+                cursor = page.next_cursor
+                if cursor is None:
+                    break
+        assert names == ['Joe', 'Jane', 'John', 'Jim', 'Jack']
+
+    def test_find_page_walks_rows_with_null_ordering_keys(self, app: Flask, Model):
+        repo = SQLAlchemyRepository(Model)
+        with app.test_request_context():
+            repo.insert_many([Model(name, lastname) for name, lastname in
+                              [('John', None), ('Jane', 'Doe'), ('Jim', None), ('Joe', 'Roe'), ('Jack', None)]])
+            for order_by in (['lastname', 'name'], ['-lastname', 'name'], ['name', '-lastname']):
+                names, cursor = [], None
+                while True:
+                    page = repo.find_page({}, order_by=order_by, after=cursor, limit=2)
+                    names += [m.name for m in page.items]
+                    cursor = page.next_cursor
+                    if cursor is None:
+                        break
+                assert names == [m.name for m in repo.find_many({}, order_by=order_by)]
+            assert len(names) == 5
+
+    def test_find_page_criteria_follow_the_null_ordering_of_the_dialect(self, app: Flask, Model):
+        repo = SQLAlchemyRepository(Model)
+
+        def compile(criteria) -> str:
+            return str(criteria.compile(dialect=postgresql.dialect()))
+
+        assert compile(repo._keyset_criteria([('lastname', False)], [None], nulls_last=True)) == 'false'
+        assert compile(repo._keyset_criteria([('lastname', False)], ['Doe'], nulls_last=True)) == \
+            'model.lastname > %(lastname_1)s OR model.lastname IS NULL'
+        assert compile(repo._keyset_criteria([('lastname', True)], [None], nulls_last=True)) == \
+            'model.lastname IS NOT NULL'
+
+    def test_find_page_applies_filter(self, app: Flask, Model):
+        repo = self._populate(app, Model)
+        with app.test_request_context():
+            first = repo.find_page({'lastname': 'Doe'}, limit=1)
+            second = repo.find_page({'lastname': 'Doe'}, after=first.next_cursor, limit=1)
+        assert [m.name for m in first.items + second.items] == ['Jane', 'Joe']
+        assert second.next_cursor is None
+
+    def test_find_page_rejects_cursor_for_different_ordering(self, app: Flask, Model):
+        repo = self._populate(app, Model)
+        with app.test_request_context():
+            cursor = repo.find_page({}, order_by=['name'], limit=1).next_cursor
+            with raises(InvalidCursorException):
+                repo.find_page({}, order_by=['lastname'], after=cursor)
+
+    def test_iter_many_streams_results_outside_app_context(self, app: Flask, Model):
+        repo = self._populate(app, Model)
+        with app.test_request_context():
+            models = repo.iter_many({'lastname': 'Roe'}, chunk_size=2, order_by=['name'])
+        assert [m.name for m in models] == ['Jack', 'Jim', 'John']
+
+    def test_iter_many_opens_session_only_while_consumed(self, app: Flask, Model):
+        repo = self._populate(app, Model)
+        with patch.object(Session, 'close', autospec=True, side_effect=Session.close) as close:
+            with app.test_request_context():
+                models = repo.iter_many({}, chunk_size=2)
+            close.assert_not_called()
+            assert next(models).name == 'John'
+            close.assert_not_called()
+            models.close()
+            close.assert_called_once()
+
+    def test_bulk_insert_many_inserts_in_chunks(self, app: Flask, Model):
+        repo = SQLAlchemyRepository(Model)
+        models = [Model(f'name_{index}', 'Doe') for index in range(5)]
+        with app.test_request_context():
+            with patch.object(Session, 'execute', autospec=True, side_effect=Session.execute) as execute:
+                assert repo.bulk_insert_many(models, chunk_size=2) is models
+            assert execute.call_count == 3
+            assert [m.name for m in repo.find_many({}, order_by=['id'])] == [m.name for m in models]
+        assert all(m.id is None for m in models)
+
+    def test_bulk_insert_many_returns_generated_primary_keys(self, app: Flask, Model):
+        repo = SQLAlchemyRepository(Model)
+        models = [Model(f'name_{index}', 'Doe') for index in range(3)]
+        with app.test_request_context():
+            repo.bulk_insert_many(models, return_defaults=True)
+            assert {m.id: m.name for m in models} == {m.id: m.name for m in repo.find_many({})}
+
+    def test_bulk_insert_many_uses_parent_session(self, app: Flask, Model):
+        repo = SQLAlchemyRepository(Model)
+        with app.test_request_context():
+            session = get_managers(app)[DB_MANAGER_SQLALCHEMY].create_session()
+            repo.bulk_insert_many([Model('John', 'Doe')], session=session)
+            session.rollback()
+            assert repo.find_many({}) == []
+
+    def test_update_many_upserts_and_reports_counts(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John', 'Jane'))
+        with app.test_request_context():
+            john, jane = repo.find_many({}, order_by=['id'])
+            john.lastname, jane.lastname = 'Smith', 'Smith'
+            new = Model('Jim', 'Smith')
+            new.id = 10
+            assert repo.update_many([john, jane, new], upsert=True) == (1, 2)
+            assert [(m.id, m.name, m.lastname) for m in repo.find_many({}, order_by=['id'])] == \
+                [(john.id, 'John', 'Smith'), (jane.id, 'Jane', 'Smith'), (10, 'Jim', 'Smith')]
+
+    def test_update_many_without_upsert_skips_missing_models(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John',))
+        with app.test_request_context():
+            john, = repo.find_many({})
+            john.name = 'Johnny'
+            missing = Model('Jim', 'Smith')
+            missing.id = 10
+            with patch.object(type(get_managers(app)[DB_MANAGER_SQLALCHEMY].binds()['test_sqlite_memory'].dialect),
+                              'name', 'mysql'):
+                assert repo.update_many([john, missing]) == (0, 1)
+            assert [m.name for m in repo.find_many({})] == ['Johnny']
+
+    def test_update_many_without_upsert_counts_with_one_statement_per_chunk(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John', 'Jane', 'Jim'))
+        with app.test_request_context():
+            models = repo.find_many({}, order_by=['id'])
+            missing = Model('Joe', 'Smith')
+            missing.id = 10
+            for model in models:
+                model.lastname = 'Smith'
+            with patch.object(Session, 'execute', autospec=True, side_effect=Session.execute) as execute:
+                assert repo.update_many(models + [missing], chunk_size=2) == (0, 3)
+            assert execute.call_count == 2
+            assert [m.lastname for m in repo.find_many({})] == ['Smith'] * 3
+
+    def test_update_many_upserts_with_executemany_on_other_dialects(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John',))
+        with app.test_request_context():
+            john, = repo.find_many({})
+            john.name = 'Johnny'
+            new = Model('Jim', 'Smith')
+            new.id = 10
+            with patch.object(type(get_managers(app)[DB_MANAGER_SQLALCHEMY].binds()['test_sqlite_memory'].dialect),
+                              'name', 'mysql'):
+                assert repo.update_many([john, new], upsert=True) == (1, 1)
+            assert [m.name for m in repo.find_many({}, order_by=['id'])] == ['Johnny', 'Jim']
+
+    def test_update_many_uses_on_conflict_upsert_on_postgresql(self, Model):
+        session = MagicMock()
+        session.execute.return_value.scalars.return_value = [True, False]
+        repo = SQLAlchemyRepository(Model)
+        assert repo._upsert_postgresql(session, [
+            {'id': 1, 'name': 'John', 'lastname': 'Doe'},
+            {'id': 2, 'name': 'Jane', 'lastname': 'Doe'},
+        ]) == 1
+        sql = str(session.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        assert 'ON CONFLICT (id) DO UPDATE SET name = excluded.name, lastname = excluded.lastname' in sql
+        assert 'RETURNING xmax = 0' in sql
+
+    def test_update_many_fails_without_primary_key(self, app: Flask, Model):
+        repo = SQLAlchemyRepository(Model)
+        with app.test_request_context():
+            with raises(ValueError):
+                repo.update_many([Model('John', 'Doe')], upsert=True)
+
+    def test_update_one_fails_when_model_not_found(self, app: Flask, Model):
+        repo = SQLAlchemyRepository(Model)
+        model = Model('John', 'Doe')
+        model.id = 1
+        with app.test_request_context():
+            with raises(ModelNotFoundException):
+                repo.update_one(model)
+            assert repo.update_one(model, upsert=True) is model
+            assert repo.find_one(1).name == 'John'
+
+    def test_delete_many_soft_deletes_without_loading_models(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John', 'Jane', 'Jim'))
+        with app.test_request_context():
+            ids = [m.id for m in repo.find_many({}, order_by=['id'])]
+            with patch.object(Session, 'execute', autospec=True, side_effect=Session.execute) as execute:
+                assert repo.delete_many(ids[:2] + [100], chunk_size=2) == 2
+            assert execute.call_count == 2
+            assert repo.delete_one(ids[0]) == 0
+            assert [m.deleted_at is not None for m in repo.find_many({}, order_by=['id'], include_soft_deleted=True)] \
+                == [True, True, False]
+
+    def test_restore_many_clears_deleted_at(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John', 'Jane'))
+        with app.test_request_context():
+            ids = [m.id for m in repo.find_many({}, order_by=['id'])]
+            repo.delete_many(ids)
+            assert repo.restore_one(ids[0]) == 1
+            assert repo.restore_many(ids) == 1
+            assert all(m.deleted_at is None for m in repo.find_many({}))
+
+    def test_delete_many_hard_deletes_rows(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John', 'Jane'))
+        with app.test_request_context():
+            john, jane = repo.find_many({}, order_by=['id'])
+            assert repo.delete_one(john.id, soft_delete=False) == 1
+            assert [m.name for m in repo.find_many({})] == ['Jane']
+
+    def test_soft_delete_fails_without_deleted_at_column(self, app: Flask, Model):
+        repo = SQLAlchemyRepository(Model)
+        with patch.object(SQLAlchemyRepository, '_soft_delete_column', return_value=None):
+            with app.test_request_context():
+                with raises(SoftDeleteNotSupportedException):
+                    repo.delete_one(1)
+                with raises(SoftDeleteNotSupportedException):
+                    repo.restore_one(1)
+
+    def test_queries_exclude_soft_deleted_models_in_sql(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John', 'Jane', 'Jim'))
+        with app.test_request_context():
+            john, jane, jim = repo.find_many({}, order_by=['id'])
+            repo.delete_one(jane.id)
+            with raises(ModelNotFoundException):
+                repo.find_one(jane.id)
+            assert repo.find_one(jane.id, include_soft_deleted=True).name == 'Jane'
+            assert [m.name for m in repo.find_many({}, order_by=['id'])] == ['John', 'Jim']
+            assert [m.name for m in repo.iter_many({}, order_by=['id'])] == ['John', 'Jim']
+            assert [m.name for m in repo.find_page({}).items] == ['John', 'Jim']
+            assert len(repo.find_page({}, include_soft_deleted=True).items) == 3
+            assert 'deleted_at IS NULL' in str(repo._query(get_managers(app)[DB_MANAGER_SQLALCHEMY].create_session()))
+
+    def test_find_one_reads_through_cache(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John',))
+        cached_repo = SQLAlchemyRepository(Model, cache=InMemoryCache())
+        with app.test_request_context():
+            john, = repo.find_many({})
+            assert cached_repo.find_one(john.id).name == 'John'
+            with patch.object(SQLAlchemyRepository, '_find_model_or_fail') as find:
+                cached = cached_repo.find_one(john.id)
+            find.assert_not_called()
+            assert (cached.id, cached.name, cached.lastname) == (john.id, 'John', 'Roe')
+            assert cached is not cached_repo.find_one(john.id)
+        assert (cached_repo._cache.stats.hits, cached_repo._cache.stats.misses) == (2, 1)
+
+    def test_writes_invalidate_cached_models(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John',))
+        cached_repo = SQLAlchemyRepository(Model, cache=InMemoryCache())
+        with app.test_request_context():
+            john = cached_repo.find_one(repo.find_many({})[0].id)
+            john.name = 'Johnny'
+            cached_repo.update_one(john)
+            assert cached_repo.find_one(john.id).name == 'Johnny'
+            cached_repo.delete_one(john.id)
+            with raises(ModelNotFoundException):
+                cached_repo.find_one(john.id)
+            assert cached_repo.find_one(john.id, include_soft_deleted=True).deleted_at is not None
+            with raises(ModelNotFoundException):
+                cached_repo.find_one(john.id)
+            cached_repo.restore_one(john.id)
+            assert cached_repo.find_one(john.id).deleted_at is None
+
+    def test_unit_of_work_doesnt_cache_uncommitted_models(self, app: Flask, Model):
+        get_managers(app)[DB_MANAGER_SQLALCHEMY].unit_of_work = True
+        cached_repo = SQLAlchemyRepository(Model, cache=InMemoryCache())
+        with app.test_request_context():
+            john = cached_repo.insert_one(Model('John', 'Doe'))
+            assert cached_repo.find_one(john.id).name == 'John'
+        assert len(cached_repo._cache) == 0
+
+    def test_find_many_by_pks_returns_models_in_input_order(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John', 'Jane', 'Jim'))
+        with app.test_request_context():
+            john, jane, jim = repo.find_many({}, order_by=['id'])
+            repo.delete_one(jim.id)
+            with patch.object(Session, 'execute', autospec=True, side_effect=Session.execute) as execute:
+                result = repo.find_many_by_pks([jim.id, jane.id, 100, john.id, jane.id], chunk_size=2)
+            assert execute.call_count == 2
+        assert [m.name for m in result.items] == ['Jane', 'John', 'Jane']
+        assert result.missing == [jim.id, 100]
+
+    def test_find_many_by_pks_uses_cache(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John', 'Jane'))
+        cached_repo = SQLAlchemyRepository(Model, cache=InMemoryCache())
+        with app.test_request_context():
+            john, jane = repo.find_many({}, order_by=['id'])
+            cached_repo.find_one(john.id)
+            with patch.object(SQLAlchemyRepository, '_primary_key_in', wraps=cached_repo._primary_key_in) as criteria:
+                assert [m.name for m in cached_repo.find_many_by_pks([john.id, jane.id]).items] == ['John', 'Jane']
+            criteria.assert_called_once_with([(jane.id,)])
+
+    def test_loader_batches_lookups_of_the_app_context(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John', 'Jane'))
+        with app.test_request_context():
+            john, jane = repo.find_many({}, order_by=['id'])
+            assert repo.loader() is repo.loader()
+            with patch.object(SQLAlchemyRepository, 'find_many_by_pks', wraps=repo.find_many_by_pks) as batch:
+                deferred = repo.loader().load_many([john.id, jane.id, 100])
+                assert [d.get().name for d in deferred[:2]] == ['John', 'Jane']
+                with raises(ModelNotFoundException):
+                    deferred[2].get()
+                assert repo.loader().load(john.id).get().name == 'John'
+            batch.assert_called_once_with([john.id, jane.id, 100], include_soft_deleted=False)
+        with app.test_request_context():
+            assert repo.loader()._results == {}
+
+    def test_writes_clear_loader_results(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John',))
+        with app.test_request_context():
+            john = repo.loader().load(repo.find_many({})[0].id)
+            assert john.get().name == 'John'
+            repo.delete_one(john.primary_key_value)
+            with raises(ModelNotFoundException):
+                john.get()
+
+    def test_projected_reads_load_only_the_fields(self, app: Flask, Model):
+        repo = self._populate(app, Model, names=('John', 'Jane', 'Jim'))
+        with app.test_request_context():
+            rows = repo.find_many({'lastname': 'Roe'}, order_by=['-name'], fields=['name'], hydrate=False)
+            assert [tuple(row) for row in rows] == [('John',), ('Jim',)]
+            assert rows[0]._fields == ('name',)
+
+            john = repo.find_many({'name': 'John'}, fields=['name'])[0]
+            assert isinstance(john, Model)
+            assert inspect(john).unloaded == {'lastname', 'deleted_at'}
+            assert repo.find_one(john.id, fields=['lastname'], hydrate=False) == ('Roe',)
+            assert inspect(repo.find_one(john.id, fields=['lastname'])).unloaded == {'name', 'deleted_at'}
+            assert [row.name for row in repo.iter_many({}, order_by=['name'], fields=['id', 'name'], hydrate=False)] \
+                == ['Jane', 'Jim', 'John']
+            with raises(ValueError):
+                repo.find_many({}, fields=[])
+
+    def test_find_columns_exports_lists_without_numpy(self, app: Flask, Model):
+        repo = self._populate(app, Model)
+        with app.test_request_context(), patch('flask_ddd_repository.columnar.numpy', None):
+            repo.delete_one(repo.find_many({'name': 'Jim'})[0].id)
+            assert repo.find_columns({'lastname': 'Roe'}, ['name', 'id'], order_by=['name'], chunk_size=1) == {
+                'name': ['Jack', 'John'],
+                'id': [5, 1],
+            }
+            assert repo.find_columns({'lastname': 'Roe'}, ['name'], include_soft_deleted=True)['name'] \
+                == ['John', 'Jim', 'Jack']
+            assert repo.find_columns({'lastname': None}, ['name', 'deleted_at']) == {'name': [], 'deleted_at': []}
+
+    def test_find_columns_infers_numpy_dtypes_from_the_columns(self, app: Flask, Model):
+        numpy = importorskip('numpy')
+        repo = self._populate(app, Model)
+        with app.test_request_context():
+            repo.delete_one(1)
+            columns = repo.find_columns({}, ['id', 'name', 'deleted_at'], include_soft_deleted=True, chunk_size=2)
+            assert columns['id'].dtype == numpy.int64 and columns['id'].tolist() == [1, 2, 3, 4, 5]
+            assert columns['name'].dtype == object
+            assert columns['deleted_at'].dtype == numpy.dtype('datetime64[us]')
+            assert numpy.isnat(columns['deleted_at']).tolist() == [False, True, True, True, True]
+            assert repo.find_columns({}, ['id'], dtypes={'id': 'float32'})['id'].dtype == numpy.float32
+            assert repo.find_columns({'name': 'Nobody'}, ['id'])['id'].dtype == numpy.int64
+
+
+class TestCacheInvalidation:
+    @fixture
+    def sqlalchemy_binds(self, tmp_path):
+        # Sessions only see the commits of each other in a database file
+        return [{'bind_name': 'test_sqlite_memory', 'db_type': 'sqlite', 'db_host': str(tmp_path / 'cache.db')}]
+
+    def test_reads_before_the_commit_dont_keep_stale_models_cached(self, app: Flask, Model):
+        manager = get_managers(app)[DB_MANAGER_SQLALCHEMY]
+        cached_repo = SQLAlchemyRepository(Model, cache=InMemoryCache())
+        with app.test_request_context():
+            john = cached_repo.insert_one(Model('John', 'Doe'))
+        manager.unit_of_work = True
+        with app.test_request_context():
+            john.name = 'Johnny'
+            cached_repo.update_one(john)
+            # Another transaction reads the committed row, and caches it
+            other_session = manager.create_session()
+            try:
+                assert cached_repo.find_one(john.id, session=other_session).name == 'John'
+            finally:
+                other_session.close()
+        with app.test_request_context():
+            assert cached_repo.find_one(john.id).name == 'Johnny'
+
+
+class TestOptimisticConcurrency:
+    @fixture
+    def VersionedModel(self, app: Flask, repo):
+        class VersionedModel(repo.Model):
+            pass
+
+        metadata = get_managers(app)[DB_MANAGER_SQLALCHEMY].metadata()['test_sqlite_memory']
+        table = Table(
+            'versioned_model', metadata,
+            Column('id', Integer, primary_key=True),
+            Column('name', String),
+            Column('lastname', String),
+            Column('version', Integer, nullable=False),
+        )
+        mapper(VersionedModel, table, version_id_col=table.c.version)
+        table.create()
+        yield VersionedModel
+        table.drop()
+
+    def _model(self, VersionedModel, **values):
+        model = VersionedModel()
+        for key, value in values.items():
+            setattr(model, key, value)
+        return model
+
+    def test_update_one_writes_changed_columns_in_one_statement(self, app: Flask, VersionedModel):
+        repo = SQLAlchemyRepository(VersionedModel)
+        with app.test_request_context():
+            repo.insert_one(self._model(VersionedModel, id=1, name='John', lastname='Doe'))
+            model = repo.find_one(1)
+            assert model.version == 1
+            model.name = 'Johnny'
+            with patch.object(Session, 'execute', autospec=True, side_effect=Session.execute) as execute:
+                assert repo.update_one(model) is model
+            assert execute.call_count == 1
+            sql = str(execute.call_args[0][1])
+            assert sql == 'UPDATE versioned_model SET name=?, version=? ' \
+                          'WHERE versioned_model.id = ? AND versioned_model.version = ?'
+            assert model.version == 2
+            # Nothing changed since: no statement
+            with patch.object(Session, 'execute', autospec=True) as execute:
+                repo.update_one(model)
+            execute.assert_not_called()
+            assert (repo.find_one(1).name, repo.find_one(1).version) == ('Johnny', 2)
+
+    def test_update_one_conflicts_with_stale_versions(self, app: Flask, VersionedModel):
+        repo = SQLAlchemyRepository(VersionedModel)
+        with app.test_request_context():
+            repo.insert_one(self._model(VersionedModel, id=1, name='John', lastname='Doe'))
+            first, second = repo.find_one(1), repo.find_one(1)
+            first.name, second.lastname = 'Johnny', 'Roe'
+            repo.update_one(first)
+            with raises(VersionConflictException):
+                repo.update_one(second)
+            with raises(VersionConflictException):
+                repo.update_one(self._model(VersionedModel, id=2, name='Jane', version=1))
+            assert (repo.find_one(1).name, repo.find_one(1).lastname) == ('Johnny', 'Doe')
+
+    def test_update_one_within_the_unit_of_work(self, app: Flask, VersionedModel):
+        repo = SQLAlchemyRepository(VersionedModel)
+        with app.test_request_context():
+            repo.insert_one(self._model(VersionedModel, id=1, name='John', lastname='Doe'))
+        get_managers(app)[DB_MANAGER_SQLALCHEMY].unit_of_work = True
+        with app.test_request_context():
+            model = repo.find_one(1)
+            model.name = 'Johnny'
+            repo.update_one(model)
+            assert model.version == 2
+            model.lastname = 'Roe'
+            repo.update_one(model)
+            assert model.version == 3
+        with app.test_request_context():
+            model = repo.find_one(1)
+            assert (model.name, model.lastname, model.version) == ('Johnny', 'Roe', 3)
+
+    def test_update_one_upserts_models_without_version(self, app: Flask, VersionedModel):
+        repo = SQLAlchemyRepository(VersionedModel)
+        with app.test_request_context():
+            model = repo.update_one(self._model(VersionedModel, id=1, name='John', lastname='Doe'), upsert=True)
+            assert model.version == 1
+            with raises(ValueError):
+                repo.update_one(self._model(VersionedModel, id=2, name='Jane'))
+            model = self._model(VersionedModel, id=1, name='Jim', lastname='Roe', version=1)
+            repo.update_one(model, upsert=True)
+            assert (repo.find_one(1).name, repo.find_one(1).version) == ('Jim', 2)
+
+
+class TestLoadPlans:
+    @fixture
+    def Author(self, app: Flask, repo):
+        class Author(repo.Model):
+            pass
+
+        class Book(repo.Model):
+            pass
+
+        metadata = get_managers(app)[DB_MANAGER_SQLALCHEMY].metadata()['test_sqlite_memory']
+        authors = Table('author', metadata, Column('id', Integer, primary_key=True), Column('name', String))
+        books = Table(
+            'book', metadata,
+            Column('id', Integer, primary_key=True),
+            Column('author_id', Integer, ForeignKey('author.id')),
+            Column('title', String),
+        )
+        mapper(Author, authors, properties={'books': relationship(Book, backref='author', order_by=books.c.id)})
+        mapper(Book, books)
+        metadata.create_all(tables=[authors, books])
+        with metadata.bind.begin() as connection:
+            connection.execute(authors.insert(), [{'id': id, 'name': f'Author {id}'} for id in range(1, 6)])
+            connection.execute(books.insert(), [
+                {'id': id, 'author_id': id % 5 + 1, 'title': f'Book {id}'} for id in range(1, 11)
+            ])
+        yield Author
+        metadata.drop_all(tables=[books, authors])
+
+    @fixture
+    def statements(self, app: Flask):
+        statements = []
+        engine = get_managers(app)[DB_MANAGER_SQLALCHEMY].binds()['test_sqlite_memory']
+
+        def listener(connection, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', listener)
+        yield statements
+        event.remove(engine, 'before_cursor_execute', listener)
+
+    def test_reads_load_relationships_in_a_fixed_number_of_queries(self, app: Flask, Author, statements):
+        repo = SQLAlchemyRepository(Author)
+        load_plan = {'books': 'selectin', 'books.author': 'joined'}
+        with app.test_request_context():
+            for limit in (2, 5):
+                statements.clear()
+                authors = repo.find_many({}, limit=limit, order_by=['id'], load_plan=load_plan)
+                assert len(statements) == 2
+                assert [len(author.books) for author in authors] == [2] * limit
+                assert authors[0].books[0].author is authors[0]
+            assert len(statements) == 2
+
+            statements.clear()
+            assert [book.title for book in repo.find_one(1, load_plan={'books': 'joined'}).books] == \
+                ['Book 5', 'Book 10']
+            page = repo.find_page({}, limit=3, load_plan={'books': 'joined'})
+            assert [len(author.books) for author in page.items] == [2, 2, 2]
+            assert [len(author.books) for author in repo.iter_many({}, load_plan={'books': 'selectin'})] == [2] * 5
+            assert len(statements) == 4
+
+    def test_repository_plan_is_the_default_of_the_calls(self, app: Flask, Author):
+        repo = SQLAlchemyRepository(Author, cache=InMemoryCache(), load_plan={'books': 'selectin'})
+        with app.test_request_context():
+            assert [len(author.books) for author in repo.find_many_by_pks([1, 2]).items] == [2, 2]
+            # The cache holds columns only, it is bypassed
+            assert len(repo.find_one(1).books) == 2
+            author = repo.find_many({}, limit=1, load_plan={'books': 'raise'})[0]
+            with raises(InvalidRequestError):
+                author.books
+            with raises(ValueError):
+                repo.find_many({}, load_plan={'books': 'eager'})
+            with raises(AttributeError):
+                repo.find_many({}, load_plan={'name': 'joined'})
+
+
+class TestReadReplicaRouting:
+    @fixture
+    def sqlalchemy_binds(self, tmp_path):
+        return [
+            {
+                'bind_name': 'test_sqlite_memory',
+                'db_type': 'sqlite',
+                'db_host': str(tmp_path / 'primary.db'),
+                'replicas': [{'db_host': str(tmp_path / 'replica.db')}],
+            }
+        ]
+
+    @fixture
+    def replica(self, Model, tmp_path):
+        engine = create_engine(f'sqlite:///{tmp_path / "replica.db"}')
+        table = inspect(Model).local_table
+        table.create(engine)
+        with engine.begin() as connection:
+            connection.execute(table.insert(), [{'id': 1, 'name': 'Replica', 'lastname': 'Doe'}])
+        yield engine
+        engine.dispose()
+
+    def test_reads_go_to_replicas_and_writes_to_primary(self, app: Flask, Model, replica):
+        repo = SQLAlchemyRepository(Model)
+        with app.test_request_context():
+            repo.insert_one(Model('Primary', 'Doe'))
+            assert repo.find_one(1).name == 'Replica'
+            assert [m.name for m in repo.find_many({})] == ['Replica']
+            assert [m.name for m in repo.iter_many({})] == ['Replica']
+            assert [m.name for m in repo.find_many_by_pks([1]).items] == ['Replica']
+            assert [m.name for m in repo.find_page({}).items] == ['Replica']
+
+    def test_reads_after_unit_of_work_writes_stay_on_primary(self, app: Flask, Model, replica):
+        get_managers(app)[DB_MANAGER_SQLALCHEMY].unit_of_work = True
+        repo = SQLAlchemyRepository(Model)
+        with app.test_request_context():
+            assert repo.find_one(1).name == 'Replica'
+            repo.insert_one(Model('Primary', 'Doe'))
+            assert repo.find_one(1).name == 'Primary'
+            assert [m.name for m in repo.find_many({})] == ['Primary']
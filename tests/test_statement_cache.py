@@ -0,0 +1,56 @@
+from flask import Flask
+from flask_ddd_repository.exceptions import ModelNotFoundException
+from flask_ddd_repository.repository import SQLAlchemyRepository
+from flask_ddd_repository.statement_cache import StatementCache
+from pytest import raises
+from sqlalchemy import Column, Integer, MetaData, Table
+from sqlalchemy.orm import configure_mappers, mapper
+
+
+class TestStatementCache:
+    def test_statements_are_reused_per_shape(self, app: Flask, Model):
+        statements = StatementCache()
+        repo = SQLAlchemyRepository(Model, statement_cache=statements)
+        with app.test_request_context():
+            repo.insert_many([Model('John', 'Doe'), Model('Jane', None), Model('Jim', 'Roe')])
+            john = repo.find_many({'name': 'John'})[0]
+            assert repo.find_many({'name': 'Jim', 'lastname': 'Roe'}, order_by=['-name'], offset=0)[0].name == 'Jim'
+            assert [m.name for m in repo.find_many({'lastname': 'Roe', 'name': 'Jim'}, order_by=['-name'])] == ['Jim']
+            assert [m.name for m in repo.find_many({'lastname': None})] == ['Jane']
+            assert repo.find_many({'name': 'Jane'}, offset=1) == []
+            assert repo.find_one(john.id).name == 'John'
+            assert repo.find_one(john.id).name == 'John'
+        # name / name+lastname ordered / lastname IS NULL / name with offset / find_one
+        assert len(statements) == 5
+        assert (statements.stats.hits, statements.stats.misses) == (2, 5)
+
+    def test_statements_are_kept_apart_per_repository_class(self, app: Flask, Model):
+        class JohnRepository(SQLAlchemyRepository):
+            def _select(self, search_filter: dict, *args, **kwargs):
+                return super()._select(search_filter, *args, **kwargs).filter(Model.name == 'John')
+
+        statements = StatementCache()
+        repo = SQLAlchemyRepository(Model, statement_cache=statements)
+        johns = JohnRepository(Model, statement_cache=statements)
+        with app.test_request_context():
+            repo.insert_many([Model('John', 'Doe'), Model('Jane', 'Doe')])
+            jane = repo.find_many({'lastname': 'Doe'}, order_by=['name'])[0]
+            assert repo.find_one(jane.id).name == 'Jane'
+            assert [m.name for m in johns.find_many({'lastname': 'Doe'}, order_by=['name'])] == ['John']
+            assert list(johns.find_columns({'lastname': 'Doe'}, ['name'])['name']) == ['John']
+            assert list(repo.find_columns({'lastname': 'Doe'}, ['name'], order_by=['name'])['name']) == ['Jane', 'John']
+            with raises(ModelNotFoundException):
+                johns.find_one(jane.id)
+
+    def test_cache_is_bounded_and_cleared_when_mappers_are_configured(self):
+        statements = StatementCache(maxsize=2)
+        for key in range(3):
+            statements.get(key, lambda: object())
+        assert len(statements) == 2 and statements.stats.evictions == 1
+
+        class Mapped:
+            pass
+
+        mapper(Mapped, Table('mapped', MetaData(), Column('id', Integer, primary_key=True)))
+        configure_mappers()
+        assert len(statements) == 0